@@ -0,0 +1,65 @@
+"""Create simulations catalog table and index existing runs
+Revision ID: 0002_create_simulations_catalog
+Revises: 0001_create_defaults_and_upgrades
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+import os
+import json
+
+# revision identifiers, used by Alembic.
+revision = '0002_create_simulations_catalog'
+down_revision = '0001_create_defaults_and_upgrades'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One summary row per saved simulation; the full run stays in simulations/
+    op.create_table(
+        'simulations',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('filename', sa.Text(), nullable=False, unique=True),
+        sa.Column('timestamp', sa.Text(), nullable=False),
+        sa.Column('total_purchases', sa.Integer(), nullable=False),
+        sa.Column('final_cps', sa.Float(), nullable=False),
+        sa.Column('total_time', sa.Float(), nullable=False),
+        sa.Column('total_cookies', sa.Float(), nullable=False)
+    )
+    op.create_index('ix_simulations_timestamp', 'simulations', ['timestamp'])
+    op.create_index('ix_simulations_final_cps', 'simulations', ['final_cps'])
+    op.create_index('ix_simulations_total_purchases', 'simulations', ['total_purchases'])
+
+    # Index simulations saved before the catalog existed
+    bind = op.get_bind()
+    base = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    sim_dir = os.path.join(base, 'simulations')
+    if not os.path.isdir(sim_dir):
+        return
+    for filename in sorted(os.listdir(sim_dir)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(sim_dir, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        bind.execute(sa.text(
+            "INSERT OR REPLACE INTO simulations (filename, timestamp, total_purchases, final_cps, total_time, total_cookies) "
+            "VALUES (:filename, :timestamp, :total_purchases, :final_cps, :total_time, :total_cookies)"
+        ), {
+            "filename": filename,
+            "timestamp": data.get('timestamp', ''),
+            "total_purchases": int(data.get('total_purchases', 0)),
+            "final_cps": float(data.get('final_cps', 0)),
+            "total_time": float(data.get('total_time', 0)),
+            "total_cookies": float(data.get('total_cookies', 0))
+        })
+
+
+def downgrade():
+    op.drop_index('ix_simulations_total_purchases', table_name='simulations')
+    op.drop_index('ix_simulations_final_cps', table_name='simulations')
+    op.drop_index('ix_simulations_timestamp', table_name='simulations')
+    op.drop_table('simulations')
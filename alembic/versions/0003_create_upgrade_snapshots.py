@@ -0,0 +1,29 @@
+"""Create upgrade_snapshots table for named level snapshots
+Revision ID: 0003_create_upgrade_snapshots
+Revises: 0002_create_simulations_catalog
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_create_upgrade_snapshots'
+down_revision = '0002_create_simulations_catalog'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per (snapshot, upgrade): the level vector of a named snapshot
+    op.create_table(
+        'upgrade_snapshots',
+        sa.Column('snapshot', sa.Text(), nullable=False),
+        sa.Column('upgrade', sa.Text(), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('snapshot', 'upgrade')
+    )
+
+
+def downgrade():
+    op.drop_table('upgrade_snapshots')
@@ -0,0 +1,59 @@
+"""Create purchase journal, journal actions and checkpoints
+Revision ID: 0004_create_purchase_journal
+Revises: 0003_create_upgrade_snapshots
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+# revision identifiers, used by Alembic.
+revision = '0004_create_purchase_journal'
+down_revision = '0003_create_upgrade_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per level change, grouped into actions (purchase, batch, undo...)
+    op.create_table(
+        'journal_actions',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('ts', sa.Float(), nullable=False),
+        sa.Column('kind', sa.Text(), nullable=False),
+        sa.Column('target', sa.Integer(), nullable=True),
+        sa.Column('label', sa.Text(), nullable=False),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_journal_actions_ts', 'journal_actions', ['ts'])
+    op.create_table(
+        'purchase_journal',
+        sa.Column('seq', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('action', sa.Integer(), nullable=False),
+        sa.Column('upgrade', sa.Text(), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=False),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_purchase_journal_action', 'purchase_journal', ['action'])
+    op.create_table(
+        'journal_checkpoints',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('ts', sa.Float(), nullable=False),
+        sa.Column('upgrade', sa.Text(), nullable=False),
+        sa.Column('level', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('seq', 'upgrade')
+    )
+    op.create_index('ix_journal_checkpoints_ts', 'journal_checkpoints', ['ts'])
+
+    # Replay starts from the levels at the time of the migration
+    bind = op.get_bind()
+    bind.execute(sa.text(
+        "INSERT INTO journal_checkpoints (seq, ts, upgrade, level) SELECT 0, :ts, name, level FROM upgrades"
+    ), {"ts": datetime.now().timestamp()})
+
+
+def downgrade():
+    op.drop_table('journal_checkpoints')
+    op.drop_table('purchase_journal')
+    op.drop_table('journal_actions')
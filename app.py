@@ -1,53 +1,210 @@
 import os
 import json
+import math
+import re
+import bisect
+import collections
+import contextlib
 import functools
+import gzip
+import hashlib
+import heapq
+import itertools
+import multiprocessing
 import sqlite3
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, wait
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request, send_file
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-import pandas as pd
+from flask import Flask, Response, g, has_request_context, render_template, jsonify, request, send_file
+import numpy as np
 import run_migrations
 
 app = Flask(__name__)
 
-# Cache for performance optimization
-@functools.lru_cache(maxsize=2048)
-def calculate_time_to_reach_cost_cached(cps_key, cost_int):
-    """Cached version of time calculation for better performance"""
-    cps = cps_key / 1000.0
-    cost = cost_int
-    
+# Upper bound on purchases accepted by /api/simulate
+MAX_SIMULATION_PURCHASES = 1_000_000
+# Upper bound on scenarios accepted by /api/simulate/batch
+MAX_BATCH_SCENARIOS = 256
+# Upper bound on grid points accepted by /api/sweep
+MAX_SWEEP_POINTS = 1000
+# Upper bound on the greedy purchases /api/optimize may need to reach its
+# target, and on its beam width
+MAX_PLAN_PURCHASES = 5000
+MAX_PLANNER_BEAM_WIDTH = 256
+
+# Greedy strategy defaults: price growth per level and the exponent of the
+# time penalty applied to each upgrade's value
+PRICE_GROWTH = 1.3
+TIME_PENALTY_EXPONENT = 1.5
+
+# Numeric modes of the greedy strategy: "float" prices with exact truncated
+# floats and fails once they overflow; "log" works with natural logs of
+# prices and times past LOG_PRICING_EXACT_LIMIT, so it never overflows
+PRICING_MODES = ("float", "log")
+LOG_PRICING_EXACT_LIMIT = 2 ** 53
+
+# Ad-watching cycle model: each step is a 70 second active block followed by
+# an ad worth `video_cycle[i]` minutes of production.
+VIDEO_CYCLE = (10, 10, 20, 20, 30)
+ACTIVE_BLOCK_SECONDS = 70
+
+
+def _times_to_reach(costs, cps, video_cycle=VIDEO_CYCLE):
+    """Table-driven evaluation of the video cycle model over NumPy arrays.
+
+    `cps` must already be quantized. The per-step accumulation mirrors the
+    original scalar loop operation for operation so results are identical.
+    """
+    costs, cps = np.broadcast_arrays(np.asarray(costs, dtype=float), np.asarray(cps, dtype=float))
+    steps = len(video_cycle)
+    cookies_per_cycle = cps * (steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60)
+    time_per_cycle = steps * ACTIVE_BLOCK_SECONDS / 60
+    step_time = ACTIVE_BLOCK_SECONDS / 60
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        full_cycles = np.trunc(costs / cookies_per_cycle)
+        remaining_cost = costs - full_cycles * cookies_per_cycle
+        total_time = full_cycles * time_per_cycle
+
+        total_cookies = np.zeros_like(total_time)
+        for minutes in video_cycle:
+            active = (remaining_cost > 0) & (total_cookies < remaining_cost)
+            total_cookies = np.where(active, total_cookies + cps * ACTIVE_BLOCK_SECONDS, total_cookies)
+            total_time = np.where(active, total_time + step_time, total_time)
+            total_cookies = np.where(active, total_cookies + cps * minutes * 60, total_cookies)
+
+    return np.where((cps > 0) & np.isfinite(total_time), total_time, np.inf)
+
+
+def calculate_times_to_reach(costs, cps, video_cycle=VIDEO_CYCLE):
+    """Vectorized time (in minutes) needed to afford each cost at each CPS.
+
+    `costs` and `cps` are broadcast against each other. CPS values are
+    truncated to thousandths, matching `calculate_time_to_reach_cost_cached`.
+    Unreachable costs (zero CPS, overflowed prices) yield `inf`.
+    """
+    cps = np.trunc(np.asarray(cps, dtype=float) * 1000) / 1000.0
+    return _times_to_reach(costs, cps, video_cycle)
+
+
+def _cycle_thresholds(cps, video_cycle=VIDEO_CYCLE):
+    """Cookies accumulated after each step of one video cycle at `cps`.
+
+    Built with the same sequential additions as the vectorized evaluator so
+    that step counts found by bisection are identical.
+    """
+    thresholds = []
+    total_cookies = 0
+    for minutes in video_cycle:
+        total_cookies += cps * ACTIVE_BLOCK_SECONDS
+        total_cookies += cps * minutes * 60
+        thresholds.append(total_cookies)
+    return thresholds
+
+
+def _time_to_reach(cost, cps, thresholds=None, video_cycle=VIDEO_CYCLE):
+    """Scalar counterpart of `_times_to_reach` for an already quantized CPS.
+
+    `thresholds` may be passed in (from `_cycle_thresholds(cps)`) when many
+    costs are evaluated at the same CPS.
+    """
     if cps <= 0:
         return float('inf')
-    
-    video_cycle = [10, 10, 20, 20, 30]
-    cookies_per_cycle = cps * (5 * 70 + sum(video_cycle) * 60)
-    time_per_cycle = 5 * 70 / 60
-    
-    full_cycles = int(cost / cookies_per_cycle) if cookies_per_cycle > 0 else 0
+    steps = len(video_cycle)
+    cookies_per_cycle = cps * (steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60)
+    try:
+        full_cycles = int(cost / cookies_per_cycle)
+    except (OverflowError, ValueError):
+        return float('inf')
     remaining_cost = cost - (full_cycles * cookies_per_cycle)
-    total_time = full_cycles * time_per_cycle
-    
+    total_time = full_cycles * (steps * ACTIVE_BLOCK_SECONDS / 60)
+
     if remaining_cost > 0:
-        video_index = 0
-        total_cookies = 0
-        while total_cookies < remaining_cost and video_index < 5:
-            total_cookies += cps * 70
-            total_time += 70 / 60
-            total_cookies += cps * video_cycle[video_index] * 60
-            video_index += 1
-    
+        if thresholds is None:
+            thresholds = _cycle_thresholds(cps, video_cycle)
+        for _ in range(min(bisect.bisect_left(thresholds, remaining_cost) + 1, steps)):
+            total_time += ACTIVE_BLOCK_SECONDS / 60
+
     return total_time
 
+
+# Past this many whole cycles the partial last cycle is below float resolution
+_LOG_EXACT_CYCLES = math.log(2 ** 52)
+
+def _log_time_to_reach(log_cost, cps, thresholds=None, video_cycle=VIDEO_CYCLE):
+    """Natural log of `_time_to_reach` for a cost given by its natural log
+
+    Never overflows: beyond 2**52 whole cycles the time is taken as the
+    whole-cycle time alone. Returns `inf` at zero CPS and `-inf` for a zero
+    time.
+    """
+    if cps <= 0:
+        return float('inf')
+    steps = len(video_cycle)
+    log_cycles = log_cost - math.log(cps * (steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60))
+    if log_cycles < _LOG_EXACT_CYCLES:
+        time = _time_to_reach(math.exp(log_cost), cps, thresholds, video_cycle)
+        return math.log(time) if time > 0 else float('-inf')
+    return log_cycles + math.log(steps * ACTIVE_BLOCK_SECONDS / 60)
+
+# Cache for performance optimization
+@functools.lru_cache(maxsize=2048)
+def calculate_time_to_reach_cost_cached(cps_key, cost_int, video_cycle=VIDEO_CYCLE):
+    """Cached scalar time calculation, `cps_key` being the CPS in thousandths"""
+    return _time_to_reach(cost_int, cps_key / 1000.0, video_cycle=video_cycle)
+
+# Upgrade table and /api/upgrades payload, cached under a version bumped after
+# every committed write to levels. ETags pair the version with this process's
+# boot ID so a restart never matches a stale client copy.
+_upgrade_state = {"version": 0, "upgrades": None, "payload": None}
+_upgrade_state_lock = threading.Lock()
+_boot_id = uuid.uuid4().hex[:8]
+
+def invalidate_upgrade_state(upgrades=None, payload=None):
+    """Start a new state version, optionally already knowing its upgrades and payload"""
+    with _upgrade_state_lock:
+        _upgrade_state["version"] += 1
+        _upgrade_state["upgrades"] = upgrades
+        _upgrade_state["payload"] = payload
+
+def upgrade_state_etag():
+    return f'{_boot_id}-{_upgrade_state["version"]}'
+
+def get_upgrade_state():
+    """Return `(etag, upgrades, payload)`, computing them on the first call after a write
+
+    `upgrades` and `payload` are shared between requests: treat them as
+    read-only.
+    """
+    with _upgrade_state_lock:
+        version = _upgrade_state["version"]
+        if _upgrade_state["payload"] is not None:
+            cached = upgrade_state_etag(), _upgrade_state["upgrades"], _upgrade_state["payload"]
+        else:
+            cached = None
+    count_cache("upgrade_state", cached is not None)
+    if cached is not None:
+        return cached
+    upgrades = load_upgrades()
+    payload = compute_upgrades_payload(upgrades)
+    with _upgrade_state_lock:
+        # A write committed meanwhile: serve this result but don't keep it
+        if _upgrade_state["version"] == version:
+            _upgrade_state["upgrades"] = upgrades
+            _upgrade_state["payload"] = payload
+    return f'{_boot_id}-{version}', upgrades, payload
+
 def load_upgrades(file_path='cookie_clicker_upgrades.json'):
     """Load upgrades from the SQLite DB. If DB is empty, init from JSON file."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT name, price, level, cps FROM upgrades ORDER BY position ASC")
-    rows = cur.fetchall()
-    conn.close()
+    with db_transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name, price, level, cps FROM upgrades ORDER BY position ASC")
+        rows = cur.fetchall()
     upgrades = []
     for r in rows:
         upgrades.append({
@@ -60,52 +217,732 @@ def load_upgrades(file_path='cookie_clicker_upgrades.json'):
 
 def save_upgrades(upgrades, file_path='cookie_clicker_upgrades.json'):
     """Save a list of upgrades into the DB (upsert)."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    for i, u in enumerate(upgrades):
-        cur.execute(
+    with journal_action("save") as (conn, action):
+        conn.executemany(
+            "INSERT INTO purchase_journal (action, upgrade, delta, level) "
+            "SELECT ?, ?, ? - COALESCE(u.level, 0), ? FROM (SELECT 1) LEFT JOIN upgrades u ON u.name = ? "
+            "WHERE u.level IS NOT ?",
+            [(action, u['name'], int(u.get('level', 0)), int(u.get('level', 0)), u['name'], int(u.get('level', 0)))
+             for u in upgrades]
+        )
+        conn.executemany(
             "INSERT INTO upgrades (name, price, level, cps, position) VALUES (?,?,?,?,?) "
             "ON CONFLICT(name) DO UPDATE SET price=excluded.price, level=excluded.level, cps=excluded.cps, position=excluded.position",
-            (u['name'], u['price'], int(u.get('level', 0)), u['cps'], i)
+            [(u['name'], u['price'], int(u.get('level', 0)), u['cps'], i) for i, u in enumerate(upgrades)]
         )
-    conn.commit()
-    conn.close()
+        on_commit(invalidate_upgrade_state)
 
-def update_upgrade_level(name, level):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE upgrades SET level = ? WHERE name = ?", (int(level), name))
-    conn.commit()
-    conn.close()
+def _write_levels(conn, action, levels):
+    """Journal and apply `levels` (upgrade name -> level) as part of `action`"""
+    conn.executemany(
+        "INSERT INTO purchase_journal (action, upgrade, delta, level) "
+        "SELECT ?, name, ? - level, ? FROM upgrades WHERE name = ? AND level != ?",
+        [(action, int(level), int(level), name, int(level)) for name, level in levels.items()])
+    conn.executemany("UPDATE upgrades SET level = ? WHERE name = ?",
+                     [(int(level), name) for name, level in levels.items()])
+    on_commit(invalidate_upgrade_state)
+
+def update_upgrade_levels(levels, label="set"):
+    """Set several levels (upgrade name -> level) in one statement batch, journaled as one action"""
+    with journal_action(label) as (conn, action):
+        _write_levels(conn, action, levels)
+
+def update_upgrade_level(name, level, label="set"):
+    update_upgrade_levels({name: level}, label)
+
+# Named snapshots of the upgrade levels, one `upgrade_snapshots` row per
+# (snapshot, upgrade). Each operation below is a single statement (plus
+# the journal entries of a restore).
+MAX_SNAPSHOT_NAME_LENGTH = 100
+# /api/reset keeps the levels it replaces as `pre-reset-...` snapshots; only
+# the newest ones are kept
+PRE_RESET_SNAPSHOT_PREFIX = 'pre-reset-'
+PRE_RESET_SNAPSHOT_RETENTION = 20
+
+def create_snapshot(name, replace=False):
+    """Copy the current levels into snapshot `name` and return its row count
+
+    Raises sqlite3.IntegrityError when the name is taken, unless `replace`.
+    """
+    verb = "INSERT OR REPLACE" if replace else "INSERT"
+    with db_transaction(write=True) as conn:
+        cur = conn.execute(
+            f"{verb} INTO upgrade_snapshots (snapshot, upgrade, level, created_at) "
+            "SELECT ?, name, level, ? FROM upgrades",
+            (name, datetime.now().isoformat(timespec='seconds')))
+        return cur.rowcount
+
+def list_snapshots():
+    with db_transaction() as conn:
+        rows = conn.execute(
+            "SELECT snapshot, MIN(created_at), COUNT(*), SUM(level) FROM upgrade_snapshots "
+            "GROUP BY snapshot ORDER BY MIN(created_at) DESC, snapshot").fetchall()
+    return [{"name": r[0], "created_at": r[1], "upgrades": r[2], "total_levels": r[3]} for r in rows]
+
+def snapshot_exists(name):
+    with db_transaction() as conn:
+        return conn.execute("SELECT 1 FROM upgrade_snapshots WHERE snapshot = ? LIMIT 1",
+                            (name,)).fetchone() is not None
+
+def diff_snapshot(name, against=None):
+    """Levels that differ between snapshot `name` and `against` (another
+    snapshot, or the current levels when None)
+
+    Returns `[{"name", "from", "to"}]` in table order; an upgrade missing on
+    one side has None there.
+    """
+    if against is None:
+        other, params = "SELECT name AS upgrade, level FROM upgrades", (name,)
+    else:
+        other, params = "SELECT upgrade, level FROM upgrade_snapshots WHERE snapshot = ?", (name, against)
+    with db_transaction() as conn:
+        rows = conn.execute(
+            "SELECT COALESCE(a.upgrade, b.upgrade), a.level, b.level "
+            "FROM (SELECT upgrade, level FROM upgrade_snapshots WHERE snapshot = ?) a "
+            f"FULL JOIN ({other}) b ON a.upgrade = b.upgrade "
+            "LEFT JOIN upgrades u ON u.name = COALESCE(a.upgrade, b.upgrade) "
+            "WHERE a.level IS NOT b.level ORDER BY u.position, 1", params).fetchall()
+    return [{"name": r[0], "from": r[1], "to": r[2]} for r in rows]
+
+def restore_snapshot(name):
+    """Set every upgrade in snapshot `name` back to its saved level
+
+    Returns the number of upgrades restored (0 for an unknown snapshot).
+    Upgrades added after the snapshot keep their level.
+    """
+    with journal_action("restore") as (conn, action):
+        conn.execute(
+            "INSERT INTO purchase_journal (action, upgrade, delta, level) "
+            "SELECT ?, u.name, s.level - u.level, s.level FROM upgrade_snapshots s "
+            "JOIN upgrades u ON u.name = s.upgrade WHERE s.snapshot = ? AND s.level != u.level",
+            (action, name))
+        cur = conn.execute(
+            "UPDATE upgrades SET level = s.level FROM upgrade_snapshots s "
+            "WHERE s.snapshot = ? AND s.upgrade = upgrades.name", (name,))
+        on_commit(invalidate_upgrade_state)
+        return cur.rowcount
+
+def prune_snapshots(prefix, keep):
+    """Delete all but the `keep` newest snapshots whose name starts with `prefix`"""
+    with db_transaction(write=True) as conn:
+        return conn.execute(
+            "DELETE FROM upgrade_snapshots WHERE snapshot IN ("
+            "SELECT snapshot FROM upgrade_snapshots WHERE substr(snapshot, 1, ?) = ? "
+            "GROUP BY snapshot ORDER BY MAX(rowid) DESC LIMIT -1 OFFSET ?)",
+            (len(prefix), prefix, keep)).rowcount
+
+def delete_snapshot(name):
+    with db_transaction(write=True) as conn:
+        return conn.execute("DELETE FROM upgrade_snapshots WHERE snapshot = ?", (name,)).rowcount
+
+def reset_to_defaults():
+    """Put every seeded upgrade back to its `defaults` seed level
+
+    Seeded upgrades missing from `upgrades` are re-added; the others keep
+    their price, cps and position.
+    """
+    with journal_action("reset") as (conn, action):
+        conn.execute(
+            "INSERT INTO purchase_journal (action, upgrade, delta, level) "
+            "SELECT ?, d.name, d.seed_level - COALESCE(u.level, 0), d.seed_level FROM defaults d "
+            "LEFT JOIN upgrades u ON u.name = d.name WHERE u.level IS NOT d.seed_level", (action,))
+        conn.execute(
+            "INSERT INTO upgrades (name, price, level, cps, position) "
+            "SELECT name, price, seed_level, cps, rowid - 1 FROM defaults WHERE true "
+            "ON CONFLICT (name) DO UPDATE SET level = excluded.level")
+        on_commit(invalidate_upgrade_state)
+
+# Purchase journal: every level change is appended to `purchase_journal`
+# (upgrade, delta, new level) under a `journal_actions` row (time, label and,
+# for undo/redo, the action reverted). `journal_checkpoints` holds full level
+# vectors at a journal position; replay starts from the nearest one.
+JOURNAL_CHECKPOINT_INTERVAL = 1000
+
+@contextlib.contextmanager
+def journal_action(label, kind="do", target=None):
+    """Write transaction whose level changes are journaled as one action
+
+    Yields `(conn, action_id)`. An action that changed nothing is dropped;
+    one that brings the journal JOURNAL_CHECKPOINT_INTERVAL entries past the
+    last checkpoint writes a new checkpoint.
+    """
+    with db_transaction(write=True) as conn:
+        action = conn.execute(
+            "INSERT INTO journal_actions (ts, kind, target, label) VALUES (?,?,?,?)",
+            (datetime.now().timestamp(), kind, target, label)).lastrowid
+        yield conn, action
+        last = conn.execute("SELECT MAX(seq) FROM purchase_journal WHERE action = ?", (action,)).fetchone()[0]
+        if last is None:
+            conn.execute("DELETE FROM journal_actions WHERE id = ?", (action,))
+        elif last - _last_checkpoint_seq(conn) >= JOURNAL_CHECKPOINT_INTERVAL:
+            write_journal_checkpoint()
+
+def _last_checkpoint_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM journal_checkpoints").fetchone()[0]
+
+def write_journal_checkpoint():
+    """Store the current levels as a checkpoint at the latest journal position"""
+    with db_transaction(write=True) as conn:
+        seq = max(conn.execute("SELECT COALESCE(MAX(seq), 0) FROM purchase_journal").fetchone()[0],
+                  _last_checkpoint_seq(conn))
+        conn.execute(
+            "INSERT OR REPLACE INTO journal_checkpoints (seq, ts, upgrade, level) "
+            "SELECT ?, ?, name, level FROM upgrades", (seq, datetime.now().timestamp()))
+        return seq
+
+def _replay(conn, base, seq):
+    """Levels (upgrade name -> level) after journal entry `seq`, from checkpoint `base`"""
+    rows = conn.execute(
+        "SELECT upgrade, level, MAX(seq) FROM ("
+        "SELECT upgrade, level, seq FROM journal_checkpoints WHERE seq = ? "
+        "UNION ALL SELECT upgrade, level, seq FROM purchase_journal WHERE seq > ? AND seq <= ?"
+        ") GROUP BY upgrade", (base, base, seq)).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+def _journal_position(conn, at):
+    """`(checkpoint seq, journal seq)` to replay for unix time `at`
+
+    Raises ValueError when `at` is older than every checkpoint.
+    """
+    base = conn.execute("SELECT MAX(seq) FROM journal_checkpoints WHERE ts <= ?", (at,)).fetchone()[0]
+    if base is None:
+        raise ValueError("No checkpoint that old")
+    seq = conn.execute(
+        "SELECT MAX(j.seq) FROM purchase_journal j JOIN journal_actions a ON a.id = j.action "
+        "WHERE j.seq > ? AND a.ts <= ?", (base, at)).fetchone()[0]
+    return base, seq if seq is not None else base
+
+def replay_levels(at=None):
+    """Upgrade levels as of unix time `at` (default: now), rebuilt from the journal"""
+    at = datetime.now().timestamp() if at is None else at
+    with db_transaction() as conn:
+        return _replay(conn, *_journal_position(conn, at))
+
+def list_journal(limit=50):
+    """The `limit` most recent actions, newest first, with their level changes"""
+    with db_transaction() as conn:
+        actions = conn.execute(
+            "SELECT id, ts, kind, target, label FROM journal_actions ORDER BY id DESC LIMIT ?",
+            (limit,)).fetchall()
+        changes = collections.defaultdict(list)
+        if actions:
+            for action, upgrade, delta, level in conn.execute(
+                    "SELECT action, upgrade, delta, level FROM purchase_journal WHERE action >= ? ORDER BY seq",
+                    (actions[-1][0],)):
+                changes[action].append({"name": upgrade, "delta": delta, "level": level})
+    return [{"id": a[0], "ts": a[1], "kind": a[2], "target": a[3], "label": a[4], "changes": changes[a[0]]}
+            for a in actions]
+
+def _revert_action(kind):
+    """Undo the latest applied action, or redo the latest undone one
+
+    Actions are grouped by the action they revert; a group's newest entry
+    tells whether it is applied. Redo is only possible until a new action
+    is journaled. Returns the reverted action's id, or None when there is
+    nothing to revert.
+    """
+    with db_transaction(write=True) as conn:
+        groups = ("SELECT COALESCE(target, id) AS action, kind, MAX(id) AS last FROM journal_actions "
+                  "GROUP BY COALESCE(target, id)")
+        if kind == "undo":
+            row = conn.execute(f"SELECT action, last FROM ({groups}) WHERE kind != 'undo' "
+                               "ORDER BY last DESC LIMIT 1").fetchone()
+        else:
+            row = conn.execute(f"SELECT action, last FROM ({groups}) WHERE kind = 'undo' "
+                               "AND last > (SELECT COALESCE(MAX(id), 0) FROM journal_actions WHERE kind = 'do') "
+                               "ORDER BY last DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        target, last = row
+        levels = dict(conn.execute(
+            "SELECT j.upgrade, u.level - j.delta FROM purchase_journal j JOIN upgrades u ON u.name = j.upgrade "
+            "WHERE j.action = ?", (last,)).fetchall())
+        if any(level < 0 for level in levels.values()):
+            raise ValueError(f"Cannot {kind} action {target}: a level would go negative")
+        label = conn.execute("SELECT label FROM journal_actions WHERE id = ?", (last,)).fetchone()[0]
+        with journal_action(label, kind, target) as (conn, action):
+            _write_levels(conn, action, levels)
+        return target
+
+def undo_last_action():
+    return _revert_action("undo")
+
+def redo_last_action():
+    return _revert_action("redo")
+
+def compact_journal(before=None):
+    """Fold journal actions older than unix time `before` (default: now) into a checkpoint
+
+    Replay and undo can no longer go past the checkpoint. Returns the
+    checkpoint's journal position and the number of entries removed.
+    """
+    before = datetime.now().timestamp() if before is None else before
+    with db_transaction(write=True) as conn:
+        action = conn.execute("SELECT MAX(id) FROM journal_actions WHERE ts < ?", (before,)).fetchone()[0]
+        seq = action and conn.execute("SELECT MAX(seq) FROM purchase_journal WHERE action <= ?",
+                                      (action,)).fetchone()[0]
+        if seq is None:
+            return {"checkpoint": None, "removed": 0}
+        base = conn.execute("SELECT MAX(seq) FROM journal_checkpoints WHERE seq <= ?", (seq,)).fetchone()[0]
+        ts = conn.execute("SELECT ts FROM journal_actions WHERE id = ?", (action,)).fetchone()[0]
+        conn.executemany(
+            "INSERT OR REPLACE INTO journal_checkpoints (seq, ts, upgrade, level) VALUES (?,?,?,?)",
+            [(seq, ts, name, level) for name, level in _replay(conn, base or 0, seq).items()])
+        removed = conn.execute("DELETE FROM purchase_journal WHERE seq <= ?", (seq,)).rowcount
+        conn.execute("DELETE FROM journal_actions WHERE id <= ?", (action,))
+        conn.execute("DELETE FROM journal_checkpoints WHERE seq < ?", (seq,))
+        return {"checkpoint": seq, "removed": removed}
+
+def journal_cps_timeline(since=None, until=None):
+    """Total CPS after each journaled action between unix times `since` and `until`
+
+    Starts with the total at `since` (default: the oldest checkpoint). Uses
+    the upgrades' current CPS values.
+    """
+    until = datetime.now().timestamp() if until is None else until
+    with db_transaction() as conn:
+        if since is None:
+            since, base = conn.execute(
+                "SELECT ts, seq FROM journal_checkpoints ORDER BY seq LIMIT 1").fetchone() or (None, None)
+            if base is None:
+                raise ValueError("No checkpoint that old")
+            seq = base
+        else:
+            base, seq = _journal_position(conn, since)
+        levels = _replay(conn, base, seq)
+        cps = dict(conn.execute("SELECT name, cps FROM upgrades").fetchall())
+        rows = conn.execute(
+            "SELECT a.id, a.ts, a.label, j.upgrade, j.level FROM purchase_journal j "
+            "JOIN journal_actions a ON a.id = j.action WHERE j.seq > ? AND a.ts <= ? ORDER BY j.seq",
+            (seq, until)).fetchall()
+
+    def total():
+        return sum(level * cps.get(name, 0) for name, level in levels.items())
+
+    points = [{"ts": since, "action": None, "label": None, "total_cps": total()}]
+    for action, group in itertools.groupby(rows, key=lambda r: r[:3]):
+        for _, _, _, upgrade, level in group:
+            levels[upgrade] = level
+        points.append({"ts": action[1], "action": action[0], "label": action[2], "total_cps": total()})
+    return points
+
+BACKUP_DIR = os.path.join(os.path.dirname(__file__), 'backups')
+# Pages copied per backup step; writers get the database between steps
+BACKUP_PAGES_PER_STEP = 256
+# Number of backups kept; older ones are deleted after each new backup
+BACKUP_RETENTION = 30
+_backup_lock = threading.Lock()
+# Held by the backup being copied: backups run one at a time
+_backup_worker_lock = threading.Lock()
+_pending_backups = set()
+# Futures of the latest backups (filename -> Future), for /api/backup/<filename>/status
+_backup_jobs = collections.OrderedDict()
 
 def ensure_dirs():
     base = os.path.dirname(__file__)
-    backups = os.path.join(base, 'backups')
-    os.makedirs(backups, exist_ok=True)
+    os.makedirs(BACKUP_DIR, exist_ok=True)
     os.makedirs(os.path.join(base, 'simulations'), exist_ok=True)
 
-def create_db_backup():
-    """Create a timestamped backup of data.db and return the backup filename."""
-    ensure_dirs()
-    db_path = os.path.join(os.path.dirname(__file__), 'data.db')
-    if not os.path.exists(db_path):
-        return None
+def _is_backup_file(filename):
+    return filename.startswith('data_backup_') and filename.endswith(('.db', '.db.gz'))
+
+def _new_backup_name(compress):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f'data_backup_{timestamp}.db'
-    backup_path = os.path.join(os.path.dirname(__file__), 'backups', backup_name)
+    suffix = '.db.gz' if compress else '.db'
+    with _backup_lock:
+        name, n = f'data_backup_{timestamp}{suffix}', 1
+        while name in _pending_backups or os.path.exists(os.path.join(BACKUP_DIR, name)):
+            n += 1
+            name = f'data_backup_{timestamp}_{n}{suffix}'
+        _pending_backups.add(name)
+    return name
+
+def _prune_backups():
+    backups = sorted((f for f in os.listdir(BACKUP_DIR) if _is_backup_file(f)),
+                     key=lambda f: os.path.getmtime(os.path.join(BACKUP_DIR, f)))
+    for filename in backups[:max(0, len(backups) - BACKUP_RETENTION)]:
+        os.remove(os.path.join(BACKUP_DIR, filename))
+
+def _run_backup(job, source, compress):
+    """Copy the pinned snapshot of `source` into the job's file, compressing it if asked"""
+    path = os.path.join(BACKUP_DIR, job["filename"])
+    partial_path = f'{path}.part'
+    try:
+        with contextlib.closing(sqlite3.connect(partial_path)) as target:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=0.001)
+        if compress:
+            with open(partial_path, 'rb') as raw, gzip.open(f'{partial_path}.gz', 'wb') as packed:
+                for chunk in iter(lambda: raw.read(1 << 20), b''):
+                    packed.write(chunk)
+            os.replace(f'{partial_path}.gz', path)
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, path)
+        _prune_backups()
+        return job["filename"]
+    finally:
+        source.close()
+        for leftover in (partial_path, f'{partial_path}.gz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        with _backup_lock:
+            _pending_backups.discard(job["filename"])
+
+def schedule_db_backup(compress=False):
+    """Start an online backup of the database on the background worker
+
+    Returns once the snapshot is pinned (a read transaction on a dedicated
+    connection), so writes made afterwards are not in the backup. The
+    pages are then copied with the SQLite backup API in steps of
+    BACKUP_PAGES_PER_STEP without blocking writers. The returned dict holds
+    the backup `filename` and a `future` resolving to it.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    job = {"filename": _new_backup_name(compress)}
+    source = get_db_connection()
     try:
-        import shutil
-        shutil.copy2(db_path, backup_path)
-        return backup_name
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    except Exception:
+        source.close()
+        with _backup_lock:
+            _pending_backups.discard(job["filename"])
+        raise
+    job["future"] = future = Future()
+    with _backup_lock:
+        _backup_jobs[job["filename"]] = future
+        finished = [name for name, f in _backup_jobs.items() if f.done()]
+        for name in finished[:max(0, len(finished) - BACKUP_RETENTION)]:
+            del _backup_jobs[name]
+
+    def _worker():
+        with _backup_worker_lock:
+            try:
+                future.set_result(_run_backup(job, source, compress))
+            except Exception as e:
+                future.set_exception(e)
+
+    threading.Thread(target=_worker, name='db-backup', daemon=True).start()
+    return job
+
+def backup_status(filename):
+    """`(status, error)` of a backup: "pending", "done" or "failed"; None when unknown"""
+    with _backup_lock:
+        future = _backup_jobs.get(filename)
+    if future is not None and not future.done():
+        return "pending", None
+    if future is not None and future.exception() is not None:
+        return "failed", str(future.exception())
+    if _is_backup_file(filename) and os.path.exists(os.path.join(BACKUP_DIR, filename)):
+        return "done", None
+    return None
+
+def wait_for_backup(filename):
+    """Block until a scheduled backup has been written (or has failed)"""
+    with _backup_lock:
+        future = _backup_jobs.get(filename)
+    if future is not None:
+        wait([future])
+
+def create_db_backup(compress=False):
+    """Create a timestamped backup of data.db and return the backup filename."""
+    try:
+        return schedule_db_backup(compress)["future"].result()
     except Exception as e:
         print(f'Backup creation failed: {e}')
         return None
 
+def restore_db_backup(filename):
+    """Replace the database contents with a backup, after backing up the current state
+
+    Returns the name of the safety backup. The copy goes through the SQLite
+    backup API into the live database, so the file is never swapped under
+    open connections; pooled connections and cached state are reset after.
+    """
+    wait_for_backup(filename)
+    path = os.path.join(BACKUP_DIR, filename)
+    if not _is_backup_file(filename) or os.path.basename(filename) != filename or not os.path.exists(path):
+        raise FileNotFoundError(filename)
+    
+    with contextlib.ExitStack() as stack:
+        if filename.endswith('.gz'):
+            unpacked = stack.enter_context(tempfile.NamedTemporaryFile(suffix='.db', delete=False))
+            stack.callback(os.remove, unpacked.name)
+            with gzip.open(path, 'rb') as packed:
+                for chunk in iter(lambda: packed.read(1 << 20), b''):
+                    unpacked.write(chunk)
+            unpacked.close()
+            path = unpacked.name
+        source = stack.enter_context(contextlib.closing(sqlite3.connect(path)))
+        if source.execute("PRAGMA quick_check").fetchone()[0] != 'ok':
+            raise ValueError("Backup file is corrupt")
+        
+        safety_backup = create_db_backup()
+        if not safety_backup:
+            raise RuntimeError("Could not back up the current database")
+        target = stack.enter_context(contextlib.closing(get_db_connection()))
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+    
+    close_db_connections()
+    invalidate_upgrade_state()
+    return safety_backup
+
+# Instrumentation exposed at /api/metrics: request counts and latency
+# histograms per route, time spent in named sections (database, simulation,
+# chart rendering, saving runs) and cache hit counters. Sections timed during
+# a request are also reported in its Server-Timing header.
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_metrics_lock = threading.Lock()
+_request_counts = collections.Counter()
+_request_latency = {}
+_section_times = collections.defaultdict(lambda: [0, 0.0])
+_cache_counts = collections.Counter()
+
+def record_section(section, elapsed):
+    """Add `elapsed` seconds to `section`"""
+    with _metrics_lock:
+        totals = _section_times[section]
+        totals[0] += 1
+        totals[1] += elapsed
+    if has_request_context() and '_sections' in g:
+        g._sections[section] += elapsed
+
+@contextlib.contextmanager
+def timed(section):
+    """Add the time spent in the enclosed block to `section`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_section(section, time.perf_counter() - start)
+
+def count_cache(cache, hit):
+    with _metrics_lock:
+        _cache_counts[(cache, "hit" if hit else "miss")] += 1
+
+def record_request(route, method, status, elapsed):
+    with _metrics_lock:
+        _request_counts[(route, method, status)] += 1
+        # Per-bucket counts (the last one past every bound), sum and count
+        histogram = _request_latency.setdefault(route, [[0] * (len(METRICS_LATENCY_BUCKETS) + 1), 0, 0.0])
+        histogram[0][bisect.bisect_left(METRICS_LATENCY_BUCKETS, elapsed)] += 1
+        histogram[1] += 1
+        histogram[2] += elapsed
+
+def _metric_labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    with _metrics_lock:
+        counts = dict(_request_counts)
+        latency = {route: (list(buckets), n, total) for route, (buckets, n, total) in _request_latency.items()}
+        sections = {name: tuple(totals) for name, totals in _section_times.items()}
+        caches = dict(_cache_counts)
+    lines = [
+        "# HELP cc_http_requests_total Requests served, by route, method and status.",
+        "# TYPE cc_http_requests_total counter",
+    ]
+    for (route, method, status), n in sorted(counts.items()):
+        lines.append(f"cc_http_requests_total{_metric_labels(route=route, method=method, status=status)} {n}")
+    lines += [
+        "# HELP cc_http_request_duration_seconds Request handling time, by route.",
+        "# TYPE cc_http_request_duration_seconds histogram",
+    ]
+    for route, (buckets, n, total) in sorted(latency.items()):
+        for bound, cumulative in zip(METRICS_LATENCY_BUCKETS, itertools.accumulate(buckets)):
+            lines.append(f"cc_http_request_duration_seconds_bucket{_metric_labels(route=route, le=bound)} {cumulative}")
+        lines.append(f"cc_http_request_duration_seconds_bucket{_metric_labels(route=route, le='+Inf')} {n}")
+        lines.append(f"cc_http_request_duration_seconds_sum{_metric_labels(route=route)} {total}")
+        lines.append(f"cc_http_request_duration_seconds_count{_metric_labels(route=route)} {n}")
+    lines += [
+        "# HELP cc_section_seconds_total Time spent in instrumented sections (db, simulation, chart_render, simulation_save).",
+        "# TYPE cc_section_seconds_total counter",
+    ]
+    lines += [f"cc_section_seconds_total{_metric_labels(section=name)} {total}"
+              for name, (_, total) in sorted(sections.items())]
+    lines += [
+        "# HELP cc_section_calls_total Times each instrumented section ran.",
+        "# TYPE cc_section_calls_total counter",
+    ]
+    lines += [f"cc_section_calls_total{_metric_labels(section=name)} {n}"
+              for name, (n, _) in sorted(sections.items())]
+
+    lines += [
+        "# HELP cc_cache_requests_total Cache lookups, by cache and result.",
+        "# TYPE cc_cache_requests_total counter",
+    ]
+    lines += [f"cc_cache_requests_total{_metric_labels(cache=cache, result=result)} {n}"
+              for (cache, result), n in sorted(caches.items())]
+    lines += [
+        "# HELP cc_cache_hit_ratio Share of lookups answered from the cache.",
+        "# TYPE cc_cache_hit_ratio gauge",
+    ]
+    for cache in sorted({cache for cache, _ in caches}):
+        hits, misses = caches.get((cache, "hit"), 0), caches.get((cache, "miss"), 0)
+        lines.append(f"cc_cache_hit_ratio{_metric_labels(cache=cache)} {hits / (hits + misses) if hits + misses else 0.0}")
+    lines += [
+        "# HELP cc_upgrade_state_version Version of the cached upgrade state.",
+        "# TYPE cc_upgrade_state_version gauge",
+        f"cc_upgrade_state_version {_upgrade_state['version']}",
+    ]
+    return '\n'.join(lines) + '\n'
+
 def get_db_connection():
     db_path = os.path.join(os.path.dirname(__file__), 'data.db')
-    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
     return conn
 
+# Connections handed out by db_transaction(): opened through get_db_connection(),
+# switched to autocommit so transactions are explicit, configured once with
+# DB_PRAGMAS and kept for reuse (with their statement caches) between requests
+DB_POOL_SIZE = 8
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000"
+)
+_db_idle = []
+_db_pool_lock = threading.Lock()
+_db_generation = 0
+_db_local = threading.local()
+_db_commit_lock = threading.Lock()
+
+def _checkout_connection():
+    with _db_pool_lock:
+        while _db_idle:
+            generation, conn = _db_idle.pop()
+            if generation == _db_generation:
+                return generation, conn
+            conn.close()
+        generation = _db_generation
+    conn = get_db_connection()
+    conn.isolation_level = None
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return generation, conn
+
+def _release_connection(generation, conn):
+    if conn.in_transaction:
+        conn.rollback()
+    with _db_pool_lock:
+        if generation == _db_generation and len(_db_idle) < DB_POOL_SIZE:
+            _db_idle.append((generation, conn))
+            return
+    conn.close()
+
+def close_db_connections():
+    """Close pooled connections; ones in use are closed when released"""
+    global _db_generation
+    with _db_pool_lock:
+        _db_generation += 1
+        idle = _db_idle[:]
+        del _db_idle[:]
+    for _, conn in idle:
+        conn.close()
+
+class _TimedCursor:
+    """Cursor proxy adding the time of each SQLite call to its connection's `elapsed`"""
+
+    def __init__(self, cursor, owner):
+        self._cursor = cursor
+        self._owner = owner
+
+    def _call(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._owner.elapsed += time.perf_counter() - start
+
+    def execute(self, *args):
+        self._call(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._call(self._cursor.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._call(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._call(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._call(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _TimedConnection:
+    """Connection proxy timing statements and commits only, not the Python
+    work done between them inside a transaction"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.elapsed = 0.0
+
+    def cursor(self):
+        return _TimedCursor(self._conn.cursor(), self)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+@contextlib.contextmanager
+def db_transaction(write=False):
+    """Run the enclosed queries in one transaction on a pooled connection
+
+    Nested uses on the same thread join the outermost transaction, so a
+    request wrapping several helpers commits once. `write` takes the write
+    lock up front (BEGIN IMMEDIATE) instead of upgrading a read lock. The
+    time spent in SQLite calls is added to the "db" section.
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is not None:
+        yield conn
+        return
+    generation, raw_conn = _checkout_connection()
+    conn = _TimedConnection(raw_conn)
+    _db_local.conn = conn
+    _db_local.on_commit = []
+    try:
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        yield conn
+        # Transactions with callbacks commit and run them in commit order
+        with _db_commit_lock if _db_local.on_commit else contextlib.nullcontext():
+            conn.commit()
+            for callback in _db_local.on_commit:
+                callback()
+    finally:
+        _db_local.conn = None
+        _release_connection(generation, raw_conn)
+        record_section("db", conn.elapsed)
+
+def on_commit(callback):
+    """Call `callback` once the current db_transaction() commits"""
+    _db_local.on_commit.append(callback)
+
 def init_db(json_path='cookie_clicker_upgrades.json'):
     """Ensure DB schema and seed defaults using Alembic migrations.
 
@@ -128,6 +965,67 @@ def init_db(json_path='cookie_clicker_upgrades.json'):
                 position INTEGER NOT NULL DEFAULT 0
             )
         ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS simulations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL UNIQUE,
+                timestamp TEXT NOT NULL,
+                total_purchases INTEGER NOT NULL,
+                final_cps REAL NOT NULL,
+                total_time REAL NOT NULL,
+                total_cookies REAL NOT NULL
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS defaults (
+                name TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                cps REAL NOT NULL,
+                seed_level INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS upgrade_snapshots (
+                snapshot TEXT NOT NULL,
+                upgrade TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (snapshot, upgrade)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS journal_actions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                kind TEXT NOT NULL,
+                target INTEGER,
+                label TEXT NOT NULL
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS purchase_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                action INTEGER NOT NULL,
+                upgrade TEXT NOT NULL,
+                delta INTEGER NOT NULL,
+                level INTEGER NOT NULL
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS journal_checkpoints (
+                seq INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                upgrade TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                PRIMARY KEY (seq, upgrade)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_journal_actions_ts ON journal_actions (ts)')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_purchase_journal_action ON purchase_journal (action)')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_journal_checkpoints_ts ON journal_checkpoints (ts)')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_simulations_timestamp ON simulations (timestamp)')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_simulations_final_cps ON simulations (final_cps)')
+        cur.execute('CREATE INDEX IF NOT EXISTS ix_simulations_total_purchases ON simulations (total_purchases)')
         # Populate from seeds (prefer seeds.py, fallback to JSON file)
         try:
             import importlib.util
@@ -162,6 +1060,16 @@ def init_db(json_path='cookie_clicker_upgrades.json'):
                 "INSERT OR REPLACE INTO upgrades (name, price, level, cps, position) VALUES (?,?,?,?,?)",
                 (name, price, seed_level, cps, pos)
             )
+            cur.execute(
+                "INSERT OR REPLACE INTO defaults (name, price, cps, seed_level) VALUES (?,?,?,?)",
+                (name, price, cps, seed_level)
+            )
+
+        # Replay starts from the seeded levels
+        cur.execute(
+            "INSERT OR IGNORE INTO journal_checkpoints (seq, ts, upgrade, level) SELECT 0, ?, name, level FROM upgrades",
+            (datetime.now().timestamp(),)
+        )
 
         conn.commit()
         conn.close()
@@ -169,92 +1077,1480 @@ def init_db(json_path='cookie_clicker_upgrades.json'):
 def calculate_total_cps(upgrades):
     return sum(u["level"] * u["cps"] for u in upgrades if u["level"] > 0)
 
-def compute_upgrade_value(upgrade):
-    truncated_price = int(upgrade['price'] * (1.3 ** upgrade['level']))
+# Truncated prices by level, per (base price, growth) pair. Tables only grow
+# (lazily, past the highest level asked for) and stop where the float math
+# overflows, so every caller prices an upgrade with the same truncation.
+# Only PRICE_GROWTH is tabled: growths sent by clients (sweeps, batch
+# scenarios) would each keep a table per upgrade for the process lifetime.
+_price_tables = {}
+_price_tables_full = set()
+_price_tables_lock = threading.Lock()
+
+def _price_table(base_price, price_growth, level):
+    key = (base_price, price_growth)
+    table = _price_tables.get(key)
+    if (table is None or level >= len(table)) and key not in _price_tables_full:
+        with _price_tables_lock:
+            table = _price_tables.setdefault(key, [])
+            try:
+                for lvl in range(len(table), max(level + 1, 2 * len(table), 64)):
+                    table.append(int(base_price * (price_growth ** lvl)))
+            except OverflowError:
+                _price_tables_full.add(key)
+    return table
+
+def upgrade_price(base_price, level, price_growth=PRICE_GROWTH):
+    """Price of an upgrade at `level`: `int(base_price * price_growth ** level)`
+
+    Raises OverflowError once the price leaves the float range.
+    """
+    if price_growth != PRICE_GROWTH:
+        return int(base_price * (price_growth ** level))
+    table = _price_table(base_price, price_growth, level)
+    if level >= len(table):
+        raise OverflowError("upgrade price out of range")
+    return table[level]
+
+def upgrade_log_price(base_price, level, price_growth=PRICE_GROWTH):
+    """Natural log of an upgrade's (untruncated) price at `level`"""
+    return math.log(base_price) + level * math.log(price_growth)
+
+def _exact_price(base_price, level, price_growth, log_price):
+    """Truncated price for log mode, or None above LOG_PRICING_EXACT_LIMIT"""
+    # The log check keeps huge prices from being built at all
+    if log_price > math.log(LOG_PRICING_EXACT_LIMIT) + 1e-9:
+        return None
+    price = upgrade_price(base_price, level, price_growth)
+    return price if price <= LOG_PRICING_EXACT_LIMIT else None
+
+def _log_cps(cps):
+    """`log(cps)`, or -inf for upgrades that add no CPS (ranked last, as a zero value is)"""
+    return math.log(cps) if cps > 0 else float('-inf')
+
+def compute_upgrade_value(upgrade, price_growth=PRICE_GROWTH, pricing="float"):
+    """CPS gained per cookie spent on the next level; its natural log in "log" pricing"""
+    if pricing == "log":
+        return _log_cps(upgrade['cps']) - upgrade_log_price(upgrade['price'], upgrade['level'], price_growth)
+    truncated_price = upgrade_price(upgrade['price'], upgrade['level'], price_growth)
     return upgrade['cps'] / truncated_price
 
-def get_best_upgrade(upgrades):
+def _log_mode_compare(eff, log_eff, other_eff, other_log_eff):
+    """Order two "log" pricing scores: float efficiencies when both have one, else log scores"""
+    if eff is not None and other_eff is not None:
+        return (eff > other_eff) - (eff < other_eff)
+    return (log_eff > other_log_eff) - (log_eff < other_log_eff)
+
+def _log_mode_score(price, log_price, cps_value, cps, thresholds, exponent, video_cycle=VIDEO_CYCLE):
+    """Score one candidate in "log" pricing: `(efficiency, log_efficiency, log_time)`
+
+    With an exact `price` the float-mode efficiency is computed as usual and
+    kept while it is a normal float; otherwise `efficiency` is None and the
+    score comes from logs alone. `log_efficiency` is None when unreachable.
+    """
+    if price == 0:
+        return None, None, float('-inf')
+    if price is not None:
+        time = _time_to_reach(price, cps, thresholds, video_cycle)
+        if time != float('inf') and time > 0:
+            time_penalty = _time_penalty(time, exponent)
+            efficiency = (cps_value / price) / time_penalty if time_penalty > 0 else 0
+            if efficiency >= sys.float_info.min:
+                return efficiency, math.log(efficiency), math.log(time)
+    log_time = _log_time_to_reach(log_price, cps, thresholds, video_cycle)
+    if not float('-inf') < log_time < float('inf'):
+        return None, None, log_time
+    return None, _log_cps(cps_value) - log_price - exponent * log_time, log_time
+
+def _time_penalty(time, exponent):
+    try:
+        return time ** exponent
+    except OverflowError:
+        return float('inf')
+
+def _unlocked_indices(upgrades):
+    return [i for i, u in enumerate(upgrades)
+            if u["level"] > 0 or i == 0 or (u["level"] == 0 and upgrades[i - 1]["level"] >= 1)]
+
+def compute_upgrade_metrics(upgrades, total_cps=None, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                            price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Compute price, time, value and penalized efficiency of every unlocked upgrade
+
+    Times to reach are evaluated for all candidates in a single vectorized
+    call. `reachable` is False when the time is infinite or zero, in which
+    case the upgrade cannot be recommended and its efficiency is 0.
+    See `_compute_log_metrics` for `pricing="log"`.
+    """
+    indices = _unlocked_indices(upgrades)
+    if not indices:
+        return []
+    if total_cps is None:
+        total_cps = calculate_total_cps(upgrades)
+
+    unlocked = [upgrades[i] for i in indices]
+    if pricing == "log":
+        return _compute_log_metrics(unlocked, total_cps, time_penalty_exponent, price_growth, video_cycle)
+    prices = [upgrade_price(u['price'], u['level'], price_growth) for u in unlocked]
+    times = calculate_times_to_reach(prices, total_cps, video_cycle)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.array([u['cps'] for u in unlocked], dtype=float) / np.array(prices, dtype=float)
+    reachable = np.isfinite(times) & (times > 0)
+
+    metrics = []
+    for u, price, t, v, r in zip(unlocked, prices, times.tolist(), values.tolist(), reachable.tolist()):
+        efficiency = 0
+        if r:
+            # Apply exponential penalty to time: longer times are exponentially worse.
+            # Computed with Python floats (libm pow) rather than np.power, whose
+            # last-bit rounding differs and would reorder near-ties.
+            time_penalty = _time_penalty(t, time_penalty_exponent)
+            efficiency = v / time_penalty if time_penalty > 0 else 0
+        metrics.append({
+            "upgrade": u,
+            "price": price,
+            "time": t,
+            "value": v,
+            "efficiency": efficiency,
+            "reachable": r
+        })
+    return metrics
+
+def _compute_log_metrics(unlocked, total_cps, time_penalty_exponent, price_growth, video_cycle):
+    """Metrics of `compute_upgrade_metrics` in "log" pricing
+
+    Adds `log_price`, `log_time` and `log_efficiency` (natural logs). `price`
+    is None above LOG_PRICING_EXACT_LIMIT, `time` is `inf` past the float
+    range and `efficiency` is None when only the log score is meaningful.
+    """
+    cps = int(total_cps * 1000) / 1000.0
+    thresholds = _cycle_thresholds(cps, video_cycle)
+    metrics = []
+    for u in unlocked:
+        log_price = upgrade_log_price(u['price'], u['level'], price_growth)
+        price = _exact_price(u['price'], u['level'], price_growth, log_price)
+        efficiency, log_efficiency, log_time = _log_mode_score(
+            price, log_price, u['cps'], cps, thresholds, time_penalty_exponent, video_cycle)
+        try:
+            time = math.exp(log_time)
+        except OverflowError:
+            time = float('inf')
+        metrics.append({
+            "upgrade": u,
+            "price": price,
+            "time": time,
+            "value": u['cps'] / price if price else math.exp(_log_cps(u['cps']) - log_price),
+            "efficiency": efficiency,
+            "reachable": log_efficiency is not None,
+            "log_price": log_price,
+            "log_time": log_time,
+            "log_efficiency": log_efficiency
+        })
+    return metrics
+
+def get_best_upgrade(upgrades, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                     price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
     """Calculate and return the best upgrade with efficiency metrics
     
     Uses exponential time penalty to heavily discourage long-wait upgrades.
     The efficiency formula: value / (time_to_reach ^ time_penalty_exponent)
     This ensures that upgrades requiring long wait times are significantly penalized.
+
+    Time penalty exponent: higher values = more aggressive penalty for long waits
+    (1.0 = linear, 1.5-2.0 = exponential penalty). `price_growth` is the price
+    multiplier per level and `video_cycle` the ad minutes of each cycle step.
+    `pricing="log"` keeps ranking upgrades once prices leave the float range.
     """
-    unlocked = [u for i, u in enumerate(upgrades) 
-                if u["level"] > 0 or i == 0 or (u["level"] == 0 and upgrades[i - 1]["level"] >= 1)]
-    
-    if not unlocked:
-        return None
-    
-    total_cps = calculate_total_cps(upgrades)
-    candidates = []
-    
-    # Time penalty exponent: higher values = more aggressive penalty for long waits
-    # 1.0 = linear (old behavior), 1.5-2.0 = exponential penalty
-    time_penalty_exponent = 1.5
-    
-    for u in unlocked:
-        truncated_price = int(u['price'] * (1.3 ** u['level']))
-        time_to_reach = calculate_time_to_reach_cost_cached(int(total_cps * 1000), int(truncated_price))
-        
-        if time_to_reach != float('inf') and time_to_reach > 0:
-            value = compute_upgrade_value(u)
-            # Apply exponential penalty to time: longer times are exponentially worse
-            time_penalty = time_to_reach ** time_penalty_exponent
-            efficiency_ratio = value / time_penalty if time_penalty > 0 else 0
-            candidates.append({
-                "name": u["name"],
-                "level": u["level"],
-                "price": truncated_price,
-                "cps": u["cps"],
-                "value": value,
-                "time": time_to_reach,
-                "efficiency": efficiency_ratio
-            })
+    return _select_best(compute_upgrade_metrics(
+        upgrades,
+        time_penalty_exponent=time_penalty_exponent,
+        price_growth=price_growth,
+        video_cycle=video_cycle,
+        pricing=pricing
+    ))
+
+def _select_best(metrics):
+    candidates = [{
+        "name": m["upgrade"]["name"],
+        "level": m["upgrade"]["level"],
+        "price": m["price"],
+        "cps": m["upgrade"]["cps"],
+        "value": m["value"],
+        "time": m["time"],
+        "efficiency": m["efficiency"],
+        **{k: m[k] for k in ("log_price", "log_time", "log_efficiency") if k in m}
+    } for m in metrics if m["reachable"]]
     
     if not candidates:
         return None
     
+    if 'log_efficiency' in candidates[0]:
+        best = candidates[0]
+        for c in candidates[1:]:
+            if _log_mode_compare(c['efficiency'], c['log_efficiency'], best['efficiency'], best['log_efficiency']) > 0:
+                best = c
+        return best
     return max(candidates, key=lambda c: c['efficiency'])
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def _cycle_bound_factor(video_cycle=VIDEO_CYCLE):
+    """Largest `a` such that time_to_reach >= a * time_per_cycle * cost / cookies_per_cycle.
 
-@app.route('/api/upgrades')
-def get_upgrades():
-    upgrades = load_upgrades()
-    total_cps = calculate_total_cps(upgrades)
-    best = get_best_upgrade(upgrades)
-    
-    # Calculate metrics for all unlocked upgrades and normalize efficiency
-    temp_metrics = []
-    # Use the same time-penalty exponent as in get_best_upgrade to compute
-    # the per-upgrade raw efficiency so that the ranking shown to users
-    # matches the internal "best" computation.
-    time_penalty_exponent = 1.5
-    for i, u in enumerate(upgrades):
-        if u["level"] > 0 or i == 0 or (u["level"] == 0 and upgrades[i - 1]["level"] >= 1):
-            price = int(u['price'] * (1.3 ** u['level']))
-            time = calculate_time_to_reach_cost_cached(int(total_cps * 1000), int(price))
-            value = compute_upgrade_value(u)
-            # raw efficiency now uses the same exponential time penalty as
-            # get_best_upgrade: value / (time ^ time_penalty_exponent)
-            raw_eff = 0
-            if time is not None and time != float('inf') and time > 0:
-                time_penalty = time ** time_penalty_exponent
-                raw_eff = (value / time_penalty) if time_penalty > 0 else 0
-
-            temp_metrics.append({
-                **u,
-                "current_price": price,
-                "time_to_reach": time if time != float('inf') else None,
-                "value": value,
-                "raw_efficiency": raw_eff,
-                "is_best": best and u["name"] == best["name"]
-            })
+    Within a cycle the elapsed time is a step function of the cookies still
+    needed; the factor is the worst ratio between the fraction of cycle time
+    spent and the fraction of cycle cookies earned after each step.
+    """
+    steps = len(video_cycle)
+    cycle_cookies = steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60
+    factor = 1.0
+    cookies = 0
+    for k, minutes in enumerate(video_cycle, start=1):
+        cookies += ACTIVE_BLOCK_SECONDS + minutes * 60
+        factor = min(factor, (k / steps) / (cookies / cycle_cookies))
+    return factor
 
-    # Normalize efficiencies so best => 1 and weakest => 0 (linear scale)
+
+def iter_greedy_purchases(upgrades, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                          price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Yield the greedy purchase sequence starting from the given levels
+
+    Produces exactly the purchases repeated `get_best_upgrade` calls would
+    pick, as `(index, price, time_to_reach, total_cps)` tuples where
+    `total_cps` is the CPS after the purchase. `upgrades` is not modified.
+    With `pricing="log"`, price and time are natural logs and the sequence
+    goes on past the float range, where the float mode stops.
+
+    Only the bought upgrade is re-priced. Total CPS is re-summed from the
+    level vector with the same expression as `calculate_total_cps`: a float
+    running total drifts enough to change the quantized CPS on long runs.
+
+    Candidates sit in a heap keyed by the log of an upper bound of their
+    efficiency that scales with `cps ** time_penalty_exponent` for every
+    upgrade alike, so the ordering survives CPS changes and each step only
+    evaluates candidates until the bound falls below the best exact score.
+    Logs keep the bound meaningful where the scores themselves underflow.
+    """
+    if time_penalty_exponent < 0:
+        raise ValueError("time_penalty_exponent must not be negative")
+    if pricing not in PRICING_MODES:
+        raise ValueError(f"pricing must be one of {', '.join(PRICING_MODES)}")
+    log_pricing = pricing == "log"
+    video_cycle = tuple(video_cycle)
+    steps = len(video_cycle)
+    cycle_cookies = steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60
+    cycle_time = steps * ACTIVE_BLOCK_SECONDS / 60
+    # Time is at least `bound_factor * cycle_time * price / (cycle_cookies * cps)`
+    log_time_factor = math.log(_cycle_bound_factor(video_cycle) * cycle_time / cycle_cookies)
+    # Guards the bound against rounding of the exact score and of the logs
+    log_slack = 1e-9
+
+    levels = [int(u['level']) for u in upgrades]
+    base_prices = [u['price'] for u in upgrades]
+    cps_values = [u['cps'] for u in upgrades]
+    prices = [None] * len(upgrades)
+    values = [None] * len(upgrades)
+    log_prices = [None] * len(upgrades)
+    total_cps = calculate_total_cps(upgrades)
+
+    def key(i):
+        """Re-price upgrade `i`; return its heap entry or None once unaffordable"""
+        if log_pricing:
+            log_prices[i] = upgrade_log_price(base_prices[i], levels[i], price_growth)
+            prices[i] = _exact_price(base_prices[i], levels[i], price_growth, log_prices[i])
+            if prices[i] == 0:
+                return None
+            log_price = math.log(prices[i]) if prices[i] else log_prices[i]
+        else:
+            try:
+                prices[i] = upgrade_price(base_prices[i], levels[i], price_growth)
+                values[i] = cps_values[i] / prices[i]
+            except (OverflowError, ZeroDivisionError):
+                return None
+            log_price = math.log(prices[i])
+        log_weight = _log_cps(cps_values[i]) - log_price - time_penalty_exponent * (log_time_factor + log_price)
+        return (-log_weight, i)
+
+    unlocked = set(_unlocked_indices(upgrades))
+    heap = [entry for entry in map(key, sorted(unlocked)) if entry is not None]
+    heapq.heapify(heap)
+
+    while heap:
+        cps = int(total_cps * 1000) / 1000.0
+        if cps <= 0:
+            return
+        thresholds = _cycle_thresholds(cps, video_cycle)
+        log_scale = time_penalty_exponent * math.log(cps) + log_slack
+
+        popped = []
+        best = best_time = None
+        best_eff = 0
+        best_log_eff = float('-inf')
+        while heap:
+            neg_log_weight, i = heap[0]
+            if log_pricing:
+                if log_scale - neg_log_weight < best_log_eff:
+                    break
+            # Subnormal scores carry too little precision to prune against
+            elif best_eff >= sys.float_info.min and log_scale - neg_log_weight < math.log(best_eff):
+                break
+            popped.append(heapq.heappop(heap))
+            if log_pricing:
+                eff, log_eff, log_time = _log_mode_score(prices[i], log_prices[i], cps_values[i], cps,
+                                                         thresholds, time_penalty_exponent, video_cycle)
+                if log_eff is None:
+                    continue
+                order = 1 if best is None else _log_mode_compare(eff, log_eff, best_eff, best_log_eff)
+                if order > 0 or (order == 0 and i < best):
+                    best, best_eff, best_log_eff, best_time = i, eff, log_eff, log_time
+                continue
+            time = _time_to_reach(prices[i], cps, thresholds, video_cycle)
+            if time == float('inf') or time <= 0:
+                continue
+            time_penalty = _time_penalty(time, time_penalty_exponent)
+            eff = values[i] / time_penalty if time_penalty > 0 else 0
+            # Ties go to the earliest upgrade, like max() over the ordered list
+            if best is None or eff > best_eff or (eff == best_eff and i < best):
+                best, best_eff, best_time = i, eff, time
+
+        if best is None:
+            return
+
+        if log_pricing:
+            price = math.log(prices[best]) if prices[best] else log_prices[best]
+        else:
+            price = prices[best]
+        levels[best] += 1
+        total_cps = sum(l * c for l, c in zip(levels, cps_values) if l > 0)
+        for entry in popped:
+            if entry[1] != best:
+                heapq.heappush(heap, entry)
+        entry = key(best)
+        if entry is not None:
+            heapq.heappush(heap, entry)
+        nxt = best + 1
+        if nxt < len(upgrades) and nxt not in unlocked:
+            unlocked.add(nxt)
+            entry = key(nxt)
+            if entry is not None:
+                heapq.heappush(heap, entry)
+
+        yield best, price, best_time, total_cps
+
+# Greedy purchase sequences are memoized under a hash of the upgrade table and
+# strategy constants, in memory and under SIMULATION_CACHE_DIR, both LRU
+SIMULATION_CACHE_DIR = os.path.join('simulations', 'cache')
+SIMULATION_CACHE_MAX_PURCHASES = 2_000_000
+SIMULATION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_simulation_cache = collections.OrderedDict()
+_simulation_cache_lock = threading.Lock()
+
+def simulation_cache_key(upgrades, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                         price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Hash the inputs that determine the greedy purchase sequence"""
+    payload = json.dumps({
+        "upgrades": [[u["name"], u["price"], u["cps"], int(u["level"])] for u in upgrades],
+        "time_penalty_exponent": time_penalty_exponent,
+        "price_growth": price_growth,
+        "video_cycle": list(video_cycle),
+        "pricing": pricing
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _simulation_cache_path(key):
+    return os.path.join(SIMULATION_CACHE_DIR, f'{key}.npz')
+
+def get_cached_purchases(key):
+    """Return the longest memoized run for `key` as a dict of arrays, or None
+
+    Runs hold `index`, `price`, `time` and `cps` arrays (one item per
+    purchase, prices are exact as floats) and `exhausted`, set when the
+    greedy loop stopped on its own before the requested count. Runs also
+    record where they start: the `levels` array and the `table` key (see
+    `_find_cached_run`).
+    """
+    entry = _lookup_cached_purchases(key)
+    count_cache("simulation", entry is not None)
+    return entry
+
+def _lookup_cached_purchases(key):
+    """`get_cached_purchases` without counting the lookup in the cache metrics"""
+    with _simulation_cache_lock:
+        entry = _simulation_cache.get(key)
+        if entry is not None:
+            _simulation_cache.move_to_end(key)
+    if entry is not None:
+        return entry
+    path = _simulation_cache_path(key)
+    try:
+        with np.load(path) as data:
+            entry = {name: data[name] for name in ("index", "price", "time", "cps")}
+            entry["exhausted"] = bool(data["exhausted"])
+            if "levels" in data:
+                entry["levels"], entry["table"] = data["levels"], str(data["table"])
+        os.utime(path)
+    except (OSError, KeyError, ValueError):
+        return None
+    _remember_purchases(key, entry)
+    return entry
+
+def _remember_purchases(key, entry):
+    with _simulation_cache_lock:
+        _simulation_cache[key] = entry
+        _simulation_cache.move_to_end(key)
+        total = sum(len(e["index"]) for e in _simulation_cache.values())
+        while total > SIMULATION_CACHE_MAX_PURCHASES and len(_simulation_cache) > 1:
+            _, evicted = _simulation_cache.popitem(last=False)
+            total -= len(evicted["index"])
+
+def store_cached_purchases(key, entry):
+    """Memoize a run in memory and on disk, evicting least recently used runs"""
+    current = _lookup_cached_purchases(key)
+    if current is not None and (current["exhausted"] or len(current["index"]) >= len(entry["index"])):
+        return
+    _remember_purchases(key, entry)
+    
+    os.makedirs(SIMULATION_CACHE_DIR, exist_ok=True)
+    path = _simulation_cache_path(key)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.part'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **entry)
+    os.replace(tmp_path, path)
+    
+    files = []
+    for filename in os.listdir(SIMULATION_CACHE_DIR):
+        if filename.endswith('.npz'):
+            stat = os.stat(os.path.join(SIMULATION_CACHE_DIR, filename))
+            files.append((stat.st_mtime, stat.st_size, filename))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, filename in files[:-1]:
+        if total <= SIMULATION_CACHE_MAX_BYTES:
+            break
+        os.remove(os.path.join(SIMULATION_CACHE_DIR, filename))
+        total -= size
+
+def _find_cached_run(table, levels):
+    """A memoized run in memory that passes through `levels`, as (key, entry, offset)
+
+    The greedy sequence only depends on the current levels, so from any
+    state a run reached, the rest of that run is the sequence from there.
+    `table` is the cache key of the upgrade table at level 0; the purchase
+    count that could lead to `levels` fixes the offset to check.
+    """
+    with _simulation_cache_lock:
+        runs = [(key, entry) for key, entry in reversed(_simulation_cache.items()) if entry.get("table") == table]
+    for key, entry in runs:
+        bought = levels - entry["levels"]
+        offset = int(bought.sum())
+        if bought.min() < 0 or offset > len(entry["index"]):
+            continue
+        if np.array_equal(np.bincount(entry["index"][:offset], minlength=len(bought)), bought):
+            with _simulation_cache_lock:
+                if key in _simulation_cache:
+                    _simulation_cache.move_to_end(key)
+            return key, entry, offset
+    return None
+
+def iter_memoized_purchases(upgrades, total_purchases, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                            price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Yield the first `total_purchases` items of `iter_greedy_purchases`, memoized
+
+    A cached run at least as long is replayed; a shorter one is replayed
+    and then extended from the levels it reached, and the longer run is
+    cached when the generator finishes or is closed. Levels some cached run
+    went through (e.g. after buying what it bought first) replay the rest
+    of that run.
+    """
+    key = simulation_cache_key(upgrades, time_penalty_exponent, price_growth, video_cycle, pricing)
+    entry = get_cached_purchases(key)
+    offset = 0
+    levels = np.array([int(u["level"]) for u in upgrades], np.int64)
+    table = simulation_cache_key([{**u, "level": 0} for u in upgrades], time_penalty_exponent,
+                                 price_growth, video_cycle, pricing)
+    if entry is None:
+        found = _find_cached_run(table, levels)
+        if found is not None:
+            key, entry, offset = found
+        else:
+            entry = {"index": np.zeros(0, np.int32), "price": np.zeros(0), "time": np.zeros(0),
+                     "cps": np.zeros(0), "exhausted": False, "levels": levels, "table": table}
+    
+    cached = min(len(entry["index"]) - offset, total_purchases)
+    columns = (entry["index"][offset:offset + cached].tolist(), entry["price"][offset:offset + cached].tolist(),
+               entry["time"][offset:offset + cached].tolist(), entry["cps"][offset:offset + cached].tolist())
+    # Float prices are exact truncated values; log prices stay floats
+    to_price = float if pricing == "log" else int
+    for i, price, time_to_reach, total_cps in zip(*columns):
+        yield i, to_price(price), time_to_reach, total_cps
+    if cached == total_purchases or entry["exhausted"]:
+        return
+    
+    bought = np.bincount(entry["index"][offset:], minlength=len(upgrades))
+    resumed = [{**u, "level": int(u["level"]) + int(bought[i])} for i, u in enumerate(upgrades)]
+    extension = []
+    exhausted = False
+    try:
+        purchases = iter_greedy_purchases(resumed, time_penalty_exponent, price_growth, video_cycle, pricing)
+        for purchase in itertools.islice(purchases, total_purchases - cached):
+            extension.append(purchase)
+            yield purchase
+        exhausted = len(extension) < total_purchases - cached
+    finally:
+        if extension or exhausted:
+            index, price, time_to_reach, total_cps = zip(*extension) if extension else ((), (), (), ())
+            run = {
+                "index": np.concatenate([entry["index"], np.array(index, np.int32)]),
+                "price": np.concatenate([entry["price"], np.array(price, float)]),
+                "time": np.concatenate([entry["time"], np.array(time_to_reach, float)]),
+                "cps": np.concatenate([entry["cps"], np.array(total_cps, float)]),
+                "exhausted": exhausted
+            }
+            if "levels" in entry:
+                run["levels"], run["table"] = entry["levels"], entry["table"]
+            store_cached_purchases(key, run)
+
+def _log_add(a, b):
+    """`log(exp(a) + exp(b))` without leaving the float range"""
+    if a < b:
+        a, b = b, a
+    if b == float('-inf'):
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+def _exp_or_none(log_value):
+    """`exp(log_value)`, or None past the float range"""
+    try:
+        return math.exp(log_value)
+    except OverflowError:
+        return None
+
+def iter_simulation(upgrades, total_purchases, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                    price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Simulate `total_purchases` greedy purchases, yielding timeline points as they are recorded
+
+    Each item is a `(point, total_cookies)` tuple, `total_cookies` being the
+    running amount spent. The generator returns the summary without its
+    timeline. `upgrades` is not modified. See `_iter_log_simulation` for
+    `pricing="log"`.
+    """
+    if pricing == "log":
+        return (yield from _iter_log_simulation(upgrades, total_purchases, time_penalty_exponent,
+                                                price_growth, video_cycle))
+    total_upgrades = 0
+    purchase_plan = [0] * len(upgrades)
+    time_spent_per_upgrade = [0] * len(upgrades)
+    cost_per_upgrade = [0] * len(upgrades)
+    total_time_spent = 0
+    total_cookies_spent = 0
+    final_cps = calculate_total_cps(upgrades)
+    
+    purchases = iter_memoized_purchases(upgrades, total_purchases, time_penalty_exponent, price_growth, video_cycle)
+    for i, price, time_to_reach, total_cps in purchases:
+        purchase_plan[i] += 1
+        time_spent_per_upgrade[i] += time_to_reach
+        cost_per_upgrade[i] += price
+        total_time_spent += time_to_reach
+        total_cookies_spent += price
+        total_upgrades += 1
+        final_cps = total_cps
+        
+        # Record timeline point every 10 purchases
+        if total_upgrades % 10 == 0 or total_upgrades == 1:
+            yield {
+                "purchase": total_upgrades,
+                "cps": total_cps,
+                "time": total_time_spent,
+                "upgrade": upgrades[i]["name"]
+            }, total_cookies_spent
+    
+    # Prepare results
+    results = []
+    for i, u in enumerate(upgrades):
+        count = purchase_plan[i]
+        if count > 0:
+            contribution = u["cps"] * count
+            percentage = (contribution / final_cps * 100) if final_cps > 0 else 0
+            time_percentage = (time_spent_per_upgrade[i] / total_time_spent * 100) if total_time_spent > 0 else 0
+            
+            results.append({
+                "name": u["name"],
+                "purchases": count,
+                "total_cost": cost_per_upgrade[i],
+                "avg_cost": cost_per_upgrade[i] / count if count > 0 else 0,
+                "cps_contribution": contribution,
+                "cps_percentage": percentage,
+                "time_spent": time_spent_per_upgrade[i],
+                "time_percentage": time_percentage
+            })
+    
+    return {
+        "total_purchases": total_upgrades,
+        "final_cps": final_cps,
+        "total_time": total_time_spent,
+        "total_cookies": total_cookies_spent,
+        "results": results
+    }
+
+def _iter_log_simulation(upgrades, total_purchases, time_penalty_exponent, price_growth, video_cycle):
+    """`iter_simulation` in "log" pricing: costs and times are summed as logs
+
+    Timeline points carry `log10_time` instead of `time` and the running
+    amount spent is yielded as its base-10 log. In the summary, costs and
+    times are base-10 logs (`log10_` keys); `total_time` and `total_cookies`
+    are also given as plain numbers while they fit in a float, else None.
+    """
+    ln10 = math.log(10)
+    total_upgrades = 0
+    purchase_plan = [0] * len(upgrades)
+    log_time_per_upgrade = [float('-inf')] * len(upgrades)
+    log_cost_per_upgrade = [float('-inf')] * len(upgrades)
+    log_total_time = float('-inf')
+    log_total_cookies = float('-inf')
+    final_cps = calculate_total_cps(upgrades)
+    
+    purchases = iter_memoized_purchases(upgrades, total_purchases, time_penalty_exponent, price_growth,
+                                        video_cycle, pricing="log")
+    for i, log_price, log_time, total_cps in purchases:
+        purchase_plan[i] += 1
+        log_time_per_upgrade[i] = _log_add(log_time_per_upgrade[i], log_time)
+        log_cost_per_upgrade[i] = _log_add(log_cost_per_upgrade[i], log_price)
+        log_total_time = _log_add(log_total_time, log_time)
+        log_total_cookies = _log_add(log_total_cookies, log_price)
+        total_upgrades += 1
+        final_cps = total_cps
+        
+        # Record timeline point every 10 purchases
+        if total_upgrades % 10 == 0 or total_upgrades == 1:
+            yield {
+                "purchase": total_upgrades,
+                "cps": total_cps,
+                "log10_time": log_total_time / ln10,
+                "upgrade": upgrades[i]["name"]
+            }, log_total_cookies / ln10
+    
+    results = []
+    for i, u in enumerate(upgrades):
+        count = purchase_plan[i]
+        if count > 0:
+            contribution = u["cps"] * count
+            results.append({
+                "name": u["name"],
+                "purchases": count,
+                "log10_total_cost": log_cost_per_upgrade[i] / ln10,
+                "log10_avg_cost": (log_cost_per_upgrade[i] - math.log(count)) / ln10,
+                "cps_contribution": contribution,
+                "cps_percentage": (contribution / final_cps * 100) if final_cps > 0 else 0,
+                "log10_time_spent": log_time_per_upgrade[i] / ln10,
+                "time_percentage": math.exp(log_time_per_upgrade[i] - log_total_time) * 100
+            })
+    
+    return {
+        "pricing": "log",
+        "total_purchases": total_upgrades,
+        "final_cps": final_cps,
+        "total_time": _exp_or_none(log_total_time) if total_upgrades else 0,
+        "total_cookies": _exp_or_none(log_total_cookies) if total_upgrades else 0,
+        "log10_total_time": log_total_time / ln10 if total_upgrades else None,
+        "log10_total_cookies": log_total_cookies / ln10 if total_upgrades else None,
+        "results": results
+    }
+
+def run_simulation(upgrades, total_purchases, time_penalty_exponent=TIME_PENALTY_EXPONENT,
+                   price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, pricing="float"):
+    """Simulate `total_purchases` greedy purchases from the given levels
+
+    Returns the summary `/api/simulate` reports (without the timestamp).
+    `upgrades` is not modified.
+    """
+    # Track progression for timeline
+    timeline = []
+    events = iter_simulation(upgrades, total_purchases, time_penalty_exponent, price_growth, video_cycle, pricing)
+    with timed("simulation"):
+        while True:
+            try:
+                point, _ = next(events)
+            except StopIteration as stop:
+                return {**stop.value, "timeline": timeline}
+            timeline.append(point)
+
+def forecast_purchases(upgrades, target_cps=None, target_cookies=None, max_purchases=MAX_SIMULATION_PURCHASES,
+                       path_limit=None):
+    """Greedy purchases from the given levels until every given target is met
+
+    `target_cookies` counts cookies baked, which the model spends entirely
+    on purchases. The memoized sequence is consumed only up to the purchase
+    that meets the targets. Returns the ETA in minutes (None when the
+    greedy loop ends or `max_purchases` runs out first) and the purchase
+    path, consecutive purchases of one upgrade merged into one step and
+    cut after `path_limit` steps.
+    """
+    def reached(cps, cookies):
+        return ((target_cps is None or cps >= target_cps)
+                and (target_cookies is None or cookies >= target_cookies))
+
+    total_cps = calculate_total_cps(upgrades)
+    total_purchases = 0
+    total_time = 0
+    total_cookies = 0
+    path = []
+    truncated = False
+    met = reached(total_cps, total_cookies)
+    if not met:
+        purchases = iter_memoized_purchases(upgrades, max_purchases)
+        with timed("simulation"):
+            for i, price, time_to_reach, total_cps in purchases:
+                total_purchases += 1
+                total_time += time_to_reach
+                total_cookies += price
+                name = upgrades[i]["name"]
+                if not truncated and not (path and path[-1]["upgrade"] == name):
+                    truncated = path_limit is not None and len(path) >= path_limit
+                    if not truncated:
+                        path.append({"upgrade": name, "count": 0})
+                if not truncated:
+                    path[-1]["count"] += 1
+                    path[-1].update(time=total_time, cps=total_cps, cookies=total_cookies)
+                if reached(total_cps, total_cookies):
+                    met = True
+                    break
+            # Stores the extension of the memoized run right away
+            purchases.close()
+    return {
+        "reached": met,
+        "eta": total_time if met else None,
+        "purchases": total_purchases,
+        "final_cps": total_cps,
+        "total_time": total_time,
+        "total_cookies": total_cookies,
+        "path": path,
+        "path_truncated": truncated
+    }
+
+# Rolling plan of the next greedy purchases from the live levels. Purchases
+# that follow the plan only drop its head (the greedy sequence depends on the
+# levels alone, so the rest stays valid) and the tail is extended on demand;
+# any other change of levels or of the upgrade table starts a new plan.
+PLAN_SIZE = 50
+MAX_PLAN_SIZE = 1000
+_purchase_plan = {"table": None, "levels": None, "steps": collections.deque(), "exhausted": False}
+_purchase_plan_lock = threading.Lock()
+
+def _bought(steps, count, size):
+    """Purchases per upgrade over the first `count` plan steps"""
+    indices = np.fromiter((step[0] for step in itertools.islice(steps, count)), np.int64, count)
+    return np.bincount(indices, minlength=size)
+
+def next_purchases(upgrades, n):
+    """The next `n` greedy purchases from the given levels, as `iter_greedy_purchases` items
+
+    Fewer come back when the greedy loop ends first.
+    """
+    table = tuple((u["name"], u["price"], u["cps"]) for u in upgrades)
+    levels = np.array([int(u["level"]) for u in upgrades], np.int64)
+    with _purchase_plan_lock:
+        plan = _purchase_plan
+        steps = plan["steps"]
+        followed = False
+        if plan["table"] == table:
+            bought = levels - plan["levels"]
+            count = int(bought.sum())
+            followed = (bought.min() >= 0 and count <= len(steps)
+                        and np.array_equal(_bought(steps, count, len(levels)), bought))
+        count_cache("purchase_plan", followed)
+        if followed:
+            for _ in range(count):
+                steps.popleft()
+        else:
+            steps.clear()
+            plan["exhausted"] = False
+        plan["table"], plan["levels"] = table, levels
+
+        missing = n - len(steps)
+        if missing > 0 and not plan["exhausted"]:
+            tail = levels + _bought(steps, len(steps), len(levels))
+            resumed = [{**u, "level": int(tail[i])} for i, u in enumerate(upgrades)]
+            extension = list(itertools.islice(iter_greedy_purchases(resumed), missing))
+            steps.extend(extension)
+            plan["exhausted"] = len(extension) < missing
+        return list(itertools.islice(steps, n))
+
+def run_simulation_batch(upgrades, scenarios):
+    """Run several greedy simulations in lockstep over (scenarios x upgrades) arrays
+
+    Each scenario is a dict with optional keys `purchases` (default 100),
+    `levels` (upgrade name -> starting level, applied over the levels in
+    `upgrades`), `time_penalty_exponent` and `price_growth`. Every step
+    prices, times and scores all candidates of all scenarios with a few
+    NumPy calls. Returns one summary per scenario, shaped like the result
+    of `run_simulation`.
+
+    Prices come from the shared price tables, but NumPy's `power` and
+    pairwise sums can differ from libm and `sum` in the last bit, so a
+    near-tie may occasionally resolve differently than in `run_simulation`.
+    Reported CPS values use `calculate_total_cps`.
+    """
+    count = len(scenarios)
+    names = {u['name']: i for i, u in enumerate(upgrades)}
+    cps_values = np.array([u['cps'] for u in upgrades], dtype=float)
+
+    levels = np.tile(np.array([int(u['level']) for u in upgrades], dtype=np.int64), (count, 1))
+    for s, scenario in enumerate(scenarios):
+        for name, level in (scenario.get('levels') or {}).items():
+            if name not in names:
+                raise ValueError(f"Unknown upgrade: {name}")
+            levels[s, names[name]] = int(level)
+    targets = np.array([int(sc.get('purchases', 100)) for sc in scenarios], dtype=np.int64)
+    exponents = np.array([float(sc.get('time_penalty_exponent', TIME_PENALTY_EXPONENT)) for sc in scenarios])[:, None]
+    growth = np.array([float(sc.get('price_growth', PRICE_GROWTH)) for sc in scenarios])[:, None]
+
+    def price_of(i, level, price_growth):
+        try:
+            return float(upgrade_price(upgrades[i]['price'], level, price_growth))
+        except OverflowError:
+            return float('inf')
+
+    growths = growth[:, 0].tolist()
+    prices = np.array([[price_of(i, level, growths[s]) for i, level in enumerate(row)]
+                       for s, row in enumerate(levels.tolist())])
+
+    purchase_plan = np.zeros(levels.shape, dtype=np.int64)
+    time_spent_per_upgrade = np.zeros(levels.shape)
+    cost_per_upgrade = np.zeros(levels.shape)
+    total_time_spent = np.zeros(count)
+    total_cookies_spent = np.zeros(count)
+    total_upgrades = np.zeros(count, dtype=np.int64)
+    timelines = [[] for _ in scenarios]
+
+    def reported_cps(s):
+        # Same summation as calculate_total_cps, so reported values match run_simulation
+        return calculate_total_cps([{"level": l, "cps": u["cps"]} for l, u in zip(levels[s].tolist(), upgrades)])
+
+    rows = np.arange(count)
+    active = targets > total_upgrades
+    while active.any():
+        total_cps = (levels * cps_values).sum(axis=1)
+        unlocked = levels > 0
+        unlocked[:, 0] = True
+        unlocked[:, 1:] |= levels[:, :-1] >= 1
+
+        times = calculate_times_to_reach(prices, total_cps[:, None])
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            values = cps_values / prices
+            # Apply exponential penalty to time: longer times are exponentially worse
+            penalties = times ** exponents
+            efficiencies = np.where(penalties > 0, values / penalties, 0.0)
+        eligible = unlocked & np.isfinite(times) & (times > 0) & active[:, None]
+        # argmax picks the earliest upgrade on ties, like max() over the list
+        best = np.where(eligible, efficiencies, -np.inf).argmax(axis=1)
+
+        stepping = active & eligible[rows, best]
+        s_idx = rows[stepping]
+        i_idx = best[stepping]
+        time_to_reach = times[s_idx, i_idx]
+        price = prices[s_idx, i_idx]
+
+        purchase_plan[s_idx, i_idx] += 1
+        time_spent_per_upgrade[s_idx, i_idx] += time_to_reach
+        cost_per_upgrade[s_idx, i_idx] += price
+        total_time_spent[s_idx] += time_to_reach
+        total_cookies_spent[s_idx] += price
+        total_upgrades[s_idx] += 1
+        levels[s_idx, i_idx] += 1
+        for s, i in zip(s_idx.tolist(), i_idx.tolist()):
+            prices[s, i] = price_of(i, int(levels[s, i]), growths[s])
+
+        # Record timeline point every 10 purchases
+        record = (total_upgrades[s_idx] % 10 == 0) | (total_upgrades[s_idx] == 1)
+        for s, i in zip(s_idx[record].tolist(), i_idx[record].tolist()):
+            timelines[s].append({
+                "purchase": int(total_upgrades[s]),
+                "cps": reported_cps(s),
+                "time": float(total_time_spent[s]),
+                "upgrade": upgrades[i]["name"]
+            })
+
+        active = stepping & (total_upgrades < targets)
+
+    summaries = []
+    for s in range(count):
+        final_cps = reported_cps(s)
+        results = []
+        for i, u in enumerate(upgrades):
+            purchases = int(purchase_plan[s, i])
+            if purchases > 0:
+                contribution = u["cps"] * purchases
+                time_spent = float(time_spent_per_upgrade[s, i])
+                total_cost = int(cost_per_upgrade[s, i])
+                results.append({
+                    "name": u["name"],
+                    "purchases": purchases,
+                    "total_cost": total_cost,
+                    "avg_cost": total_cost / purchases,
+                    "cps_contribution": contribution,
+                    "cps_percentage": (contribution / final_cps * 100) if final_cps > 0 else 0,
+                    "time_spent": time_spent,
+                    "time_percentage": (time_spent / total_time_spent[s] * 100) if total_time_spent[s] > 0 else 0
+                })
+        summaries.append({
+            "total_purchases": int(total_upgrades[s]),
+            "final_cps": final_cps,
+            "total_time": float(total_time_spent[s]),
+            "total_cookies": int(total_cookies_spent[s]),
+            "results": results,
+            "timeline": timelines[s]
+        })
+    return summaries
+
+# Worker processes are started by a fork server (or spawned where there is
+# none): a plain fork of this multithreaded server would copy locks held by
+# other threads (metrics, caches, backups) and could deadlock in the child
+PROCESS_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def _process_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD))
+
+def _sweep_point(task):
+    """Run one /api/sweep grid point (top level so worker processes can unpickle it)"""
+    upgrades, total_purchases, params = task
+    summary = run_simulation(upgrades, total_purchases, **params)
+    return {
+        "time_penalty_exponent": params["time_penalty_exponent"],
+        "price_growth": params["price_growth"],
+        "video_cycle": list(params["video_cycle"]),
+        "total_purchases": summary["total_purchases"],
+        "final_cps": summary["final_cps"],
+        "total_time": summary["total_time"]
+    }
+
+def run_parameter_sweep(upgrades, total_purchases, time_penalty_exponents, price_growths, video_cycles,
+                        max_workers=None):
+    """Simulate every combination of the given strategy parameters
+
+    Grid points run in a process pool (all cores by default) and come back
+    in grid order, each with its final CPS and total time.
+    """
+    grid = [
+        {"time_penalty_exponent": e, "price_growth": g, "video_cycle": tuple(c)}
+        for e, g, c in itertools.product(time_penalty_exponents, price_growths, video_cycles)
+    ]
+    if not grid:
+        return []
+    workers = min(len(grid), max_workers or os.cpu_count() or 1)
+    tasks = [(upgrades, total_purchases, params) for params in grid]
+    with _process_pool(workers) as pool:
+        return list(pool.map(_sweep_point, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+# Purchase planner: beam search over purchase orders for the least total time
+# to a target CPS, bounded by the greedy plan. States are ranked by their
+# elapsed time plus `weight` times the time the greedy run took from their CPS
+# to the target; each weight is searched by its own worker.
+PLANNER_BEAM_WIDTH = 16
+PLANNER_HEURISTIC_WEIGHTS = (1.0, 1.25, 1.5, 2.0)
+
+def _greedy_profile(upgrades, target_cps, price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE):
+    """Greedy purchases up to `target_cps` as (indices, cumulative times, CPS values)
+
+    Times and CPS values start with the starting point, then follow each
+    purchase. Raises ValueError when the greedy strategy does not reach the
+    target within MAX_PLAN_PURCHASES purchases.
+    """
+    path, times, cps_values = [], [0.0], [calculate_total_cps(upgrades)]
+    if cps_values[0] >= target_cps:
+        return path, times, cps_values
+    elapsed = 0.0
+    for i, _, purchase_time, total_cps in iter_greedy_purchases(upgrades, price_growth=price_growth,
+                                                                video_cycle=video_cycle):
+        elapsed += purchase_time
+        path.append(i)
+        times.append(elapsed)
+        cps_values.append(total_cps)
+        if total_cps >= target_cps:
+            return path, times, cps_values
+        if len(path) >= MAX_PLAN_PURCHASES:
+            break
+    raise ValueError(f"The target CPS takes more than {MAX_PLAN_PURCHASES} purchases to reach")
+
+def _profile_time(times, cps_values, cps):
+    """Time the greedy run took to reach `cps`, interpolated between purchases"""
+    k = bisect.bisect_left(cps_values, cps)
+    if k == 0:
+        return times[0]
+    if k >= len(times):
+        return times[-1]
+    low, high = cps_values[k - 1], cps_values[k]
+    return times[k - 1] + (times[k] - times[k - 1]) * (cps - low) / (high - low)
+
+def _beam_plan(task):
+    """Beam search for one heuristic weight (top level so worker processes can unpickle it)
+
+    Layer `n` holds level vectors reached after `n` purchases, so a vector
+    reached twice is always met within one layer: only its fastest arrival
+    is kept. That is the whole dominance check (levels >= on every upgrade
+    and elapsed <=): two vectors of one layer have the same level total,
+    so one can only be >= the other where they are equal, and a state is
+    never dominated by one from an earlier layer, which has fewer levels.
+    Children that cannot beat `bound` (the best plan so far) even at the
+    lower bound of the time left are cut. Returns (total time, purchase
+    indices) of the best plan faster than `bound`, or None.
+    """
+    (levels, base_prices, cps_values, target_cps, width, weight, profile_times, profile_cps,
+     bound, price_growth, video_cycle) = task
+    count = len(levels)
+    steps = len(video_cycle)
+    cycle_cookies = steps * ACTIVE_BLOCK_SECONDS + sum(video_cycle) * 60
+    cycle_time = steps * ACTIVE_BLOCK_SECONDS / 60
+    # Every cookie still to spend takes at least this long (production stays
+    # below the target CPS), and every purchase takes at least one step
+    cookie_time = _cycle_bound_factor(video_cycle) * cycle_time / (cycle_cookies * target_cps)
+    step_time = ACTIVE_BLOCK_SECONDS / 60
+    max_cps = max(cps_values)
+    greedy_time = profile_times[-1]
+
+    nodes = []  # (parent node, upgrade bought) for every kept state
+    best = None
+    beam = [(0.0, tuple(levels), -1)]
+    while beam:
+        layer = {}
+        for elapsed, state, node in beam:
+            total_cps = sum(l * c for l, c in zip(state, cps_values) if l > 0)
+            cps = int(total_cps * 1000) / 1000.0
+            thresholds = _cycle_thresholds(cps, video_cycle)
+            prices = [None] * count
+            # Prices only go up, so no later purchase gives more CPS per cookie
+            best_value = 0
+            for i in range(count):
+                try:
+                    price = upgrade_price(base_prices[i], state[i], price_growth)
+                    best_value = max(best_value, cps_values[i] / price)
+                except (OverflowError, ZeroDivisionError):
+                    continue
+                prices[i] = price
+            if best_value <= 0:
+                continue
+            for i in range(count):
+                if prices[i] is None or not (state[i] > 0 or i == 0 or state[i - 1] >= 1):
+                    continue
+                time = _time_to_reach(prices[i], cps, thresholds, video_cycle)
+                child_elapsed = elapsed + time
+                if time == float('inf') or time <= 0 or child_elapsed >= bound:
+                    continue
+                child_cps = total_cps + cps_values[i]
+                if child_cps >= target_cps:
+                    nodes.append((node, i))
+                    best, bound = len(nodes) - 1, child_elapsed
+                    continue
+                child = state[:i] + (state[i] + 1,) + state[i + 1:]
+                known = layer.get(child)
+                if known is not None and known[1] <= child_elapsed:
+                    continue
+                deficit = target_cps - child_cps
+                least_left = max(deficit / best_value * cookie_time, math.ceil(deficit / max_cps) * step_time)
+                if child_elapsed + least_left >= bound:
+                    continue
+                score = child_elapsed + weight * (greedy_time - _profile_time(profile_times, profile_cps, child_cps))
+                layer[child] = (score, child_elapsed, node, i)
+        beam = []
+        for child, (_, child_elapsed, node, i) in heapq.nsmallest(width, layer.items(), key=lambda item: item[1][0]):
+            nodes.append((node, i))
+            beam.append((child_elapsed, child, len(nodes) - 1))
+
+    if best is None:
+        return None
+    path = []
+    node = best
+    while node >= 0:
+        node, i = nodes[node]
+        path.append(i)
+    path.reverse()
+    return bound, path
+
+def _plan_steps(upgrades, path, price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE):
+    """Replay purchase indices into steps with cumulative time and the CPS after each"""
+    levels = [int(u['level']) for u in upgrades]
+    cps_values = [u['cps'] for u in upgrades]
+    elapsed = 0.0
+    total_cps = calculate_total_cps(upgrades)
+    steps = []
+    for i in path:
+        cps = int(total_cps * 1000) / 1000.0
+        price = upgrade_price(upgrades[i]['price'], levels[i], price_growth)
+        elapsed += _time_to_reach(price, cps, None, video_cycle)
+        levels[i] += 1
+        total_cps = sum(l * c for l, c in zip(levels, cps_values) if l > 0)
+        steps.append({
+            "upgrade": upgrades[i]['name'],
+            "level": levels[i],
+            "price": price,
+            "time": elapsed,
+            "cps": total_cps
+        })
+    return steps
+
+def plan_purchases(upgrades, target_cps, beam_width=PLANNER_BEAM_WIDTH, weights=PLANNER_HEURISTIC_WEIGHTS,
+                   price_growth=PRICE_GROWTH, video_cycle=VIDEO_CYCLE, max_workers=None):
+    """Search for the purchase order reaching `target_cps` in the least time
+
+    Starts from the given levels. One beam search per weight runs in a
+    process pool (all cores by default), each bounded by the greedy plan;
+    the fastest plan found is returned with its steps, next to the greedy
+    plan's totals and the time the greedy plan loses (`gap`). Falls back to
+    the greedy plan when no search beats it. Raises ValueError when the
+    greedy strategy needs more than MAX_PLAN_PURCHASES purchases.
+    """
+    video_cycle = tuple(video_cycle)
+    greedy_path, times, cps_values = _greedy_profile(upgrades, target_cps, price_growth, video_cycle)
+    greedy_time = times[-1]
+    path, weight = greedy_path, None
+    if greedy_path:
+        state = ([int(u['level']) for u in upgrades], [u['price'] for u in upgrades], [u['cps'] for u in upgrades])
+
+        def task(w, bound):
+            return (*state, target_cps, beam_width, w, times, cps_values, bound, price_growth, video_cycle)
+
+        workers = min(len(weights), max_workers or os.cpu_count() or 1)
+        if workers > 1:
+            with _process_pool(workers) as pool:
+                plans = list(pool.map(_beam_plan, [task(w, greedy_time) for w in weights]))
+        else:
+            # In one process each search is bounded by the best plan so far
+            plans = []
+            bound = greedy_time
+            for w in weights:
+                plans.append(_beam_plan(task(w, bound)))
+                if plans[-1] is not None:
+                    bound = plans[-1][0]
+        best_time = greedy_time
+        for w, plan in zip(weights, plans):
+            if plan is not None and plan[0] < best_time:
+                (best_time, path), weight = plan, w
+
+    steps = _plan_steps(upgrades, path, price_growth, video_cycle)
+    total_time = steps[-1]["time"] if steps else 0.0
+    return {
+        "target_cps": target_cps,
+        "start_cps": cps_values[0],
+        "plan": {
+            "purchases": len(steps),
+            "total_time": total_time,
+            "final_cps": steps[-1]["cps"] if steps else cps_values[0],
+            "weight": weight,
+            "steps": steps
+        },
+        "greedy": {
+            "purchases": len(greedy_path),
+            "total_time": greedy_time,
+            "final_cps": cps_values[-1]
+        },
+        "gap": {
+            "time": greedy_time - total_time,
+            "percent": (greedy_time - total_time) / greedy_time * 100 if greedy_time > 0 else 0.0
+        }
+    }
+
+def _catalog_number(value):
+    # Log-pricing totals past the float range are None; store them as infinity
+    return float('inf') if value is None else float(value)
+
+def record_simulation(filename, simulation_data):
+    """Add (or replace) a saved simulation's summary in the simulations catalog"""
+    with db_transaction(write=True) as conn:
+        conn.execute(
+            "INSERT INTO simulations (filename, timestamp, total_purchases, final_cps, total_time, total_cookies) "
+            "VALUES (?,?,?,?,?,?) "
+            "ON CONFLICT(filename) DO UPDATE SET timestamp=excluded.timestamp, total_purchases=excluded.total_purchases, "
+            "final_cps=excluded.final_cps, total_time=excluded.total_time, total_cookies=excluded.total_cookies",
+            (filename, simulation_data["timestamp"], int(simulation_data["total_purchases"]),
+             float(simulation_data["final_cps"]), _catalog_number(simulation_data["total_time"]),
+             _catalog_number(simulation_data["total_cookies"]))
+        )
+
+# Next to each saved run's JSON, the charts read a small summary (JSON
+# without the timeline) and the timeline as packed records, memory-mapped
+# when loaded. For log-pricing runs the `time` column holds log10 minutes.
+SIMULATION_TIMELINE_DTYPE = np.dtype([('purchase', '<i8'), ('cps', '<f8'), ('time', '<f8')])
+
+# Run IDs are the start time plus a random suffix, so runs started within the
+# same second never share files; older runs have the bare timestamp
+SIMULATION_ID_PATTERN = re.compile(r'\d{8}_\d{6}(_[0-9a-f]{6})?')
+
+def new_simulation_id():
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def _simulation_file(simulation_id, suffix):
+    return os.path.join('simulations', f'simulation_{simulation_id}{suffix}')
+
+def _timeline_record(point):
+    return point["purchase"], point["cps"], point["time"] if "time" in point else point["log10_time"]
+
+def _write_simulation_summary(timestamp, summary):
+    path = _simulation_file(timestamp, '.summary')
+    with open(path + '.part', 'w') as f:
+        json.dump({"timestamp": timestamp, **{k: v for k, v in summary.items() if k != "timeline"}}, f)
+    os.replace(path + '.part', path)
+
+def _write_simulation_timeline(timestamp, timeline):
+    path = _simulation_file(timestamp, '.timeline.bin')
+    np.array([_timeline_record(p) for p in timeline], dtype=SIMULATION_TIMELINE_DTYPE).tofile(path + '.part')
+    os.replace(path + '.part', path)
+
+def load_stored_simulation(simulation_id):
+    """`(summary, timeline)` of a saved run; `timeline` is a read-only record array
+
+    Runs saved before the compact files existed are read from their JSON
+    once and converted. Raises FileNotFoundError for an unknown run.
+    """
+    summary_path = _simulation_file(simulation_id, '.summary')
+    timeline_path = _simulation_file(simulation_id, '.timeline.bin')
+    if not (os.path.exists(summary_path) and os.path.exists(timeline_path)):
+        with open(_simulation_file(simulation_id, '.json'), 'r') as f:
+            data = json.load(f)
+        _write_simulation_summary(simulation_id, data)
+        _write_simulation_timeline(simulation_id, data.get("timeline", []))
+    with open(summary_path, 'r') as f:
+        summary = json.load(f)
+    if os.path.getsize(timeline_path) == 0:
+        return summary, np.empty(0, dtype=SIMULATION_TIMELINE_DTYPE)
+    return summary, np.memmap(timeline_path, dtype=SIMULATION_TIMELINE_DTYPE, mode='r')
+
+def save_simulation(simulation_data):
+    """Save a finished simulation to simulations/ as JSON (full) and CSV (results) and catalog it"""
+    with timed("simulation_save"):
+        timestamp = simulation_data["timestamp"]
+    
+        # Save to JSON
+        os.makedirs('simulations', exist_ok=True)
+        with open(f'simulations/simulation_{timestamp}.json', 'w') as f:
+            json.dump(simulation_data, f, indent=4)
+        _write_simulation_summary(timestamp, simulation_data)
+        _write_simulation_timeline(timestamp, simulation_data.get("timeline", []))
+    
+        # Save to CSV
+        import pandas as pd
+        df = pd.DataFrame(simulation_data["results"])
+        df.to_csv(f'simulations/simulation_{timestamp}.csv', index=False)
+    
+        record_simulation(f'simulation_{timestamp}.json', simulation_data)
+
+# Background simulation jobs. Queued jobs wait in one queue per client and
+# workers serve clients round-robin, so a client submitting many runs does
+# not starve the others. Finished jobs are kept (up to MAX_FINISHED_JOBS)
+# so results outlive the request that submitted them.
+SIMULATION_JOB_WORKERS = 2
+MAX_FINISHED_JOBS = 100
+
+_jobs = collections.OrderedDict()
+_job_queues = collections.OrderedDict()
+_jobs_cond = threading.Condition()
+_job_workers = []
+
+def _job_status(job):
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "purchases_done": job["purchases_done"],
+        "total_purchases": job["total_purchases"],
+        "submitted_at": job["submitted_at"],
+        "error": job["error"]
+    }
+
+def _evict_finished_jobs_locked():
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "failed", "cancelled")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+def _next_job_locked():
+    """Take the next queued job, rotating between clients"""
+    client, queue = next(iter(_job_queues.items()))
+    job = queue.popleft()
+    del _job_queues[client]
+    if queue:
+        _job_queues[client] = queue
+    return job
+
+def _run_job(job):
+    events = iter_simulation(job["upgrades"], job["total_purchases"], pricing=job["pricing"])
+    while True:
+        if job["cancel"]:
+            events.close()
+            return None
+        try:
+            with timed("simulation"):
+                point, _ = next(events)
+        except StopIteration as stop:
+            summary = stop.value
+            break
+        job["timeline"].append(point)
+        job["purchases_done"] = point["purchase"]
+        job["progress"] = point["purchase"] / job["total_purchases"]
+    simulation_data = {
+        "timestamp": new_simulation_id(),
+        **summary,
+        "timeline": job["timeline"]
+    }
+    save_simulation(simulation_data)
+    return simulation_data
+
+def _job_worker():
+    while True:
+        with _jobs_cond:
+            while not _job_queues:
+                _jobs_cond.wait()
+            job = _next_job_locked()
+            job["status"] = "running"
+        try:
+            result = _run_job(job)
+            error = None
+        except Exception as e:
+            result, error = None, str(e)
+        with _jobs_cond:
+            if error is not None:
+                job["status"], job["error"] = "failed", error
+            elif result is None:
+                job["status"] = "cancelled"
+            else:
+                job["status"], job["result"] = "done", result
+                job["purchases_done"] = result["total_purchases"]
+                job["progress"] = 1.0
+            job["upgrades"] = job["timeline"] = None
+            _evict_finished_jobs_locked()
+
+def submit_simulation_job(upgrades, total_purchases, client=None, pricing="float"):
+    """Queue a simulation for the background workers and return its job status"""
+    job = {
+        "id": uuid.uuid4().hex,
+        "client": client,
+        "status": "queued",
+        "progress": 0.0,
+        "purchases_done": 0,
+        "total_purchases": total_purchases,
+        "submitted_at": datetime.now().isoformat(timespec='seconds'),
+        "error": None,
+        "result": None,
+        "cancel": False,
+        "upgrades": upgrades,
+        "pricing": pricing,
+        "timeline": []
+    }
+    with _jobs_cond:
+        # Workers are started on first use so importing the app stays cheap
+        while len(_job_workers) < SIMULATION_JOB_WORKERS:
+            worker = threading.Thread(target=_job_worker, name=f'simulation-job-{len(_job_workers)}', daemon=True)
+            worker.start()
+            _job_workers.append(worker)
+        _jobs[job["id"]] = job
+        _job_queues.setdefault(client, collections.deque()).append(job)
+        _jobs_cond.notify()
+        return _job_status(job)
+
+def get_job(job_id):
+    """Return (status, result) of a job, or None if unknown"""
+    with _jobs_cond:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return _job_status(job), job["result"]
+
+def cancel_job(job_id):
+    """Cancel a queued or running job; return its status or None if unknown"""
+    with _jobs_cond:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == "queued":
+            queue = _job_queues[job["client"]]
+            queue.remove(job)
+            if not queue:
+                del _job_queues[job["client"]]
+            job["status"] = "cancelled"
+            job["upgrades"] = job["timeline"] = None
+            _evict_finished_jobs_locked()
+        elif job["status"] == "running":
+            # Picked up by the worker at the next timeline point
+            job["cancel"] = True
+        return _job_status(job)
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+# Opt-in profiling: with PROFILE_REQUESTS=1 in the environment, a request
+# carrying `?profile=1` runs under cProfile and its stats are dumped to
+# PROFILE_DIR (the file name comes back in X-Profile-File). One request is
+# profiled at a time; others run normally meanwhile.
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS') == '1'
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'profiles')
+_profile_lock = threading.Lock()
+
+@app.before_request
+def _start_request_metrics():
+    g._started = time.perf_counter()
+    g._sections = collections.defaultdict(float)
+    if PROFILE_REQUESTS and request.args.get('profile') == '1' and _profile_lock.acquire(blocking=False):
+        import cProfile
+        g._profiler = cProfile.Profile()
+        try:
+            g._profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active
+            g._profiler = None
+            _profile_lock.release()
+
+@app.after_request
+def _finish_request_metrics(response):
+    """Record the request and describe its timing in Server-Timing
+
+    Streamed bodies are timed until their headers are ready.
+    """
+    if '_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g._started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    record_request(route, request.method, response.status_code, elapsed)
+    timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in g._sections.items()]
+    response.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={elapsed * 1000:.2f}'])
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}_{request.endpoint}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        response.headers['X-Profile-File'] = name
+    return response
+
+@app.teardown_request
+def _stop_request_profiler(exc):
+    # The response never reached after_request (e.g. the client went away)
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+@app.route('/api/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def compute_upgrades_payload(upgrades):
+    """Build the `/api/upgrades` body: unlocked upgrades with metrics, total CPS and the best pick"""
+    total_cps = calculate_total_cps(upgrades)
+    # Metrics for all unlocked upgrades come from the same vectorized pass
+    # as the "best" computation, so the ranking shown to users matches it.
+    metrics = compute_upgrade_metrics(upgrades, total_cps)
+    best = _select_best(metrics)
+
+    temp_metrics = []
+    for m in metrics:
+        u = m["upgrade"]
+        time = m["time"]
+        temp_metrics.append({
+            **u,
+            "current_price": m["price"],
+            "time_to_reach": time if time != float('inf') else None,
+            "value": m["value"],
+            "raw_efficiency": m["efficiency"],
+            "is_best": best and u["name"] == best["name"]
+        })
+
+    # Normalize efficiencies so best => 1 and weakest => 0 (linear scale)
     raw_vals = [m['raw_efficiency'] for m in temp_metrics]
     max_eff = max(raw_vals) if raw_vals else 0
     min_eff = min(raw_vals) if raw_vals else 0
@@ -273,11 +2569,131 @@ def get_upgrades():
             "efficiency": norm
         })
     
-    return jsonify({
+    return {
         "upgrades": unlocked_with_metrics,
         "total_cps": total_cps,
         "best_upgrade": best
-    })
+    }
+
+def upgrades_delta(before, after):
+    """Describe how the `/api/upgrades` payload changed from `before` to `after`
+
+    Lists only the upgrade rows that differ (new or changed metrics), the
+    names no longer shown and the display order, next to the new totals.
+    """
+    previous = {u["name"]: u for u in before["upgrades"]}
+    current = [u["name"] for u in after["upgrades"]]
+    return {
+        "total_cps": after["total_cps"],
+        "best_upgrade": after["best_upgrade"],
+        "upgrades": [u for u in after["upgrades"] if previous.get(u["name"]) != u],
+        "removed": [name for name in previous if name not in set(current)],
+        "order": current
+    }
+
+def _locked_upgrade_state():
+    """Upgrades read inside the current write transaction, with their `/api/upgrades` payload
+
+    Levels always come from the database: another writer may have committed
+    before invalidating the cached state. The cached payload is only reused
+    when it matches what was read.
+    """
+    upgrades = load_upgrades()
+    _, cached, payload = get_upgrade_state()
+    if cached != upgrades:
+        payload = compute_upgrades_payload(upgrades)
+    return upgrades, payload
+
+def change_upgrade_level(upgrade_name, step):
+    """Move an upgrade's level by `step` and return `(upgrade, delta)`
+
+    Runs in one write transaction: the new level is computed from the row
+    read under the write lock, and the new state becomes the cached state
+    on commit, so the next `/api/upgrades` poll is free. Returns
+    `(None, None)` for an unknown upgrade and raises ValueError when the
+    level would go negative.
+    """
+    with db_transaction(write=True):
+        upgrades, before = _locked_upgrade_state()
+        for u in upgrades:
+            if u["name"] == upgrade_name:
+                new_level = int(u.get('level', 0)) + step
+                if new_level < 0:
+                    raise ValueError("Level already zero")
+                update_upgrade_level(upgrade_name, new_level, "purchase" if step > 0 else "decrease")
+                u['level'] = new_level
+                after = compute_upgrades_payload(upgrades)
+                on_commit(lambda: invalidate_upgrade_state(upgrades, after))
+                return u, upgrades_delta(before, after)
+    return None, None
+
+def apply_level_changes(levels=None, deltas=None):
+    """Apply absolute levels and level deltas (upgrade name -> int) in one transaction
+
+    Deltas apply to the levels read under the write lock. Returns the
+    recomputed `/api/upgrades` payload, which becomes the cached state on
+    commit. Raises KeyError for unknown upgrades and ValueError for a level
+    that would go negative; nothing is written in either case.
+    """
+    levels = levels or {}
+    deltas = deltas or {}
+    with db_transaction(write=True):
+        upgrades = load_upgrades()
+        by_name = {u["name"]: u for u in upgrades}
+        unknown = sorted(set(levels) - set(by_name) | set(deltas) - set(by_name))
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        new_levels = {name: int(level) for name, level in levels.items()}
+        for name, delta in deltas.items():
+            new_levels[name] = new_levels.get(name, int(by_name[name]["level"])) + int(delta)
+        negative = sorted(name for name, level in new_levels.items() if level < 0)
+        if negative:
+            raise ValueError(f"Level would go negative: {', '.join(negative)}")
+        
+        update_upgrade_levels(new_levels, "batch")
+        for name, level in new_levels.items():
+            by_name[name]["level"] = level
+        payload = compute_upgrades_payload(upgrades)
+        on_commit(lambda: invalidate_upgrade_state(upgrades, payload))
+        return payload
+
+@app.route('/api/upgrades/batch', methods=['POST'])
+def batch_update_upgrades():
+    """Set many levels at once: `{"levels": {name: level}, "deltas": {name: delta}}`
+
+    A name may appear in both; its delta then applies on top of the given
+    level. Responds with the recomputed upgrades state.
+    """
+    data = request.get_json(silent=True) or {}
+    levels = data.get("levels", {})
+    deltas = data.get("deltas", {})
+    if not isinstance(levels, dict) or not isinstance(deltas, dict) or not (levels or deltas):
+        return jsonify({"success": False, "error": "Provide 'levels' and/or 'deltas' as name -> integer maps"}), 400
+    for value in itertools.chain(levels.values(), deltas.values()):
+        if not isinstance(value, int) or isinstance(value, bool):
+            return jsonify({"success": False, "error": "Levels and deltas must be integers"}), 400
+    
+    try:
+        payload = apply_level_changes(levels, deltas)
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"Unknown upgrade: {e.args[0]}"}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, **payload})
+
+@app.route('/api/upgrades')
+def get_upgrades():
+    # Unchanged since the client's copy: no DB read, no recomputation
+    if request.if_none_match.contains(upgrade_state_etag()):
+        response = Response(status=304)
+        response.set_etag(upgrade_state_etag())
+        return response
+    etag, _, payload = get_upgrade_state()
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/upgrade/<upgrade_name>', methods=['POST'])
 def purchase_upgrade(upgrade_name):
@@ -285,15 +2701,10 @@ def purchase_upgrade(upgrade_name):
         if not upgrade_name:
             return jsonify({"success": False, "error": "Upgrade name required"}), 400
         
-        upgrades = load_upgrades()
-        for u in upgrades:
-            if u["name"] == upgrade_name:
-                new_level = int(u.get('level', 0)) + 1
-                update_upgrade_level(upgrade_name, new_level)
-                u['level'] = new_level
-                return jsonify({"success": True, "upgrade": u})
-        
-        return jsonify({"success": False, "error": "Upgrade not found"}), 404
+        upgrade, delta = change_upgrade_level(upgrade_name, 1)
+        if upgrade is None:
+            return jsonify({"success": False, "error": "Upgrade not found"}), 404
+        return jsonify({"success": True, "upgrade": upgrade, "delta": delta})
     except Exception as e:
         return jsonify({"success": False, "error": f"Purchase failed: {str(e)}"}), 500
 
@@ -304,84 +2715,102 @@ def decrease_upgrade(upgrade_name):
         if not upgrade_name:
             return jsonify({"success": False, "error": "Upgrade name required"}), 400
 
-        upgrades = load_upgrades()
-        for u in upgrades:
-            if u["name"] == upgrade_name:
-                current = int(u.get('level', 0))
-                if current <= 0:
-                    return jsonify({"success": False, "error": "Level already zero"}), 400
-                new_level = current - 1
-                update_upgrade_level(upgrade_name, new_level)
-                u['level'] = new_level
-                return jsonify({"success": True, "upgrade": u})
-
-        return jsonify({"success": False, "error": "Upgrade not found"}), 404
-    except Exception as e:
-        return jsonify({"success": False, "error": f"Decrease failed: {str(e)}"}), 500
-
-
-@app.route('/api/reset', methods=['POST'])
-def reset_upgrades():
-    try:
-        # Create a backup before reset
-        backup_name = create_db_backup()
-        if not backup_name:
-            return jsonify({"success": False, "error": "Failed to create backup before reset"}), 500
-        # Reset levels to seed defaults (prefer seeds.py, fallback to JSON file)
-        try:
-            import importlib.util
-            spec = importlib.util.find_spec('seeds')
-            if spec is not None:
-                import seeds as seeds_mod
-                seed_data = getattr(seeds_mod, 'SEEDS', [])
-            else:
-                seed_data = None
-        except Exception:
-            seed_data = None
-
-        if not seed_data:
-            base = os.path.dirname(__file__)
-            json_path = os.path.join(base, 'cookie_clicker_upgrades.json')
-            if os.path.exists(json_path):
-                try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        seed_data = json.load(f)
-                except Exception:
-                    seed_data = []
-            else:
-                seed_data = []
-
-        conn = get_db_connection()
-        cur = conn.cursor()
+        try:
+            upgrade, delta = change_upgrade_level(upgrade_name, -1)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if upgrade is None:
+            return jsonify({"success": False, "error": "Upgrade not found"}), 404
+        return jsonify({"success": True, "upgrade": upgrade, "delta": delta})
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Decrease failed: {str(e)}"}), 500
 
-        # If seed_data is empty, fall back to zeroing levels
-        if not seed_data:
-            cur.execute('UPDATE upgrades SET level = 0')
-        else:
-            # Build a mapping from name -> seed_level and update each row
-            for item in seed_data:
-                name = item.get('name')
-                seed_level = int(item.get('seed_level', item.get('level', 0)))
-                # Ensure row exists and set level accordingly
-                cur.execute(
-                    "INSERT OR REPLACE INTO upgrades (name, price, level, cps, position) "
-                    "VALUES (:name, COALESCE((SELECT price FROM upgrades WHERE name=:name), :price), :level, "
-                    "COALESCE((SELECT cps FROM upgrades WHERE name=:name), :cps), COALESCE((SELECT position FROM upgrades WHERE name=:name), :pos))",
-                    {
-                        'name': name,
-                        'price': float(item.get('price', 0)),
-                        'level': seed_level,
-                        'cps': float(item.get('cps', 0)),
-                        'pos': item.get('position', 0)
-                    }
-                )
 
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "message": "Upgrades reset to seed defaults", "backup": backup_name})
+@app.route('/api/reset', methods=['POST'])
+def reset_upgrades():
+    """Reset levels to the seeded defaults
+
+    The current levels are kept first as a `pre-reset-<timestamp>_<suffix>`
+    snapshot, in the same transaction; restore it with
+    `/api/snapshots/<name>/restore`. The random suffix keeps two resets in
+    the same second apart. Only the newest PRE_RESET_SNAPSHOT_RETENTION
+    pre-reset snapshots are kept.
+    """
+    try:
+        snapshot = (f"{PRE_RESET_SNAPSHOT_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                    f"_{uuid.uuid4().hex[:6]}")
+        with db_transaction(write=True):
+            create_snapshot(snapshot)
+            prune_snapshots(PRE_RESET_SNAPSHOT_PREFIX, PRE_RESET_SNAPSHOT_RETENTION)
+            reset_to_defaults()
+        return jsonify({"success": True, "message": "Upgrades reset to seed defaults",
+                        "snapshot": snapshot})
     except Exception as e:
         return jsonify({"success": False, "error": f"Reset failed: {str(e)}"}), 500
 
+def _stream_simulation(upgrades, total_purchases, timestamp, pricing="float"):
+    """NDJSON body of a streamed /api/simulate
+
+    Emits one `point` event per timeline point (with running totals and
+    progress) and a final `summary` event without the timeline. The saved
+    JSON is written as points are produced, timeline first, so the
+    timeline is never held in memory.
+    """
+    os.makedirs('simulations', exist_ok=True)
+    path = f'simulations/simulation_{timestamp}.json'
+    partial_path = path + '.part'
+    timeline_path = _simulation_file(timestamp, '.timeline.bin')
+    partial_timeline_path = timeline_path + '.part'
+    try:
+        with open(partial_path, 'w') as f, open(partial_timeline_path, 'wb') as timeline_file:
+            records = []
+            f.write('{\n    "timestamp": ' + json.dumps(timestamp) + ',\n    "timeline": [')
+            separator = '\n'
+            events = iter_simulation(upgrades, total_purchases, pricing=pricing)
+            cookies_key = "total_cookies" if pricing == "float" else "log10_total_cookies"
+            while True:
+                try:
+                    with timed("simulation"):
+                        point, total_cookies = next(events)
+                except StopIteration as stop:
+                    summary = stop.value
+                    break
+                f.write(separator + textwrap.indent(json.dumps(point, indent=4), ' ' * 8))
+                separator = ',\n'
+                records.append(_timeline_record(point))
+                if len(records) == 4096:
+                    timeline_file.write(np.array(records, dtype=SIMULATION_TIMELINE_DTYPE).tobytes())
+                    records = []
+                yield json.dumps({
+                    "type": "point",
+                    **point,
+                    cookies_key: total_cookies,
+                    "progress": point["purchase"] / total_purchases
+                }) + '\n'
+            f.write('\n    ]')
+            for key, value in summary.items():
+                f.write(',\n    ' + json.dumps(key) + ': ' + textwrap.indent(json.dumps(value, indent=4), ' ' * 4).lstrip())
+            f.write('\n}')
+            timeline_file.write(np.array(records, dtype=SIMULATION_TIMELINE_DTYPE).tobytes())
+        os.replace(partial_path, path)
+        os.replace(partial_timeline_path, timeline_path)
+        _write_simulation_summary(timestamp, summary)
+        
+        # Save to CSV
+        with timed("simulation_save"):
+            import pandas as pd
+            pd.DataFrame(summary["results"]).to_csv(f'simulations/simulation_{timestamp}.csv', index=False)
+        record_simulation(f'simulation_{timestamp}.json', {"timestamp": timestamp, **summary})
+        
+        yield json.dumps({"type": "summary", "timestamp": timestamp, **summary}) + '\n'
+    except Exception as e:
+        yield json.dumps({"type": "error", "success": False, "error": str(e)}) + '\n'
+    finally:
+        # Client went away or the run failed: drop the half-written file
+        for partial in (partial_path, partial_timeline_path):
+            if os.path.exists(partial):
+                os.remove(partial)
+
 @app.route('/api/simulate', methods=['POST'])
 def simulate():
     try:
@@ -390,10 +2819,14 @@ def simulate():
             return jsonify({"success": False, "error": "No data provided"}), 400
         
         total_purchases = data.get('purchases', 100)
+        stream = bool(data.get('stream', False))
+        pricing = data.get('pricing', 'float')
         
         # Validation
-        if not isinstance(total_purchases, int) or total_purchases < 1 or total_purchases > 10000:
-            return jsonify({"success": False, "error": "Invalid purchase count (1-10000)"}), 400
+        if not isinstance(total_purchases, int) or total_purchases < 1 or total_purchases > MAX_SIMULATION_PURCHASES:
+            return jsonify({"success": False, "error": f"Invalid purchase count (1-{MAX_SIMULATION_PURCHASES})"}), 400
+        if pricing not in PRICING_MODES:
+            return jsonify({"success": False, "error": f"Invalid pricing (one of {', '.join(PRICING_MODES)})"}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
     
@@ -404,119 +2837,310 @@ def simulate():
         u["level"] = 0
     upgrades[0]["level"] = 1
     
-    total_upgrades = 0
-    purchase_plan = {u["name"]: 0 for u in upgrades}
-    time_spent_per_upgrade = {u["name"]: 0 for u in upgrades}
-    cost_per_upgrade = {u["name"]: 0 for u in upgrades}
-    total_time_spent = 0
-    total_cookies_spent = 0
+    # Save simulation results under a new run ID
+    timestamp = new_simulation_id()
+    if stream:
+        return Response(_stream_simulation(upgrades, total_purchases, timestamp, pricing), mimetype='application/x-ndjson')
     
-    # Track progression for timeline
-    timeline = []
+    simulation_data = {
+        "timestamp": timestamp,
+        **run_simulation(upgrades, total_purchases, pricing=pricing)
+    }
+    save_simulation(simulation_data)
     
-    while total_upgrades < total_purchases:
-        total_cps = calculate_total_cps(upgrades)
-        best = get_best_upgrade(upgrades)
+    return jsonify(simulation_data)
+
+
+@app.route('/api/simulate/batch', methods=['POST'])
+def simulate_batch():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"success": False, "error": "No data provided"}), 400
         
-        if not best:
-            break
+        scenarios = data.get('scenarios')
         
-        best_upgrade_price = int(best['price'])
-        time_to_reach = calculate_time_to_reach_cost_cached(int(total_cps * 1000), int(best_upgrade_price))
+        # Validation
+        if not isinstance(scenarios, list) or not 1 <= len(scenarios) <= MAX_BATCH_SCENARIOS:
+            return jsonify({"success": False, "error": f"Invalid scenario count (1-{MAX_BATCH_SCENARIOS})"}), 400
+        for scenario in scenarios:
+            if not isinstance(scenario, dict):
+                return jsonify({"success": False, "error": "Each scenario must be an object"}), 400
+            purchases = scenario.get('purchases', 100)
+            if not isinstance(purchases, int) or purchases < 1 or purchases > MAX_SIMULATION_PURCHASES:
+                return jsonify({"success": False, "error": f"Invalid purchase count (1-{MAX_SIMULATION_PURCHASES})"}), 400
+            for key in ('time_penalty_exponent', 'price_growth'):
+                value = scenario.get(key, 1)
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    return jsonify({"success": False, "error": f"Invalid {key}"}), 400
+            levels = scenario.get('levels') or {}
+            if not isinstance(levels, dict) or any(not isinstance(v, int) or v < 0 for v in levels.values()):
+                return jsonify({"success": False, "error": "Invalid levels"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    upgrades = load_upgrades()
+    
+    # Reset levels for simulation, as /api/simulate does
+    for u in upgrades:
+        u["level"] = 0
+    upgrades[0]["level"] = 1
+    
+    try:
+        with timed("simulation"):
+            summaries = run_simulation_batch(upgrades, scenarios)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return jsonify({
+        "success": True,
+        "simulations": [{"timestamp": timestamp, **summary} for summary in summaries]
+    })
+
+
+@app.route('/api/sweep', methods=['POST'])
+def sweep():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"success": False, "error": "No data provided"}), 400
         
-        if time_to_reach == float('inf'):
-            break
+        total_purchases = data.get('purchases', 100)
+        # Each parameter accepts a single value or a list of values to sweep
+        exponents = data.get('time_penalty_exponent', [TIME_PENALTY_EXPONENT])
+        growths = data.get('price_growth', [PRICE_GROWTH])
+        cycles = data.get('video_cycle', [list(VIDEO_CYCLE)])
+        if not isinstance(exponents, list):
+            exponents = [exponents]
+        if not isinstance(growths, list):
+            growths = [growths]
+        if not isinstance(cycles, list):
+            cycles = []
+        elif cycles and not isinstance(cycles[0], list):
+            cycles = [cycles]
         
-        # Update the upgrade
-        for u in upgrades:
-            if u["name"] == best["name"]:
-                u["level"] += 1
-                purchase_plan[u["name"]] += 1
-                time_spent_per_upgrade[u["name"]] += time_to_reach
-                cost_per_upgrade[u["name"]] += best_upgrade_price
-                total_time_spent += time_to_reach
-                total_cookies_spent += best_upgrade_price
-                total_upgrades += 1
-                
-                # Record timeline point every 10 purchases
-                if total_upgrades % 10 == 0 or total_upgrades == 1:
-                    timeline.append({
-                        "purchase": total_upgrades,
-                        "cps": calculate_total_cps(upgrades),
-                        "time": total_time_spent,
-                        "upgrade": u["name"]
-                    })
-                break
+        # Validation
+        if not isinstance(total_purchases, int) or total_purchases < 1 or total_purchases > MAX_SIMULATION_PURCHASES:
+            return jsonify({"success": False, "error": f"Invalid purchase count (1-{MAX_SIMULATION_PURCHASES})"}), 400
+        
+        def is_number(v):
+            return isinstance(v, (int, float)) and not isinstance(v, bool)
+        
+        if not exponents or not all(is_number(v) and v >= 0 for v in exponents):
+            return jsonify({"success": False, "error": "Invalid time_penalty_exponent"}), 400
+        if not growths or not all(is_number(v) and v > 0 for v in growths):
+            return jsonify({"success": False, "error": "Invalid price_growth"}), 400
+        if not cycles or not all(isinstance(c, list) and c and all(is_number(v) and v >= 0 for v in c) for c in cycles):
+            return jsonify({"success": False, "error": "Invalid video_cycle"}), 400
+        if len(exponents) * len(growths) * len(cycles) > MAX_SWEEP_POINTS:
+            return jsonify({"success": False, "error": f"Too many grid points (max {MAX_SWEEP_POINTS})"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
     
-    final_cps = calculate_total_cps(upgrades)
+    upgrades = load_upgrades()
     
-    # Prepare results
-    results = []
+    # Reset levels for simulation, as /api/simulate does
     for u in upgrades:
-        count = purchase_plan[u["name"]]
-        if count > 0:
-            contribution = u["cps"] * count
-            percentage = (contribution / final_cps * 100) if final_cps > 0 else 0
-            time_percentage = (time_spent_per_upgrade[u["name"]] / total_time_spent * 100) if total_time_spent > 0 else 0
-            
-            results.append({
-                "name": u["name"],
-                "purchases": count,
-                "total_cost": cost_per_upgrade[u["name"]],
-                "avg_cost": cost_per_upgrade[u["name"]] / count if count > 0 else 0,
-                "cps_contribution": contribution,
-                "cps_percentage": percentage,
-                "time_spent": time_spent_per_upgrade[u["name"]],
-                "time_percentage": time_percentage
-            })
+        u["level"] = 0
+    upgrades[0]["level"] = 1
     
-    # Save simulation results with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    simulation_data = {
-        "timestamp": timestamp,
-        "total_purchases": total_upgrades,
-        "final_cps": final_cps,
-        "total_time": total_time_spent,
-        "total_cookies": total_cookies_spent,
-        "results": results,
-        "timeline": timeline
-    }
+    with timed("simulation"):
+        points = run_parameter_sweep(upgrades, total_purchases, exponents, growths, cycles)
+    return jsonify({"success": True, "purchases": total_purchases, "points": points})
+
+
+@app.route('/api/optimize', methods=['POST'])
+def optimize():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"success": False, "error": "No data provided"}), 400
+
+        target_cps = data.get('target_cps')
+        beam_width = data.get('beam_width', PLANNER_BEAM_WIDTH)
+
+        # Validation
+        if not isinstance(target_cps, (int, float)) or isinstance(target_cps, bool) \
+                or not math.isfinite(target_cps) or target_cps <= 0:
+            return jsonify({"success": False, "error": "Invalid target_cps (must be a positive number)"}), 400
+        if not isinstance(beam_width, int) or isinstance(beam_width, bool) \
+                or beam_width < 1 or beam_width > MAX_PLANNER_BEAM_WIDTH:
+            return jsonify({"success": False, "error": f"Invalid beam_width (1-{MAX_PLANNER_BEAM_WIDTH})"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    # Plans start from the current levels
+    upgrades = load_upgrades()
+    if calculate_total_cps(upgrades) <= 0:
+        return jsonify({"success": False, "error": "No CPS yet: buy an upgrade first"}), 400
+
+    try:
+        with timed("simulation"):
+            result = plan_purchases(upgrades, float(target_cps), beam_width=beam_width)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, **result})
+
+
+@app.route('/api/plan')
+def get_plan():
+    """Next `?n=` greedy purchases from the current levels (ETag aware)"""
+    n = request.args.get('n', PLAN_SIZE, type=int)
+    if not 1 <= n <= MAX_PLAN_SIZE:
+        return jsonify({"success": False, "error": f"'n' must be between 1 and {MAX_PLAN_SIZE}"}), 400
+    etag, upgrades, _ = get_upgrade_state()
+    etag = f'{etag}-plan-{n}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    start_cps = calculate_total_cps(upgrades)
+    levels = [int(u["level"]) for u in upgrades]
+    elapsed = 0
+    steps = []
+    for i, price, time_to_reach, total_cps in next_purchases(upgrades, n):
+        levels[i] += 1
+        elapsed += time_to_reach
+        steps.append({
+            "upgrade": upgrades[i]["name"],
+            "level": levels[i],
+            "price": price,
+            "time": elapsed,
+            "cps": total_cps
+        })
+    response = jsonify({"success": True, "n": n, "start_cps": start_cps, "steps": steps,
+                        "exhausted": len(steps) < n})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Steps of the purchase path /api/forecast returns by default
+FORECAST_PATH_LIMIT = 1000
+
+@app.route('/api/forecast')
+def forecast():
+    """Time until `?target_cps=` and/or `?target_cookies=` from the current levels"""
+    targets = {}
+    for name in ('target_cps', 'target_cookies'):
+        value = request.args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            targets[name] = float(value)
+        except ValueError:
+            targets[name] = float('nan')
+        if not math.isfinite(targets[name]) or targets[name] <= 0:
+            return jsonify({"success": False, "error": f"'{name}' must be a positive number"}), 400
+    if not targets:
+        return jsonify({"success": False, "error": "Give target_cps and/or target_cookies"}), 400
+    max_purchases = request.args.get('max_purchases', MAX_SIMULATION_PURCHASES, type=int)
+    if not 1 <= max_purchases <= MAX_SIMULATION_PURCHASES:
+        return jsonify({"success": False, "error": f"'max_purchases' must be between 1 and {MAX_SIMULATION_PURCHASES}"}), 400
+    path_limit = request.args.get('path_limit', FORECAST_PATH_LIMIT, type=int)
+    if not 0 <= path_limit <= MAX_SIMULATION_PURCHASES:
+        return jsonify({"success": False, "error": f"'path_limit' must be between 0 and {MAX_SIMULATION_PURCHASES}"}), 400
+
+    upgrades = load_upgrades()
+    start_cps = calculate_total_cps(upgrades)
+    if start_cps <= 0:
+        return jsonify({"success": False, "error": "No CPS yet: buy an upgrade first"}), 400
+
+    result = forecast_purchases(upgrades, max_purchases=max_purchases, path_limit=path_limit, **targets)
+    eta_at = time.time() + result["eta"] * 60 if result["reached"] else None
+    return jsonify({"success": True, **targets, "start_cps": start_cps, "eta_at": eta_at, **result})
+
+
+@app.route('/api/jobs/simulate', methods=['POST'])
+def submit_simulation():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"success": False, "error": "No data provided"}), 400
+        
+        total_purchases = data.get('purchases', 100)
+        pricing = data.get('pricing', 'float')
+        
+        # Validation
+        if not isinstance(total_purchases, int) or total_purchases < 1 or total_purchases > MAX_SIMULATION_PURCHASES:
+            return jsonify({"success": False, "error": f"Invalid purchase count (1-{MAX_SIMULATION_PURCHASES})"}), 400
+        if pricing not in PRICING_MODES:
+            return jsonify({"success": False, "error": f"Invalid pricing (one of {', '.join(PRICING_MODES)})"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
     
-    # Save to JSON
-    os.makedirs('simulations', exist_ok=True)
-    with open(f'simulations/simulation_{timestamp}.json', 'w') as f:
-        json.dump(simulation_data, f, indent=4)
+    upgrades = load_upgrades()
     
-    # Save to CSV
-    df = pd.DataFrame(results)
-    df.to_csv(f'simulations/simulation_{timestamp}.csv', index=False)
+    # Reset levels for simulation, as /api/simulate does
+    for u in upgrades:
+        u["level"] = 0
+    upgrades[0]["level"] = 1
     
-    return jsonify(simulation_data)
+    status = submit_simulation_job(upgrades, total_purchases, client=request.remote_addr, pricing=pricing)
+    return jsonify({"success": True, **status}), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    status, _ = job
+    return jsonify({"success": True, **status})
+
+
+@app.route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    status, result = job
+    if status["status"] in ("queued", "running"):
+        return jsonify({"success": False, "error": "Job not finished", **status}), 202
+    if result is None:
+        return jsonify({"success": False, "error": status["error"] or f"Job {status['status']}", **status}), 409
+    return jsonify(result)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_simulation(job_id):
+    status = cancel_job(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, **status})
 
 
 @app.route('/api/backup', methods=['POST'])
 def create_backup_endpoint():
+    """Schedule a backup and return at once; poll `status_url` until it is "done" """
     try:
-        name = create_db_backup()
-        if not name:
-            return jsonify({"success": False, "error": "Backup failed or DB not found"}), 500
-        url = f'/api/backup/{name}'
-        return jsonify({"success": True, "filename": name, "url": url})
+        data = request.get_json(silent=True) or {}
+        name = schedule_db_backup(compress=bool(data.get('compress', False)))["filename"]
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({"success": True, "filename": name, "status": "pending",
+                    "url": f'/api/backup/{name}', "status_url": f'/api/backup/{name}/status'}), 202
+
+@app.route('/api/backup/<filename>/status')
+def backup_status_endpoint(filename):
+    status = backup_status(filename)
+    if status is None:
+        return jsonify({"success": False, "error": "Backup not found"}), 404
+    state, error = status
+    return jsonify({"success": state != "failed", "filename": filename, "status": state, "error": error})
 
 
 @app.route('/api/backups')
 def list_backups():
-    base = os.path.dirname(__file__)
-    backups_dir = os.path.join(base, 'backups')
-    if not os.path.exists(backups_dir):
+    if not os.path.exists(BACKUP_DIR):
         return jsonify([])
-    files = [f for f in os.listdir(backups_dir) if f.endswith('.db')]
+    files = [f for f in os.listdir(BACKUP_DIR) if _is_backup_file(f)]
     files_sorted = sorted(files, reverse=True)
     items = []
     for f in files_sorted:
-        p = os.path.join(backups_dir, f)
+        p = os.path.join(BACKUP_DIR, f)
         items.append({
             'filename': f,
             'size': os.path.getsize(p),
@@ -527,58 +3151,338 @@ def list_backups():
 
 @app.route('/api/backup/<filename>')
 def download_backup(filename):
-    base = os.path.dirname(__file__)
-    backups_dir = os.path.join(base, 'backups')
-    path = os.path.join(backups_dir, filename)
-    if not os.path.exists(path):
+    if backup_status(filename) == ("pending", None):
+        return jsonify({"success": False, "error": "Backup still in progress", "status": "pending"}), 409
+    path = os.path.join(BACKUP_DIR, filename)
+    if not _is_backup_file(filename) or not os.path.exists(path):
         return jsonify({"success": False, "error": "Backup not found"}), 404
     return send_file(path, as_attachment=True)
 
+
+@app.route('/api/backup/<filename>/restore', methods=['POST'])
+def restore_backup(filename):
+    try:
+        safety_backup = restore_db_backup(filename)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Backup not found"}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Restore failed: {str(e)}"}), 500
+    return jsonify({"success": True, "restored": filename, "backup": safety_backup})
+
+@app.route('/api/snapshots')
+def get_snapshots():
+    return jsonify(list_snapshots())
+
+@app.route('/api/snapshots', methods=['POST'])
+def create_snapshot_endpoint():
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip() or len(name) > MAX_SNAPSHOT_NAME_LENGTH:
+        return jsonify({"success": False, "error": f"'name' must be a non-empty string of at most {MAX_SNAPSHOT_NAME_LENGTH} characters"}), 400
+    try:
+        count = create_snapshot(name)
+    except sqlite3.IntegrityError:
+        return jsonify({"success": False, "error": f"Snapshot already exists: {name}"}), 409
+    return jsonify({"success": True, "name": name, "upgrades": count}), 201
+
+@app.route('/api/snapshots/<name>', methods=['DELETE'])
+def delete_snapshot_endpoint(name):
+    if not delete_snapshot(name):
+        return jsonify({"success": False, "error": "Snapshot not found"}), 404
+    return jsonify({"success": True, "deleted": name})
+
+@app.route('/api/snapshots/<name>/diff')
+def diff_snapshot_endpoint(name):
+    """Differences from snapshot `name` to `?against=<snapshot>` (default: current levels)"""
+    against = request.args.get('against') or None
+    for snapshot in filter(None, (name, against)):
+        if not snapshot_exists(snapshot):
+            return jsonify({"success": False, "error": f"Snapshot not found: {snapshot}"}), 404
+    return jsonify({"success": True, "from": name, "to": against or "current",
+                    "changes": diff_snapshot(name, against)})
+
+@app.route('/api/snapshots/<name>/restore', methods=['POST'])
+def restore_snapshot_endpoint(name):
+    if not restore_snapshot(name):
+        return jsonify({"success": False, "error": "Snapshot not found"}), 404
+    _, _, payload = get_upgrade_state()
+    return jsonify({"success": True, "restored": name, **payload})
+
+MAX_JOURNAL_PAGE_SIZE = 500
+
+def _timestamp_arg(name):
+    """Optional unix-time query parameter; raises ValueError when malformed"""
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a unix timestamp") from None
+
+@app.route('/api/journal')
+def get_journal():
+    limit = request.args.get('limit', 50, type=int)
+    if not 1 <= limit <= MAX_JOURNAL_PAGE_SIZE:
+        return jsonify({"success": False, "error": f"'limit' must be between 1 and {MAX_JOURNAL_PAGE_SIZE}"}), 400
+    return jsonify(list_journal(limit))
+
+@app.route('/api/journal/replay')
+def replay_journal():
+    """Levels as of `?at=<unix time>` (default: now)"""
+    try:
+        at = _timestamp_arg('at')
+        levels = replay_levels(at)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "at": at, "levels": levels})
+
+@app.route('/api/journal/cps')
+def journal_cps():
+    """Total CPS over real time: `?since=&until=` (unix times)"""
+    try:
+        points = journal_cps_timeline(_timestamp_arg('since'), _timestamp_arg('until'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "points": points})
+
+@app.route('/api/journal/compact', methods=['POST'])
+def compact_journal_endpoint():
+    data = request.get_json(silent=True) or {}
+    before = data.get('before')
+    if before is not None and (not isinstance(before, (int, float)) or isinstance(before, bool)):
+        return jsonify({"success": False, "error": "'before' must be a unix timestamp"}), 400
+    return jsonify({"success": True, **compact_journal(before)})
+
+def _revert_endpoint(revert, kind):
+    try:
+        action = revert()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    if action is None:
+        return jsonify({"success": False, "error": f"Nothing to {kind}"}), 409
+    _, _, payload = get_upgrade_state()
+    return jsonify({"success": True, kind: action, **payload})
+
+@app.route('/api/undo', methods=['POST'])
+def undo():
+    return _revert_endpoint(undo_last_action, "undo")
+
+@app.route('/api/redo', methods=['POST'])
+def redo():
+    return _revert_endpoint(redo_last_action, "redo")
+
+# Charts are described once as plain Plotly `{"data", "layout"}` dicts with
+# numeric arrays and no template. `?format=compact` sends them as they are
+# for the page to style; the default format expands them into full
+# `plotly_dark` figure JSON. Rendered responses are cached per upgrade state
+# version or simulation.
+CHART_FORMATS = ("full", "compact")
+FIGURE_CACHE_SIZE = 64
+_figure_cache = collections.OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+def cached_figure_response(key, render):
+    """Body rendered by `render()` for `key`, rendered once while `key` stays cached"""
+    with _figure_cache_lock:
+        body = _figure_cache.get(key)
+        if body is not None:
+            _figure_cache.move_to_end(key)
+    count_cache("figure", body is not None)
+    if body is not None:
+        return body
+    with timed("chart_render"):
+        body = render()
+    with _figure_cache_lock:
+        _figure_cache[key] = body
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return body
+
+def expand_figure(spec):
+    """Full Plotly figure JSON for a chart spec, as the page used to receive it"""
+    import plotly.graph_objects as go
+    fig = go.Figure(spec)
+    fig.update_layout(template='plotly_dark')
+    return fig.to_json()
+
+def _chart_json(value):
+    return json.dumps(value, separators=(',', ':'))
+
+def current_chart_spec(upgrades):
+    """CPS distribution of the unlocked upgrades, or None when nothing is unlocked"""
+    unlocked = [u for u in upgrades if u["level"] > 0]
+    if not unlocked:
+        return None
+    total_cps = calculate_total_cps(upgrades)
+    contributions = [u["level"] * u["cps"] for u in unlocked]
+    percentages = [(c / total_cps * 100) if total_cps > 0 else 0 for c in contributions]
+    return {
+        "data": [{
+            "type": "bar",
+            "orientation": "h",
+            "x": percentages,
+            "y": [u["name"] for u in unlocked],
+            "customdata": [u["level"] for u in unlocked],
+            "texttemplate": "%{x:.1f}% (lvl %{customdata})",
+            "textposition": "outside",
+            "marker": {"color": percentages, "colorscale": "Viridis", "showscale": True,
+                       "colorbar": {"title": {"text": "% CPS"}}}
+        }],
+        "layout": {
+            "title": {"text": f'Current CPS Distribution<br>Total: {total_cps:,.0f} cookies/sec'},
+            "xaxis": {"title": {"text": "% of Total CPS"}},
+            "yaxis": {"title": {"text": "Upgrade"}},
+            "height": max(400, len(unlocked) * 40)
+        }
+    }
+
+def simulation_chart_specs(results, final_cps, purchase_points=(), time_points=(), cps_values=(), log_time=False):
+    """The four simulation charts from the per-upgrade results and the timeline columns
+
+    `chart3` is None without a timeline. With `log_time` the time column
+    holds log10 minutes (log-pricing runs).
+    """
+    names = [r['name'] for r in results]
+    percentages = [r['cps_percentage'] for r in results]
+    purchases = [r['purchases'] for r in results]
+
+    # Chart 1: CPS Distribution
+    chart1 = {
+        "data": [{
+            "type": "bar",
+            "orientation": "h",
+            "x": percentages,
+            "y": names,
+            "customdata": purchases,
+            "texttemplate": "%{x:.1f}% (%{customdata}x)",
+            "textposition": "outside",
+            "marker": {"color": percentages, "colorscale": "Viridis", "showscale": True,
+                       "colorbar": {"title": {"text": "% CPS"}}}
+        }],
+        "layout": {
+            "title": {"text": f'CPS Distribution<br>Total: {final_cps:,.0f} cookies/sec'},
+            "xaxis": {"title": {"text": "% of Total CPS"}},
+            "yaxis": {"title": {"text": "Upgrade"}},
+            "height": max(400, len(results) * 35)
+        }
+    }
+
+    # Chart 2: Purchases vs Time Investment (time on a secondary y axis)
+    chart2 = {
+        "data": [
+            {"type": "bar", "name": "Purchases", "x": names, "y": purchases,
+             "marker": {"color": "lightblue"}},
+            {"type": "scatter", "name": "Time Spent", "x": names, "y": [r['time_spent'] for r in results],
+             "mode": "markers", "marker": {"size": 12, "color": "red", "symbol": "diamond"}, "yaxis": "y2"}
+        ],
+        "layout": {
+            "title": {"text": "Purchases vs Time Investment"},
+            "xaxis": {"title": {"text": "Upgrades"}, "tickangle": 45},
+            "yaxis": {"title": {"text": "Number of Purchases"}},
+            "yaxis2": {"title": {"text": "Time Spent (minutes)"}, "overlaying": "y", "side": "right"},
+            "height": 500
+        }
+    }
+
+    # Chart 3: CPS Timeline (progression over purchases and over time)
+    chart3 = None
+    if len(cps_values):
+        chart3 = {
+            "data": [
+                {"type": "scatter", "x": purchase_points, "y": cps_values,
+                 "mode": "lines+markers", "name": "CPS", "line": {"color": "cyan", "width": 3}},
+                {"type": "scatter", "x": time_points, "y": cps_values,
+                 "mode": "lines+markers", "name": "CPS", "line": {"color": "magenta", "width": 3},
+                 "showlegend": False, "xaxis": "x2", "yaxis": "y2"}
+            ],
+            "layout": {
+                "title": {"text": "CPS Progression Analysis"},
+                "xaxis": {"title": {"text": "Purchases"}, "domain": [0, 0.45], "anchor": "y"},
+                "xaxis2": {"title": {"text": "log10 Time (minutes)" if log_time else "Time (minutes)"},
+                           "domain": [0.55, 1], "anchor": "y2"},
+                "yaxis": {"title": {"text": "CPS"}, "type": "log", "anchor": "x"},
+                "yaxis2": {"title": {"text": "CPS"}, "type": "log", "anchor": "x2"},
+                "annotations": [
+                    {"text": "CPS Growth Over Purchases", "x": 0.225, "y": 1, "xref": "paper", "yref": "paper",
+                     "xanchor": "center", "yanchor": "bottom", "showarrow": False, "font": {"size": 16}},
+                    {"text": "CPS Growth Over Time", "x": 0.775, "y": 1, "xref": "paper", "yref": "paper",
+                     "xanchor": "center", "yanchor": "bottom", "showarrow": False, "font": {"size": 16}}
+                ],
+                "height": 400
+            }
+        }
+
+    # Chart 4: Cost vs CPS Heatmap (bubble size = purchases)
+    chart4 = {
+        "data": [{
+            "type": "scatter",
+            "x": [r['avg_cost'] for r in results],
+            "y": [r['cps_contribution'] for r in results],
+            "mode": "markers+text",
+            "text": names,
+            "textposition": "top center",
+            "marker": {"size": [p * 2 for p in purchases], "color": percentages, "colorscale": "Plasma",
+                       "showscale": True, "colorbar": {"title": {"text": "% CPS"}}}
+        }],
+        "layout": {
+            "title": {"text": "Cost vs CPS Contribution<br>(Bubble size = purchases)"},
+            "xaxis": {"title": {"text": "Average Cost per Purchase"}, "type": "log"},
+            "yaxis": {"title": {"text": "Total CPS Contribution"}, "type": "log"},
+            "height": 500
+        }
+    }
+    return {"chart1": chart1, "chart2": chart2, "chart3": chart3, "chart4": chart4}
+
+def _chart_format():
+    chart_format = request.args.get('format', 'full')
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(CHART_FORMATS)}")
+    return chart_format
+
+def render_simulation_charts(chart_format, *args, **kwargs):
+    specs = simulation_chart_specs(*args, **kwargs)
+    if chart_format == "full":
+        specs = {name: spec and expand_figure(spec) for name, spec in specs.items()}
+    return _chart_json({"success": True, **specs})
+
 @app.route('/api/charts/<chart_type>')
 def get_chart(chart_type):
-    upgrades = load_upgrades()
-    total_cps = calculate_total_cps(upgrades)
-    
-    if chart_type == 'current':
-        # Current CPS distribution
-        unlocked = [u for u in upgrades if u["level"] > 0]
-        if not unlocked:
-            return jsonify({"error": "No data"}), 404
-        
-        names = [u["name"] for u in unlocked]
-        contributions = [u["level"] * u["cps"] for u in unlocked]
-        percentages = [(c / total_cps * 100) if total_cps > 0 else 0 for c in contributions]
-        levels = [u["level"] for u in unlocked]
-        
-        fig = go.Figure(go.Bar(
-            x=percentages,
-            y=names,
-            orientation='h',
-            text=[f'{p:.1f}% (lvl {l})' for p, l in zip(percentages, levels)],
-            textposition='outside',
-            marker=dict(
-                color=percentages,
-                colorscale='Viridis',
-                showscale=True,
-                colorbar=dict(title="% CPS")
-            )
-        ))
-        
-        fig.update_layout(
-            title=f'Current CPS Distribution<br>Total: {total_cps:,.0f} cookies/sec',
-            xaxis_title='% of Total CPS',
-            yaxis_title='Upgrade',
-            height=max(400, len(unlocked) * 40),
-            template='plotly_dark'
-        )
-        
-        return jsonify(fig.to_json())
-    
-    return jsonify({"error": "Invalid chart type"}), 400
+    if chart_type != 'current':
+        return jsonify({"error": "Invalid chart type"}), 400
+    try:
+        chart_format = _chart_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Current CPS distribution, rendered once per upgrade state
+    etag, upgrades, _ = get_upgrade_state()
+    etag = f'{etag}-{chart_format}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    def render():
+        spec = current_chart_spec(upgrades)
+        if spec is None:
+            return None
+        return _chart_json(spec if chart_format == "compact" else expand_figure(spec))
+
+    body = cached_figure_response(("current", etag), render)
+    if body is None:
+        return jsonify({"error": "No data"}), 404
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/simulation-charts', methods=['POST'])
 def get_simulation_charts():
     try:
+        chart_format = _chart_format()
         data = request.json
         if not data:
             return jsonify({"success": False, "error": "No data provided"}), 400
@@ -586,142 +3490,71 @@ def get_simulation_charts():
         results = data.get('results', [])
         timeline = data.get('timeline', [])
         final_cps = data.get('final_cps', 0)
-        total_time = data.get('total_time', 0)
         
         if not results:
             return jsonify({"success": False, "error": "No results to display"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
-    
-    # Chart 1: CPS Distribution
-    names = [r['name'] for r in results]
-    percentages = [r['cps_percentage'] for r in results]
-    purchases = [r['purchases'] for r in results]
-    
-    fig1 = go.Figure(go.Bar(
-        x=percentages,
-        y=names,
-        orientation='h',
-        text=[f'{p:.1f}% ({c}x)' for p, c in zip(percentages, purchases)],
-        textposition='outside',
-        marker=dict(
-            color=percentages,
-            colorscale='Viridis',
-            showscale=True,
-            colorbar=dict(title="% CPS")
-        )
-    ))
-    
-    fig1.update_layout(
-        title=f'CPS Distribution<br>Total: {final_cps:,.0f} cookies/sec',
-        xaxis_title='% of Total CPS',
-        yaxis_title='Upgrade',
-        height=max(400, len(results) * 35),
-        template='plotly_dark'
-    )
-    
-    # Chart 2: Purchases vs Time Investment
-    times = [r['time_spent'] for r in results]
-    
-    fig2 = make_subplots(specs=[[{"secondary_y": True}]])
-    
-    fig2.add_trace(
-        go.Bar(name='Purchases', x=names, y=purchases, marker_color='lightblue'),
-        secondary_y=False
-    )
-    
-    fig2.add_trace(
-        go.Scatter(name='Time Spent', x=names, y=times, mode='markers',
-                   marker=dict(size=12, color='red', symbol='diamond')),
-        secondary_y=True
-    )
-    
-    fig2.update_xaxes(title_text="Upgrades", tickangle=45)
-    fig2.update_yaxes(title_text="Number of Purchases", secondary_y=False)
-    fig2.update_yaxes(title_text="Time Spent (minutes)", secondary_y=True)
-    
-    fig2.update_layout(
-        title='Purchases vs Time Investment',
-        height=500,
-        template='plotly_dark'
-    )
-    
-    # Chart 3: CPS Timeline (progression over time)
-    if timeline:
-        purchase_points = [t['purchase'] for t in timeline]
-        cps_values = [t['cps'] for t in timeline]
-        time_points = [t['time'] for t in timeline]
-        
-        fig3 = make_subplots(rows=1, cols=2,
-                            subplot_titles=('CPS Growth Over Purchases', 'CPS Growth Over Time'))
-        
-        fig3.add_trace(
-            go.Scatter(x=purchase_points, y=cps_values, mode='lines+markers',
-                      name='CPS', line=dict(color='cyan', width=3)),
-            row=1, col=1
-        )
-        
-        fig3.add_trace(
-            go.Scatter(x=time_points, y=cps_values, mode='lines+markers',
-                      name='CPS', line=dict(color='magenta', width=3), showlegend=False),
-            row=1, col=2
-        )
-        
-        fig3.update_xaxes(title_text="Purchases", row=1, col=1)
-        fig3.update_xaxes(title_text="Time (minutes)", row=1, col=2)
-        fig3.update_yaxes(title_text="CPS", type="log", row=1, col=1)
-        fig3.update_yaxes(title_text="CPS", type="log", row=1, col=2)
-        
-        fig3.update_layout(
-            height=400,
-            template='plotly_dark',
-            title_text='CPS Progression Analysis'
-        )
-    else:
-        fig3 = None
-    
-    # Chart 4: Cost vs CPS Heatmap
-    costs = [r['avg_cost'] for r in results]
-    cps_contribs = [r['cps_contribution'] for r in results]
-    
-    fig4 = go.Figure(go.Scatter(
-        x=costs,
-        y=cps_contribs,
-        mode='markers+text',
-        text=names,
-        textposition='top center',
-        marker=dict(
-            size=[r['purchases'] * 2 for r in results],
-            color=percentages,
-            colorscale='Plasma',
-            showscale=True,
-            colorbar=dict(title="% CPS")
-        )
-    ))
-    
-    fig4.update_layout(
-        title='Cost vs CPS Contribution<br>(Bubble size = purchases)',
-        xaxis_title='Average Cost per Purchase',
-        yaxis_title='Total CPS Contribution',
-        xaxis_type='log',
-        yaxis_type='log',
-        height=500,
-        template='plotly_dark'
-    )
-    
-    return jsonify({
-        "success": True,
-        "chart1": fig1.to_json(),
-        "chart2": fig2.to_json(),
-        "chart3": fig3.to_json() if fig3 else None,
-        "chart4": fig4.to_json()
-    })
+
+    # Posted runs have no ID: the same body renders the same charts
+    key = ("posted", chart_format, hashlib.sha256(request.get_data()).hexdigest())
+    log_time = bool(timeline) and "time" not in timeline[0]
+    body = cached_figure_response(key, lambda: render_simulation_charts(
+        chart_format, results, final_cps,
+        [t['purchase'] for t in timeline], [t['log10_time' if log_time else 'time'] for t in timeline],
+        [t['cps'] for t in timeline], log_time))
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/simulation-charts/<simulation_id>')
+def get_stored_simulation_charts(simulation_id):
+    """The four charts of a saved run (`simulation_id` is its `timestamp`), rendered once per format
+
+    Renders are cached and tagged by the run's file modification time, so a
+    run saved again under the same ID is never served stale.
+    """
+    try:
+        chart_format = _chart_format()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not SIMULATION_ID_PATTERN.fullmatch(simulation_id):
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    try:
+        saved_at = os.stat(_simulation_file(simulation_id, '.json')).st_mtime_ns
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    etag = f'{simulation_id}-{saved_at}-{chart_format}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    def render():
+        summary, timeline = load_stored_simulation(simulation_id)
+        if not summary.get("results"):
+            return None
+        return render_simulation_charts(
+            chart_format, summary["results"], summary["final_cps"], timeline['purchase'].tolist(),
+            timeline['time'].tolist(), timeline['cps'].tolist(), summary.get("pricing") == "log")
+
+    try:
+        body = cached_figure_response(("simulation", simulation_id, saved_at, chart_format), render)
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "Simulation not found"}), 404
+    if body is None:
+        return jsonify({"success": False, "error": "No results to display"}), 400
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/export/<format>')
 def export_data(format):
     upgrades = load_upgrades()
     
     if format == 'csv':
+        import pandas as pd
         df = pd.DataFrame(upgrades)
         filepath = 'current_upgrades.csv'
         df.to_csv(filepath, index=False)
@@ -735,25 +3568,57 @@ def export_data(format):
     
     return jsonify({"error": "Invalid format"}), 400
 
+# Sort keys accepted by /api/simulations, mapped to indexed catalog columns
+SIMULATION_SORT_COLUMNS = {
+    "timestamp": "timestamp",
+    "final_cps": "final_cps",
+    "purchases": "total_purchases",
+    "total_purchases": "total_purchases"
+}
+MAX_SIMULATIONS_PAGE_SIZE = 500
+
 @app.route('/api/simulations')
 def list_simulations():
-    if not os.path.exists('simulations'):
-        return jsonify([])
+    """List saved simulations from the catalog, newest first by default
+
+    Query parameters: `sort` (timestamp, final_cps or purchases), `order`
+    (asc or desc), `page` (1-based) and `per_page`. The total number of
+    simulations is returned in the `X-Total-Count` header.
+    """
+    sort = request.args.get('sort', 'timestamp')
+    order = request.args.get('order', 'desc').lower()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
     
-    files = [f for f in os.listdir('simulations') if f.endswith('.json')]
-    simulations = []
+    if sort not in SIMULATION_SORT_COLUMNS or order not in ('asc', 'desc'):
+        return jsonify({"success": False, "error": "Invalid sort"}), 400
+    if page is None or page < 1 or per_page is None or not 1 <= per_page <= MAX_SIMULATIONS_PAGE_SIZE:
+        return jsonify({"success": False, "error": f"Invalid page (per_page 1-{MAX_SIMULATIONS_PAGE_SIZE})"}), 400
     
-    for file in sorted(files, reverse=True):
-        with open(f'simulations/{file}', 'r') as f:
-            data = json.load(f)
-            simulations.append({
-                "filename": file,
-                "timestamp": data.get("timestamp"),
-                "total_purchases": data.get("total_purchases"),
-                "final_cps": data.get("final_cps")
-            })
+    column = SIMULATION_SORT_COLUMNS[sort]
+    with db_transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT filename, timestamp, total_purchases, final_cps, total_time, total_cookies FROM simulations "
+            f"ORDER BY {column} {order.upper()}, id {order.upper()} LIMIT ? OFFSET ?",
+            (per_page, (page - 1) * per_page)
+        )
+        rows = cur.fetchall()
+        cur.execute("SELECT COUNT(*) FROM simulations")
+        total = cur.fetchone()[0]
+    
+    simulations = [{
+        "filename": r[0],
+        "timestamp": r[1],
+        "total_purchases": r[2],
+        "final_cps": r[3],
+        "total_time": r[4] if math.isfinite(r[4]) else None,
+        "total_cookies": r[5] if math.isfinite(r[5]) else None
+    } for r in rows]
     
-    return jsonify(simulations)
+    response = jsonify(simulations)
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 if __name__ == '__main__':
     # Ensure DB initialized (populate from JSON on first run)
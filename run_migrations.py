@@ -1,19 +1,70 @@
 """
 Utility to run Alembic migrations programmatically.
+
+Alembic is only imported when the database is behind the newest revision:
+`is_current()` compares the `alembic_version` table with the revision
+files directly.
 """
 import os
-from alembic.config import Config
-from alembic import command
+import re
+import sqlite3
+
+BASE_DIR = os.path.dirname(__file__)
+DB_PATH = os.path.join(BASE_DIR, 'data.db')
+VERSIONS_DIR = os.path.join(BASE_DIR, 'alembic', 'versions')
+
+_REVISION = re.compile(r"^revision\s*=\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\s*=\s*(.+)$", re.MULTILINE)
+
+
+def head_revisions(versions_dir=VERSIONS_DIR):
+    """Revisions no other revision builds on, read from the migration files"""
+    revisions, parents = set(), set()
+    for filename in os.listdir(versions_dir):
+        if not filename.endswith('.py'):
+            continue
+        with open(os.path.join(versions_dir, filename), 'r', encoding='utf-8') as f:
+            source = f.read()
+        revision = _REVISION.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION.search(source)
+        if down_revision is not None:
+            parents.update(re.findall(r"['\"]([^'\"]+)['\"]", down_revision.group(1)))
+    return revisions - parents
+
+
+def current_revisions(db_path=DB_PATH):
+    """Revisions recorded in the database's `alembic_version` table (empty if none)"""
+    if not os.path.exists(db_path):
+        return set()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return {row[0] for row in conn.execute("SELECT version_num FROM alembic_version")}
+    except sqlite3.Error:
+        return set()
+    finally:
+        conn.close()
+
+
+def is_current(db_path=DB_PATH, versions_dir=VERSIONS_DIR):
+    heads = head_revisions(versions_dir)
+    return bool(heads) and current_revisions(db_path) == heads
 
 
 def upgrade_head():
-    base = os.path.dirname(__file__)
-    alembic_cfg_path = os.path.join(base, 'alembic.ini')
+    if is_current():
+        return
+    from alembic.config import Config
+    from alembic import command
+
+    alembic_cfg_path = os.path.join(BASE_DIR, 'alembic.ini')
     cfg = Config(alembic_cfg_path)
     # Make sure script location is resolved relative to project
-    cfg.set_main_option('script_location', os.path.join(base, 'alembic'))
+    cfg.set_main_option('script_location', os.path.join(BASE_DIR, 'alembic'))
     # Ensure SQLAlchemy URL points to local data.db
-    db_url = f"sqlite:///{os.path.join(base, 'data.db').replace('\\', '/') }"
+    db_url = f"sqlite:///{DB_PATH.replace(os.sep, '/')}"
     cfg.set_main_option('sqlalchemy.url', db_url)
     command.upgrade(cfg, 'head')
 
@@ -139,6 +139,8 @@ function normalizeLayoutForLight(layout) {
 
     layout.xaxis = applyAxis(layout.xaxis);
     layout.yaxis = applyAxis(layout.yaxis);
+    if (layout.xaxis2) layout.xaxis2 = applyAxis(layout.xaxis2);
+    if (layout.yaxis2) layout.yaxis2 = applyAxis(layout.yaxis2);
 
     // colorbar / colorbar ticks
     if (layout.colorbar) {
@@ -168,11 +170,36 @@ function adjustStatSizes() {
     });
 }
 
+// Last /api/upgrades state rendered, kept up to date from mutation deltas
+let upgradesState = null;
+
 async function loadUpgrades() {
     try {
         const response = await fetch('/api/upgrades');
-        const data = await response.json();
+        renderUpgrades(await response.json());
+    } catch (error) {
+        console.error('Error loading upgrades:', error);
+        showToast('❌ Failed to load upgrades', 'error');
+    }
+}
 
+// Merge a purchase/decrease delta into the last state instead of reloading
+function applyUpgradesDelta(delta) {
+    if (!upgradesState) {
+        return loadUpgrades();
+    }
+    const rows = new Map(upgradesState.upgrades.map(u => [u.name, u]));
+    delta.upgrades.forEach(u => rows.set(u.name, u));
+    renderUpgrades({
+        upgrades: delta.order.map(name => rows.get(name)),
+        total_cps: delta.total_cps,
+        best_upgrade: delta.best_upgrade
+    });
+}
+
+function renderUpgrades(data) {
+    upgradesState = data;
+    try {
         // Update stats (keep decimals for CPS, show 2 decimals)
         document.getElementById('current-cps').textContent = formatNumber(data.total_cps, 1);
         
@@ -231,11 +258,12 @@ async function loadUpgrades() {
         // Adjust stat sizes so numbers don't overflow their cards
         adjustStatSizes();
 
-        // Refresh chart
+        // Refresh chart and the purchase plan
         refreshChart();
+        refreshPlan();
 
     } catch (error) {
-        console.error('Error loading upgrades:', error);
+        console.error('Error rendering upgrades:', error);
         showToast('❌ Failed to load upgrades', 'error');
     }
 }
@@ -252,8 +280,8 @@ async function purchaseUpgrade(name) {
         if (data.success) {
             showToast(`✅ ${name} purchased! (Lvl ${data.upgrade.level})`, 'success');
             
-            // Reload upgrades
-            await loadUpgrades();
+            // Update the table from the returned delta
+            await applyUpgradesDelta(data.delta);
             
             // If we purchased the best upgrade, scroll to the new best upgrade
             if (wasBestUpgrade) {
@@ -284,7 +312,7 @@ async function decreaseUpgrade(name) {
 
         if (data.success) {
             showToast(`↩️ ${name} downgraded. (Lvl ${data.upgrade.level})`, 'info');
-            loadUpgrades();
+            applyUpgradesDelta(data.delta);
         } else {
             showToast('❌ ' + (data.error || 'Downgrade failed'), 'error');
         }
@@ -294,26 +322,119 @@ async function decreaseUpgrade(name) {
     }
 }
 
+// Charts come as compact {data, layout} specs; style them for the page and draw
+function plotChart(elementId, spec) {
+    Plotly.newPlot(elementId, spec.data, normalizeLayoutForLight(spec.layout));
+}
+
 async function refreshChart() {
     try {
-        const response = await fetch('/api/charts/current');
-        const chartJson = await response.json();
-        const chartData = JSON.parse(chartJson);
-
-        // normalize layout to page theme before rendering
-        const normalizedLayout = normalizeLayoutForLight(chartData.layout);
-        Plotly.newPlot('current-chart', chartData.data, normalizedLayout);
+        const response = await fetch('/api/charts/current?format=compact');
+        if (!response.ok) return;
+        plotChart('current-chart', await response.json());
     } catch (error) {
         console.error('Error loading chart:', error);
     }
 }
 
+// Next purchases from the current levels; the server only extends its cached plan
+// when the last purchase followed it
+const PLAN_SIZE = 10;
+
+async function refreshPlan() {
+    try {
+        const response = await fetch(`/api/plan?n=${PLAN_SIZE}`);
+        if (!response.ok) return;
+        const data = await response.json();
+        const tbody = document.getElementById('plan-tbody');
+        tbody.innerHTML = data.steps.map((step, i) => `
+            <tr>
+                <td>${i + 1}</td>
+                <td>${step.upgrade}</td>
+                <td>${step.level}</td>
+                <td>${formatTime(step.time)}</td>
+                <td>${formatNumber(step.cps, 1)}</td>
+            </tr>
+        `).join('');
+    } catch (error) {
+        console.error('Error loading plan:', error);
+    }
+}
+
+function setSimulationProgress(percent) {
+    const fill = document.getElementById('progress-fill');
+    fill.style.width = percent + '%';
+    fill.textContent = percent + '%';
+}
+
+// Plot the CPS timeline received so far while the simulation is streaming
+function drawLiveSimulationChart(timeline) {
+    const trace = {
+        x: timeline.map(t => t.purchase),
+        y: timeline.map(t => t.cps),
+        mode: 'lines',
+        line: { color: 'cyan', width: 3 }
+    };
+    const layout = normalizeLayoutForLight({
+        title: 'CPS Growth (live)',
+        height: 300,
+        xaxis: { title: 'Purchases' },
+        yaxis: { title: 'CPS', type: 'log' }
+    });
+    Plotly.react('sim-live-chart', [trace], layout);
+}
+
+// Read the NDJSON stream of a simulation: one "point" event per timeline
+// point, then a "summary" event. Returns the summary with its timeline.
+async function readSimulationStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const timeline = [];
+    let buffer = '';
+    let summary = null;
+    let lastDraw = 0;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (!line) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'point') {
+                timeline.push({ purchase: event.purchase, cps: event.cps, time: event.time, upgrade: event.upgrade });
+                setSimulationProgress(Math.floor(event.progress * 100));
+            } else if (event.type === 'summary') {
+                summary = event;
+            } else if (event.type === 'error') {
+                throw new Error(event.error);
+            }
+        }
+
+        // Redraw the partial chart a few times per second at most
+        const now = Date.now();
+        if (timeline.length && now - lastDraw > 250) {
+            drawLiveSimulationChart(timeline);
+            lastDraw = now;
+        }
+    }
+
+    if (!summary) {
+        throw new Error('Simulation stream ended early');
+    }
+    delete summary.type;
+    return { ...summary, timeline };
+}
+
 async function runSimulation() {
     const purchases = parseInt(document.getElementById('purchase-count').value);
     
     // Validation
-    if (isNaN(purchases) || purchases < 1 || purchases > 10000) {
-        showToast('⚠️ Please enter a valid number between 1 and 10000', 'error');
+    if (isNaN(purchases) || purchases < 1 || purchases > 1000000) {
+        showToast('⚠️ Please enter a valid number between 1 and 1000000', 'error');
         return;
     }
 
@@ -322,39 +443,26 @@ async function runSimulation() {
     // Show progress
     document.getElementById('simulation-progress').classList.remove('hidden');
     document.getElementById('simulation-results').classList.add('hidden');
-    document.getElementById('progress-fill').style.width = '0%';
-    document.getElementById('progress-fill').textContent = '0%';
+    Plotly.purge('sim-live-chart');
+    setSimulationProgress(0);
 
     try {
-        // Simulate progress
-        let progress = 0;
-        const progressInterval = setInterval(() => {
-            progress += 5;
-            if (progress >= 95) {
-                clearInterval(progressInterval);
-            }
-            document.getElementById('progress-fill').style.width = progress + '%';
-            document.getElementById('progress-fill').textContent = progress + '%';
-        }, 100);
-
         const response = await fetch('/api/simulate', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ purchases })
+            body: JSON.stringify({ purchases, stream: true })
         });
 
-        const data = await response.json();
-        
-        clearInterval(progressInterval);
-        
-        if (!data.success && data.error) {
-            throw new Error(data.error);
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || 'Simulation failed');
         }
+
+        const data = await readSimulationStream(response);
         
         currentSimulationData = data;
 
-        document.getElementById('progress-fill').style.width = '100%';
-        document.getElementById('progress-fill').textContent = '100%';
+        setSimulationProgress(100);
 
         setTimeout(() => {
             document.getElementById('simulation-progress').classList.add('hidden');
@@ -381,27 +489,23 @@ async function displaySimulationResults(data) {
 
     // Load charts
     try {
-        const response = await fetch('/api/simulation-charts', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
-        });
+        // Saved runs are charted by ID; only unsaved data is posted back
+        const response = data.timestamp
+            ? await fetch(`/api/simulation-charts/${data.timestamp}?format=compact`)
+            : await fetch('/api/simulation-charts?format=compact', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(data)
+            });
 
         const charts = await response.json();
 
-        const chart1 = JSON.parse(charts.chart1);
-        Plotly.newPlot('sim-chart1', chart1.data, normalizeLayoutForLight(chart1.layout));
-
-        const chart2 = JSON.parse(charts.chart2);
-        Plotly.newPlot('sim-chart2', chart2.data, normalizeLayoutForLight(chart2.layout));
-
+        plotChart('sim-chart1', charts.chart1);
+        plotChart('sim-chart2', charts.chart2);
         if (charts.chart3) {
-            const chart3 = JSON.parse(charts.chart3);
-            Plotly.newPlot('sim-chart3', chart3.data, chart3.layout);
+            plotChart('sim-chart3', charts.chart3);
         }
-
-        const chart4 = JSON.parse(charts.chart4);
-        Plotly.newPlot('sim-chart4', chart4.data, normalizeLayoutForLight(chart4.layout));
+        plotChart('sim-chart4', charts.chart4);
 
     } catch (error) {
         console.error('Error loading simulation charts:', error);
@@ -432,7 +536,7 @@ function exportSimulation() {
 }
 
 function onResetConfirm() {
-    if (!confirm('This will set ALL upgrade levels to 0. This action is irreversible. Continue?')) {
+    if (!confirm('This will reset ALL upgrade levels to their defaults. The current levels are kept as a snapshot. Continue?')) {
         return;
     }
     resetUpgrades();
@@ -440,20 +544,11 @@ function onResetConfirm() {
 
 async function resetUpgrades() {
     try {
-        // Create backup before reset
-        const bresp = await fetch('/api/backup', { method: 'POST' });
-        const bdata = await bresp.json();
-        if (!bdata.success) {
-            showToast('❌ Could not create backup before reset', 'error');
-            return;
-        }
-        showToast('📦 Backup created: ' + bdata.filename, 'info');
-
-        // Now perform reset
+        // The server keeps the current levels as a snapshot before resetting
         const response = await fetch('/api/reset', { method: 'POST' });
         const data = await response.json();
         if (data.success) {
-            showToast('✅ All upgrades reset to 0 (backup: ' + (data.backup || bdata.filename) + ')', 'success');
+            showToast('✅ All upgrades reset (snapshot: ' + data.snapshot + ')', 'success');
             loadUpgrades();
         } else {
             showToast('❌ Reset failed: ' + (data.error || ''), 'error');
@@ -467,7 +562,13 @@ async function resetUpgrades() {
 async function createBackup() {
     try {
         const response = await fetch('/api/backup', { method: 'POST' });
-        const data = await response.json();
+        let data = await response.json();
+        // The copy runs in the background; wait for it before downloading
+        while (data.success && data.status === 'pending') {
+            await new Promise(resolve => setTimeout(resolve, 250));
+            const status = await (await fetch(data.status_url)).json();
+            data = { ...data, ...status };
+        }
         if (data.success) {
             showToast('📦 Backup created: ' + data.filename, 'success');
             // Trigger download
@@ -512,6 +613,12 @@ async function loadSimulationHistory() {
                     📥 Download
                 </button>
             `;
+            const chartsButton = document.createElement('button');
+            chartsButton.classList.add('export-btn');
+            chartsButton.textContent = '📊 Charts';
+            // Catalog rows carry the summary figures; the charts are fetched by run ID
+            chartsButton.addEventListener('click', () => displaySimulationResults(sim));
+            item.appendChild(chartsButton);
             historyDiv.appendChild(item);
         });
 
@@ -1,5 +1,9 @@
+import json
 import os
+import platform
 import sqlite3
+import statistics
+import time
 import pytest
 
 # Ensure `seeds` module is importable when running tests from different CWDs
@@ -52,6 +56,53 @@ def _create_schema_and_seed(db_path):
             seed_level INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS simulations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL UNIQUE,
+            timestamp TEXT NOT NULL,
+            total_purchases INTEGER NOT NULL,
+            final_cps REAL NOT NULL,
+            total_time REAL NOT NULL,
+            total_cookies REAL NOT NULL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS upgrade_snapshots (
+            snapshot TEXT NOT NULL,
+            upgrade TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (snapshot, upgrade)
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS journal_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            kind TEXT NOT NULL,
+            target INTEGER,
+            label TEXT NOT NULL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS purchase_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            action INTEGER NOT NULL,
+            upgrade TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            level INTEGER NOT NULL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS journal_checkpoints (
+            seq INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            upgrade TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            PRIMARY KEY (seq, upgrade)
+        )
+    ''')
     conn.commit()
 
     # Insert seeds
@@ -60,12 +111,13 @@ def _create_schema_and_seed(db_path):
                     (item['name'], float(item['price']), float(item['cps']), int(item.get('seed_level', 0))))
         cur.execute('INSERT OR REPLACE INTO upgrades (name, price, level, cps, position) VALUES (?,?,?,?,?)',
                     (item['name'], float(item['price']), 0, float(item['cps']), pos))
+    cur.execute('INSERT INTO journal_checkpoints (seq, ts, upgrade, level) SELECT 0, 0, name, level FROM upgrades')
     conn.commit()
     conn.close()
 
 
 @pytest.fixture(autouse=True)
-def patch_db(monkeypatch, temp_db_path):
+def patch_db(monkeypatch, temp_db_path, tmp_path):
     """Monkeypatch app to use a temporary database and to stub migrations/backup."""
 
     # Ensure DB exists and seeded
@@ -76,6 +128,9 @@ def patch_db(monkeypatch, temp_db_path):
         return sqlite3.connect(temp_db_path, check_same_thread=False)
 
     monkeypatch.setattr(app_module, 'get_db_connection', _get_db_connection)
+    # Drop pooled connections to a previous test's database
+    app_module.close_db_connections()
+    app_module.invalidate_upgrade_state()
 
     # Patch run_migrations.upgrade_head to a no-op that seeds the temp DB
     try:
@@ -89,13 +144,116 @@ def patch_db(monkeypatch, temp_db_path):
     except Exception:
         pass
 
-    # Patch create_db_backup to avoid filesystem operations
-    def _create_db_backup_stub():
-        # emulate creation of backup name
-        return 'test_backup.db'
+    # Keep backups of the temp database out of the working tree
+    monkeypatch.setattr(app_module, 'BACKUP_DIR', str(tmp_path / 'backups'))
 
-    monkeypatch.setattr(app_module, 'create_db_backup', _create_db_backup_stub)
+    # Keep memoized simulations per test, out of the working tree
+    monkeypatch.setattr(app_module, 'SIMULATION_CACHE_DIR', str(tmp_path / 'simulation_cache'))
+    monkeypatch.setattr(app_module, '_simulation_cache', app_module.collections.OrderedDict())
+    monkeypatch.setattr(app_module, '_figure_cache', app_module.collections.OrderedDict())
+    monkeypatch.setattr(app_module, '_purchase_plan', {"table": None, "levels": None,
+                                                       "steps": app_module.collections.deque(), "exhausted": False})
 
     yield
 
-    # cleanup: nothing specific (tmp_path is auto-cleaned)
+    app_module.close_db_connections()
+
+
+# Benchmarks (tests marked `perf`) only run with --run-benchmarks. Each
+# measured function is timed over several rounds; the best round is compared
+# with the baseline of the same name in BENCHMARK_BASELINES and the test fails
+# past the tolerance. Names differ from the pytest-benchmark plugin's so both
+# can be installed.
+BENCHMARK_BASELINES = os.path.join(os.path.dirname(__file__), 'benchmark_baselines.json')
+BENCHMARK_TOLERANCE = 1.0
+_benchmark_results = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('perf')
+    group.addoption('--run-benchmarks', action='store_true',
+                    help='run the benchmarks and check them against the baselines')
+    group.addoption('--save-benchmarks', action='store_true',
+                    help='store the measured timings as the new baselines')
+    group.addoption('--benchmarks-json', metavar='PATH',
+                    help='write the measured timings to PATH')
+    group.addoption('--benchmarks-tolerance', type=float, default=None,
+                    help=f'allowed slowdown over the baseline (default {BENCHMARK_TOLERANCE} = +100%%)')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'perf: timing benchmark, run with --run-benchmarks')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-benchmarks') or config.getoption('--save-benchmarks'):
+        return
+    skip = pytest.mark.skip(reason='benchmarks run with --run-benchmarks')
+    for item in items:
+        if 'perf' in item.keywords:
+            item.add_marker(skip)
+
+
+def _load_baselines():
+    if not os.path.exists(BENCHMARK_BASELINES):
+        return {}
+    with open(BENCHMARK_BASELINES, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def perf_bench(request):
+    """Time `fn()` (after `setup()` each round) and check it against its baseline
+
+    Runs at least `min_rounds` rounds and keeps going for up to
+    `min_time` seconds. Returns the result entry.
+    """
+    config = request.config
+    saving = config.getoption('--save-benchmarks')
+    baselines = _load_baselines()
+    tolerance = config.getoption('--benchmarks-tolerance')
+    if tolerance is None:
+        tolerance = baselines.get('tolerance', BENCHMARK_TOLERANCE)
+
+    def run(name, fn, setup=None, min_rounds=5, max_rounds=200, min_time=0.2):
+        timings = []
+        started = time.perf_counter()
+        while len(timings) < min_rounds or (len(timings) < max_rounds and time.perf_counter() - started < min_time):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        result = {'min': round(min(timings), 9), 'median': round(statistics.median(timings), 9), 'rounds': len(timings)}
+        _benchmark_results[name] = result
+
+        baseline = baselines.get('benchmarks', {}).get(name)
+        if baseline is not None and not saving and result['min'] > baseline['min'] * (1 + tolerance):
+            pytest.fail(f"{name} regressed: best of {result['rounds']} took {result['min'] * 1000:.3f} ms, "
+                        f"baseline {baseline['min'] * 1000:.3f} ms (+{tolerance:.0%} allowed)")
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session):
+    if not _benchmark_results:
+        return
+    report = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'tolerance': BENCHMARK_TOLERANCE,
+        'benchmarks': dict(sorted(_benchmark_results.items())),
+    }
+    if session.config.getoption('--benchmarks-json'):
+        with open(session.config.getoption('--benchmarks-json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    if session.config.getoption('--save-benchmarks'):
+        baselines = _load_baselines()
+        merged = {**baselines.get('benchmarks', {}), **_benchmark_results}
+        report = {**report, 'tolerance': baselines.get('tolerance', BENCHMARK_TOLERANCE),
+                  'benchmarks': dict(sorted(merged.items()))}
+        with open(BENCHMARK_BASELINES, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
@@ -1,4 +1,16 @@
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
 import app as app_module
+import seeds
 
 
 def test_init_db_and_load_upgrades():
@@ -43,7 +55,7 @@ def test_purchase_and_decrease_endpoint(client=None):
     assert data['upgrade']['level'] == 1
 
 
-def test_reset_endpoint_creates_backup_and_resets():
+def test_reset_endpoint_keeps_snapshot_and_resets_to_seed_levels():
     client = app_module.app.test_client()
 
     # Ensure an upgrade has been purchased
@@ -56,12 +68,242 @@ def test_reset_endpoint_creates_backup_and_resets():
     assert resp.status_code == 200
     data = resp.get_json()
     assert data.get('success') is True
-    assert 'backup' in data
+    assert data['snapshot'].startswith(app_module.PRE_RESET_SNAPSHOT_PREFIX)
+
+    # Verify levels are back to their seed levels
+    seed_levels = {item['name']: int(item.get('seed_level', 0)) for item in seeds.SEEDS}
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()} == seed_levels
+
+
+def test_resets_in_the_same_second_keep_separate_snapshots(monkeypatch):
+    class FrozenDatetime(app_module.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2026, 1, 1, 12, 0, 0)
+
+    monkeypatch.setattr(app_module, 'datetime', FrozenDatetime)
+    monkeypatch.setattr(app_module, 'PRE_RESET_SNAPSHOT_RETENTION', 2)
+    client = app_module.app.test_client()
+    client.post('/api/snapshots', json={'name': 'pre-ascension'})
+    for _ in range(3):
+        client.post('/api/upgrade/GrandMa')
+
+    first = client.post('/api/reset').get_json()['snapshot']
+    second = client.post('/api/reset').get_json()['snapshot']
+    assert first != second
+    diff = client.get(f'/api/snapshots/{first}/diff').get_json()['changes']
+    assert {'name': 'GrandMa', 'from': 3, 'to': 0} in diff
+
+    # Only the newest pre-reset snapshots are kept; other snapshots stay
+    third = client.post('/api/reset').get_json()['snapshot']
+    names = {s['name'] for s in client.get('/api/snapshots').get_json()}
+    assert names == {'pre-ascension', second, third}
+
+
+def test_backup_restores_state_from_before_reset():
+    client = app_module.app.test_client()
+    for _ in range(3):
+        client.post('/api/upgrade/GrandMa')
+
+    backup = client.post('/api/backup').get_json()['filename']
+    client.post('/api/reset')
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()}['GrandMa'] == 0
+
+    resp = client.post(f'/api/backup/{backup}/restore')
+    assert resp.status_code == 200 and resp.get_json()['backup'] != backup
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()}['GrandMa'] == 3
+    assert client.post('/api/backup/data_backup_missing.db/restore').status_code == 404
+
+
+def test_reset_keeps_pre_reset_snapshot_without_backup_file(monkeypatch):
+    monkeypatch.setattr(app_module, 'schedule_db_backup', None)
+    client = app_module.app.test_client()
+    for _ in range(3):
+        client.post('/api/upgrade/GrandMa')
+
+    data = client.post('/api/reset').get_json()
+    levels = {u['name']: u['level'] for u in app_module.load_upgrades()}
+    assert levels['GrandMa'] == 0
+    assert client.get('/api/backups').get_json() == []
+
+    assert 'backup' not in data
+    snapshot = data['snapshot']
+    diff = client.get(f'/api/snapshots/{snapshot}/diff').get_json()['changes']
+    assert {'name': 'GrandMa', 'from': 3, 'to': 0} in diff
+    assert client.post(f'/api/snapshots/{snapshot}/restore').get_json()['success'] is True
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()}['GrandMa'] == 3
+
+
+def test_named_snapshots_create_list_diff_restore():
+    client = app_module.app.test_client()
+    assert client.post('/api/snapshots', json={'name': 'start'}).status_code == 201
+    assert client.post('/api/snapshots', json={'name': 'start'}).status_code == 409
+    assert client.post('/api/snapshots', json={}).status_code == 400
+
+    client.post('/api/upgrades/batch', json={'levels': {'GrandMa': 5, 'CookieFarm': 2}})
+    client.post('/api/snapshots', json={'name': 'later'})
+    listed = {s['name']: s for s in client.get('/api/snapshots').get_json()}
+    assert set(listed) == {'start', 'later'}
+    assert listed['later']['upgrades'] == len(app_module.load_upgrades())
+
+    diff = client.get('/api/snapshots/start/diff?against=later').get_json()['changes']
+    assert sorted(c['name'] for c in diff) == ['CookieFarm', 'GrandMa']
+    assert client.get('/api/snapshots/later/diff').get_json()['changes'] == []
+    assert client.get('/api/snapshots/missing/diff').status_code == 404
+
+    resp = client.post('/api/snapshots/start/restore')
+    assert resp.status_code == 200
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()}['GrandMa'] == 0
+    assert client.get('/api/upgrades').get_json() == {k: v for k, v in resp.get_json().items()
+                                                      if k not in ('success', 'restored')}
+    assert client.post('/api/snapshots/missing/restore').status_code == 404
+    assert client.delete('/api/snapshots/later').status_code == 200
+    assert [s['name'] for s in client.get('/api/snapshots').get_json()] == ['start']
+
+
+def _levels():
+    return {u['name']: u['level'] for u in app_module.load_upgrades()}
+
+
+def test_journal_undo_redo_and_replay(monkeypatch):
+    client = app_module.app.test_client()
+    start = _levels()
+    client.post('/api/upgrade/GrandMa')
+    client.post('/api/upgrades/batch', json={'deltas': {'GrandMa': 2, 'CookieFarm': 1}})
+    after_batch = _levels()
+
+    assert client.post('/api/undo').get_json()['success'] is True
+    assert _levels()['GrandMa'] == 1 and _levels()['CookieFarm'] == 0
+    client.post('/api/undo')
+    assert _levels() == start
+    assert client.post('/api/undo').status_code == 409
+
+    client.post('/api/redo')
+    client.post('/api/redo')
+    assert _levels() == after_batch
+    assert client.post('/api/redo').status_code == 409
+
+    # A new action drops the redo history
+    client.post('/api/undo')
+    client.post('/api/upgrade/AutoClick')
+    assert client.post('/api/redo').status_code == 409
+
+    actions = client.get('/api/journal').get_json()
+    assert [a['label'] for a in actions][:3] == ['purchase', 'batch', 'batch']
+    assert [a['kind'] for a in actions][:3] == ['do', 'undo', 'redo']
+    assert app_module.replay_levels() == {**start, **_levels()}
+    ts = {a['id']: a['ts'] for a in actions}
+    assert app_module.replay_levels(min(ts.values()))['GrandMa'] == 1
+    assert client.get('/api/journal/replay?at=-1').status_code == 400
+
+
+def test_journal_compaction_and_checkpoints_keep_replay(monkeypatch):
+    monkeypatch.setattr(app_module, 'JOURNAL_CHECKPOINT_INTERVAL', 5)
+    client = app_module.app.test_client()
+    for _ in range(12):
+        client.post('/api/upgrade/GrandMa')
+    with app_module.db_transaction() as conn:
+        checkpoints = [r[0] for r in conn.execute('SELECT DISTINCT seq FROM journal_checkpoints ORDER BY seq')]
+    assert checkpoints == [0, 5, 10]
+
+    midpoint = client.get('/api/journal').get_json()[5]['ts']
+    before = app_module.replay_levels(midpoint)
+    resp = client.post('/api/journal/compact', json={'before': midpoint}).get_json()
+    assert resp['removed'] == 6
+    assert app_module.replay_levels(midpoint) == before
+    assert app_module.replay_levels()['GrandMa'] == 12
+    assert len(client.get('/api/journal').get_json()) == 6
+
+    points = client.get('/api/journal/cps').get_json()['points']
+    assert len(points) == 7
+    grandma_cps = next(u['cps'] for u in app_module.load_upgrades() if u['name'] == 'GrandMa')
+    assert points[-1]['total_cps'] - points[0]['total_cps'] == pytest.approx(6 * grandma_cps)
+
+
+def _wait_for_backup(client, status_url):
+    for _ in range(200):
+        status = client.get(status_url).get_json()
+        if status['status'] != 'pending':
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f'{status_url} still pending')
+
+
+def test_backup_endpoint_returns_before_the_copy_is_done(monkeypatch):
+    client = app_module.app.test_client()
+    release = threading.Event()
+    run_backup = app_module._run_backup
+
+    def _slow_backup(*args):
+        release.wait(5)
+        return run_backup(*args)
+    monkeypatch.setattr(app_module, '_run_backup', _slow_backup)
+
+    resp = client.post('/api/backup')
+    assert resp.status_code == 202
+    data = resp.get_json()
+    assert client.get(data['status_url']).get_json()['status'] == 'pending'
+    assert client.get(data['url']).status_code == 409
+    release.set()
+    assert _wait_for_backup(client, data['status_url'])['status'] == 'done'
+    assert client.get(data['url']).status_code == 200
+    assert client.get('/api/backup/data_backup_missing.db/status').status_code == 404
+
+
+def test_compressed_backups_and_retention(monkeypatch):
+    monkeypatch.setattr(app_module, 'BACKUP_RETENTION', 2)
+    client = app_module.app.test_client()
+    names = []
+    for _ in range(3):
+        data = client.post('/api/backup', json={'compress': True}).get_json()
+        assert _wait_for_backup(client, data['status_url'])['status'] == 'done'
+        names.append(data['filename'])
+    assert all(name.endswith('.db.gz') for name in names) and len(set(names)) == 3
+
+    listed = client.get('/api/backups').get_json()
+    assert sorted(b['filename'] for b in listed) == sorted(names[1:])
+    assert client.get(listed[0]['path']).status_code == 200
+
+    client.post('/api/upgrade/GrandMa')
+    assert client.post(f'/api/backup/{names[-1]}/restore').status_code == 200
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()}['GrandMa'] == 0
+
+
+# Cold `import app` must stay well under this, without pandas, plotly or alembic
+STARTUP_BUDGET_SECONDS = 3.0
+
+
+def test_app_import_is_fast_and_defers_heavy_modules():
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, sorted(m for m in ('pandas', 'plotly', 'alembic', 'sqlalchemy') if m in sys.modules))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+    elapsed, loaded = out.stdout.split(' ', 1)
+    assert loaded.strip() == '[]'
+    assert float(elapsed) < STARTUP_BUDGET_SECONDS
 
-    # Verify levels are zero
-    upgrades_after = app_module.load_upgrades()
-    for u in upgrades_after:
-        assert u['level'] == 0
+
+def test_migration_check_skips_alembic_only_at_head(tmp_path):
+    import run_migrations
+    from alembic import command
+    from alembic.config import Config
+
+    db_path = str(tmp_path / 'migrated.db')
+    assert run_migrations.is_current(db_path) is False
+    cfg = Config(os.path.join(os.path.dirname(run_migrations.__file__), 'alembic.ini'))
+    cfg.set_main_option('script_location', os.path.join(run_migrations.BASE_DIR, 'alembic'))
+    cfg.set_main_option('sqlalchemy.url', f'sqlite:///{db_path}')
+    command.upgrade(cfg, 'head')
+    assert run_migrations.current_revisions(db_path) == run_migrations.head_revisions() != set()
+    assert run_migrations.is_current(db_path) is True
+
+    command.downgrade(cfg, '0003_create_upgrade_snapshots')
+    assert run_migrations.is_current(db_path) is False
 
 
 def test_get_upgrades_endpoint():
@@ -72,3 +314,690 @@ def test_get_upgrades_endpoint():
     assert 'upgrades' in data and isinstance(data['upgrades'], list)
     assert 'total_cps' in data
 
+
+
+def _reference_time_to_reach(cps, cost):
+    # Original per-call cycle loop, kept as the reference for the vectorized engine
+    if cps <= 0:
+        return float('inf')
+    video_cycle = [10, 10, 20, 20, 30]
+    cookies_per_cycle = cps * (5 * 70 + sum(video_cycle) * 60)
+    full_cycles = int(cost / cookies_per_cycle)
+    remaining_cost = cost - (full_cycles * cookies_per_cycle)
+    total_time = full_cycles * (5 * 70 / 60)
+    video_index = 0
+    total_cookies = 0
+    while remaining_cost > 0 and total_cookies < remaining_cost and video_index < 5:
+        total_cookies += cps * 70
+        total_time += 70 / 60
+        total_cookies += cps * video_cycle[video_index] * 60
+        video_index += 1
+    return total_time
+
+
+def test_current_chart_compact_format_and_figure_cache(monkeypatch):
+    client = app_module.app.test_client()
+    client.post('/api/upgrade/GrandMa')
+    renders = []
+    real_spec = app_module.current_chart_spec
+    monkeypatch.setattr(app_module, 'current_chart_spec', lambda ups: renders.append(1) or real_spec(ups))
+
+    full = client.get('/api/charts/current')
+    compact = client.get('/api/charts/current?format=compact')
+    assert full.status_code == compact.status_code == 200
+    figure, spec = json.loads(full.get_json()), compact.get_json()
+    assert 'template' in figure['layout'] and 'template' not in spec['layout']
+    assert figure['data'][0]['x'] == spec['data'][0]['x']
+    assert len(compact.data) * 3 < len(full.data)
+
+    # Same state: served from the cache, or 304 for the client's copy
+    assert client.get('/api/charts/current?format=compact').data == compact.data
+    assert client.get('/api/charts/current?format=compact',
+                      headers={'If-None-Match': compact.headers['ETag']}).status_code == 304
+    assert len(renders) == 2
+    client.post('/api/upgrade/GrandMa')
+    assert client.get('/api/charts/current?format=compact').data != compact.data
+    assert len(renders) == 3
+    assert client.get('/api/charts/current?format=svg').status_code == 400
+
+
+def test_simulation_charts_compact_matches_full_and_is_cached(monkeypatch):
+    client = app_module.app.test_client()
+    client.post('/api/upgrade/AutoClick')
+    summary = app_module.run_simulation(app_module.load_upgrades(), 300)
+    full = client.post('/api/simulation-charts', json=summary).get_json()
+    compact = client.post('/api/simulation-charts?format=compact', json=summary).get_json()
+    for name in ('chart1', 'chart2', 'chart3', 'chart4'):
+        figure = json.loads(full[name])
+        assert [t['y'] for t in figure['data']] == [t['y'] for t in compact[name]['data']]
+
+    monkeypatch.setattr(app_module, 'simulation_chart_specs', None)
+    assert client.post('/api/simulation-charts?format=compact', json=summary).get_json() == compact
+
+
+def _metric(text, name):
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(name))
+
+
+def test_metrics_endpoint_reports_requests_sections_and_caches():
+    client = app_module.app.test_client()
+    before = client.get('/api/metrics').get_data(as_text=True)
+    resp = client.post('/api/upgrade/AutoClick')
+    assert 'db;dur=' in resp.headers['Server-Timing'] and 'total;dur=' in resp.headers['Server-Timing']
+    client.get('/api/upgrades')
+    client.get('/api/upgrades')
+
+    text = client.get('/api/metrics').get_data(as_text=True)
+    route = 'route="/api/upgrade/<upgrade_name>"'
+    assert _metric(text, 'cc_http_requests_total{' + route + ',method="POST",status="200"}') == \
+        _metric(before, 'cc_http_requests_total{' + route + ',method="POST",status="200"}') + 1
+    assert _metric(text, 'cc_http_request_duration_seconds_bucket{' + route + ',le="+Inf"}') == \
+        _metric(text, 'cc_http_request_duration_seconds_count{' + route + '}')
+    assert _metric(text, 'cc_section_calls_total{section="db"}') > _metric(before, 'cc_section_calls_total{section="db"}')
+    assert _metric(text, 'cc_cache_requests_total{cache="upgrade_state",result="hit"}') >= 1
+    assert 'cache="time_to_reach"' not in text
+    assert '# TYPE cc_http_request_duration_seconds histogram' in text
+
+
+
+def test_db_section_times_sqlite_calls_only_and_cache_stores_are_not_lookups():
+    def totals():
+        with app_module._metrics_lock:
+            db = tuple(app_module._section_times['db'])
+            counts = dict(app_module._cache_counts)
+        return db, counts
+
+    (calls, seconds), counts = totals()
+    with app_module.db_transaction() as conn:
+        conn.execute('SELECT COUNT(*) FROM upgrades').fetchone()
+        time.sleep(0.2)  # Python work inside the transaction
+    (calls_after, seconds_after), _ = totals()
+    assert calls_after == calls + 1
+    assert seconds_after - seconds < 0.1
+
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    app_module.run_simulation(upgrades, 30)
+    _, counts_after = totals()
+    lookups = {k: counts_after[k] - counts.get(k, 0) for k in counts_after if k[0] == 'simulation'}
+    assert {k: v for k, v in lookups.items() if v} == {('simulation', 'miss'): 1}
+
+def test_profiled_request_dumps_cprofile_stats(tmp_path, monkeypatch):
+    import pstats
+    monkeypatch.setattr(app_module, 'PROFILE_DIR', str(tmp_path))
+    client = app_module.app.test_client()
+    assert 'X-Profile-File' not in client.get('/api/upgrades?profile=1').headers
+
+    monkeypatch.setattr(app_module, 'PROFILE_REQUESTS', True)
+    name = client.get('/api/upgrades?profile=1').headers['X-Profile-File']
+    stats = pstats.Stats(str(tmp_path / name))
+    assert any(func[2] == 'get_upgrades' for func in stats.stats)
+    assert 'X-Profile-File' not in client.get('/api/upgrades').headers
+
+
+def test_vectorized_time_to_reach_matches_cycle_loop():
+    costs = [1, 30, 100, 670, 5750, 12345, 10 ** 9, 3 * 10 ** 15]
+    cps_values = [0, 0.1, 0.4, 1.0, 123.456, 1e6]
+    times = app_module.calculate_times_to_reach([[c] for c in costs], cps_values)
+    assert times.shape == (len(costs), len(cps_values))
+    for i, cost in enumerate(costs):
+        for j, cps in enumerate(cps_values):
+            expected = _reference_time_to_reach(int(cps * 1000) / 1000.0, cost)
+            assert times[i, j] == expected
+            assert app_module.calculate_time_to_reach_cost_cached(int(cps * 1000), cost) == expected
+
+
+def test_greedy_simulator_matches_repeated_best_upgrade():
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+
+    expected = []
+    levels = [dict(u) for u in upgrades]
+    for _ in range(500):
+        best = app_module.get_best_upgrade(levels)
+        index = next(i for i, u in enumerate(levels) if u['name'] == best['name'])
+        levels[index]['level'] += 1
+        expected.append((index, best['price'], best['time'], app_module.calculate_total_cps(levels)))
+
+    purchases = list(itertools.islice(app_module.iter_greedy_purchases(upgrades), 500))
+    assert purchases == expected
+    # The caller's levels are left untouched
+    assert upgrades[0]['level'] == 1 and all(u['level'] == 0 for u in upgrades[1:])
+
+    summary = app_module.run_simulation(upgrades, 500)
+    assert summary['total_purchases'] == 500
+    assert summary['final_cps'] == expected[-1][3]
+    assert sum(r['purchases'] for r in summary['results']) == 500
+
+
+def test_simulations_are_memoized_and_served_from_longer_prefix(monkeypatch):
+    upgrades = app_module.load_upgrades()
+    expected_short = app_module.run_simulation(upgrades, 40)
+    app_module._simulation_cache.clear()
+    expected_long = app_module.run_simulation(upgrades, 120)
+
+    # The 120-purchase run is cached; the greedy engine must not run again
+    def _fail(*args, **kwargs):
+        raise AssertionError('greedy loop re-ran')
+    monkeypatch.setattr(app_module, 'iter_greedy_purchases', _fail)
+    assert app_module.run_simulation(upgrades, 120) == expected_long
+    assert app_module.run_simulation(upgrades, 40) == expected_short
+
+    # ...including after a restart, from the on-disk copy
+    app_module._simulation_cache.clear()
+    assert app_module.run_simulation(upgrades, 40) == expected_short
+
+
+def test_forecast_stops_at_target_and_reuses_runs_from_later_states(monkeypatch):
+    client = app_module.app.test_client()
+    assert client.get('/api/forecast?target_cps=1e6').status_code == 400  # no CPS yet
+    app_module.update_upgrade_level('AutoClick', 1)
+    for query in ('', '?target_cps=-1', '?target_cookies=lots', '?target_cps=1e6&max_purchases=0'):
+        assert client.get(f'/api/forecast{query}').status_code == 400
+
+    upgrades = app_module.load_upgrades()
+    expected_time, expected_purchases, first = 0, 0, None
+    for i, _, time_to_reach, total_cps in app_module.iter_greedy_purchases(upgrades):
+        first = upgrades[i]['name'] if first is None else first
+        expected_time += time_to_reach
+        expected_purchases += 1
+        if total_cps >= 1e6:
+            break
+
+    data = client.get('/api/forecast?target_cps=1e6').get_json()
+    assert data['reached'] is True
+    assert data['eta'] == pytest.approx(expected_time)
+    assert data['purchases'] == expected_purchases
+    assert data['final_cps'] >= 1e6
+    assert sum(step['count'] for step in data['path']) == expected_purchases
+    assert data['path'][-1]['time'] == data['eta']
+    # Only the purchases up to the target were simulated and memoized
+    (entry,) = app_module._simulation_cache.values()
+    assert len(entry['index']) == expected_purchases
+
+    # Later states along the memoized run replay it without the greedy loop
+    def _fail(*args, **kwargs):
+        raise AssertionError('greedy loop re-ran')
+    monkeypatch.setattr(app_module, 'iter_greedy_purchases', _fail)
+    assert client.post(f'/api/upgrade/{first}').status_code == 200
+    later = client.get('/api/forecast?target_cps=1e6&path_limit=2').get_json()
+    assert later['purchases'] == expected_purchases - 1
+    assert later['eta'] < data['eta']
+    assert len(later['path']) == 2 and later['path_truncated'] is True
+    assert len(app_module._simulation_cache) == 1
+
+    cookies = client.get(f"/api/forecast?target_cookies={data['total_cookies'] / 2}").get_json()
+    assert cookies['reached'] is True and cookies['total_cookies'] >= data['total_cookies'] / 2
+    assert cookies['purchases'] < later['purchases']
+
+
+
+def test_plan_drops_head_and_extends_tail_after_following_purchases(monkeypatch):
+    client = app_module.app.test_client()
+    assert client.get('/api/plan?n=0').status_code == 400
+    assert client.get('/api/plan?n=100000').status_code == 400
+    app_module.update_upgrade_level('AutoClick', 1)
+
+    greedy = app_module.iter_greedy_purchases
+    computed = []
+
+    def _counting(*args, **kwargs):
+        for purchase in greedy(*args, **kwargs):
+            computed.append(purchase)
+            yield purchase
+    monkeypatch.setattr(app_module, 'iter_greedy_purchases', _counting)
+
+    resp = client.get('/api/plan?n=20')
+    assert resp.status_code == 200
+    steps = resp.get_json()['steps']
+    assert len(computed) == 20
+    upgrades = app_module.load_upgrades()
+    expected = list(itertools.islice(greedy(upgrades), 20))
+    assert [s['upgrade'] for s in steps] == [upgrades[i]['name'] for i, *_ in expected]
+    assert steps[-1]['time'] == pytest.approx(sum(p[2] for p in expected))
+    assert steps[-1]['cps'] == expected[-1][3]
+
+    # Unchanged levels: served from the plan, or as 304 with its ETag
+    etag = resp.headers['ETag']
+    assert client.get('/api/plan?n=20', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/plan?n=10').get_json()['steps'] == steps[:10]
+    assert len(computed) == 20
+
+    # Following the plan computes just the new last purchase
+    client.post(f"/api/upgrade/{steps[0]['upgrade']}")
+    client.post(f"/api/upgrade/{steps[1]['upgrade']}")
+    later = client.get('/api/plan?n=20').get_json()['steps']
+    assert len(computed) == 22
+    assert [s['upgrade'] for s in later[:18]] == [s['upgrade'] for s in steps[2:]]
+    assert later[0]['time'] == pytest.approx(steps[2]['time'] - steps[1]['time'])
+    assert later == client.get('/api/plan?n=20').get_json()['steps']
+
+    # Anything else starts over
+    computed.clear()
+    client.post('/api/upgrade/AutoClick/decrease')
+    client.get('/api/plan?n=20')
+    assert len(computed) == 20
+
+def test_purchases_reuse_one_pooled_wal_connection(monkeypatch):
+    opened = []
+    connect = app_module.get_db_connection
+
+    def _counting_connection():
+        opened.append(connect())
+        return opened[-1]
+
+    monkeypatch.setattr(app_module, 'get_db_connection', _counting_connection)
+    client = app_module.app.test_client()
+    for _ in range(5):
+        assert client.post('/api/upgrade/GrandMa').status_code == 200
+    assert client.post('/api/upgrade/GrandMa/decrease').status_code == 200
+
+    assert len(opened) == 1
+    assert opened[0].execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    levels = {u['name']: u['level'] for u in app_module.load_upgrades()}
+    assert levels['GrandMa'] == 4
+
+
+def test_upgrades_etag_serves_304_until_a_write(monkeypatch):
+    client = app_module.app.test_client()
+    first = client.get('/api/upgrades')
+    etag = first.headers['ETag']
+    load_upgrades = app_module.load_upgrades
+
+    def _fail():
+        raise AssertionError('upgrades reloaded')
+    monkeypatch.setattr(app_module, 'load_upgrades', _fail)
+    assert client.get('/api/upgrades', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/upgrades').get_json() == first.get_json()
+
+    monkeypatch.setattr(app_module, 'load_upgrades', load_upgrades)
+    assert client.post('/api/upgrade/GrandMa').status_code == 200
+    changed = client.get('/api/upgrades', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.get_json()['total_cps'] > first.get_json()['total_cps']
+
+
+def test_purchase_and_decrease_return_delta_matching_full_reload():
+    client = app_module.app.test_client()
+    state = client.get('/api/upgrades').get_json()
+    for url in ['/api/upgrade/AutoClick', '/api/upgrade/GrandMa', '/api/upgrade/GrandMa/decrease']:
+        delta = client.post(url).get_json()['delta']
+        rows = {u['name']: u for u in state['upgrades']}
+        rows.update({u['name']: u for u in delta['upgrades']})
+        state = {
+            'upgrades': [rows[name] for name in delta['order']],
+            'total_cps': delta['total_cps'],
+            'best_upgrade': delta['best_upgrade']
+        }
+        assert not set(delta['removed']) & set(delta['order'])
+
+        # Same as what a full recomputation from the database gives
+        app_module.invalidate_upgrade_state()
+        assert client.get('/api/upgrades').get_json() == state
+    assert client.post('/api/upgrade/CookieFarm/decrease').status_code == 400
+
+
+
+def _run_concurrently(threads, requests_per_thread, send):
+    errors = []
+
+    def worker():
+        client = app_module.app.test_client()
+        for _ in range(requests_per_thread):
+            status = send(client).status_code
+            if status != 200:
+                errors.append(status)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert errors == []
+
+
+def test_concurrent_purchases_and_batches_lose_no_increments():
+    # Writers commit before the cached state is invalidated; levels must
+    # still come from the database, or increments get lost
+    _run_concurrently(16, 25, lambda client: client.post('/api/upgrade/GrandMa'))
+    assert _levels()['GrandMa'] == 400
+
+    _run_concurrently(8, 25, lambda client: client.post('/api/upgrades/batch',
+                                                        json={'deltas': {'GrandMa': 1, 'AutoClick': 2}}))
+    levels = _levels()
+    assert levels['GrandMa'] == 600 and levels['AutoClick'] == 400
+    # ...and the cached state ends up at the committed levels
+    listed = app_module.app.test_client().get('/api/upgrades').get_json()['upgrades']
+    assert {u['name']: u['level'] for u in listed}.items() <= levels.items()
+
+def test_batch_endpoint_sets_levels_and_deltas_in_one_transaction():
+    client = app_module.app.test_client()
+    autoclick = {u['name']: u['level'] for u in app_module.load_upgrades()}['AutoClick']
+    resp = client.post('/api/upgrades/batch', json={
+        'levels': {'GrandMa': 40, 'C-Robot': 3},
+        'deltas': {'AutoClick': 2, 'C-Robot': -1}
+    })
+    assert resp.status_code == 200
+    body = resp.get_json()
+    levels = {u['name']: u['level'] for u in app_module.load_upgrades()}
+    assert (levels['GrandMa'], levels['C-Robot'], levels['AutoClick']) == (40, 2, autoclick + 2)
+    app_module.invalidate_upgrade_state()
+    expected = client.get('/api/upgrades').get_json()
+    assert body == {'success': True, **expected}
+
+    # Rejected batches write nothing
+    assert client.post('/api/upgrades/batch', json={'levels': {'GrandMa': 1, 'Nope': 2}}).status_code == 404
+    assert client.post('/api/upgrades/batch', json={'levels': {'GrandMa': 1}, 'deltas': {'AutoClick': -9}}).status_code == 400
+    assert client.post('/api/upgrades/batch', json={'levels': {'GrandMa': '7'}}).status_code == 400
+    assert {u['name']: u['level'] for u in app_module.load_upgrades()} == levels
+
+
+def test_price_tables_match_truncated_float_prices():
+    for level in [0, 1, 7, 200, 63, 1000, 2500]:
+        assert app_module.upgrade_price(30, level) == int(30 * (1.3 ** level))
+        assert app_module.upgrade_price(1000, level, 1.15) == int(1000 * (1.15 ** level))
+    assert len(app_module._price_tables[(30, 1.3)]) >= 2501
+    # Other growths are priced the same way but never cached
+    assert (1000, 1.15) not in app_module._price_tables
+    with pytest.raises(OverflowError):
+        app_module.upgrade_price(1000, 10 ** 6, 1.15)
+    with pytest.raises(OverflowError):
+        app_module.upgrade_price(30, 5000)
+
+
+def test_log_pricing_matches_float_in_range_and_runs_past_overflow(tmp_path, monkeypatch):
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    float_run = list(itertools.islice(app_module.iter_greedy_purchases(upgrades), 2000))
+    log_run = list(itertools.islice(app_module.iter_greedy_purchases(upgrades, pricing='log'), 2000))
+    assert [p[0] for p in log_run] == [p[0] for p in float_run]
+    assert log_run[-1][1] == pytest.approx(math.log(float_run[-1][1]), rel=1e-12)
+    assert app_module.get_best_upgrade(upgrades, pricing='log')['name'] == app_module.get_best_upgrade(upgrades)['name']
+
+    # Every price past the float range: the float engine stops, the log one goes on
+    for u in upgrades:
+        u['level'] = 3000
+    assert list(app_module.iter_greedy_purchases(upgrades)) == []
+    summary = app_module.run_simulation(upgrades, 50, pricing='log')
+    assert summary['total_purchases'] == 50 and summary['total_cookies'] is None
+    assert summary['log10_total_cookies'] > 308
+    assert sum(r['purchases'] for r in summary['results']) == 50
+
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    resp = client.post('/api/simulate', json={'purchases': 30, 'pricing': 'log'})
+    assert resp.status_code == 200 and resp.get_json()['pricing'] == 'log'
+    assert client.post('/api/simulate', json={'purchases': 30, 'pricing': 'decimal'}).status_code == 400
+
+
+def test_zero_cps_upgrade_is_ranked_last_in_both_pricing_modes():
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = upgrades[1]['level'] = 1
+    upgrades.insert(2, {**upgrades[2], 'name': 'Decoration', 'cps': 0})
+    zero = 2
+
+    for pricing in ('float', 'log'):
+        levels = [dict(u) for u in upgrades]
+        expected = []
+        for _ in range(300):
+            best = app_module.get_best_upgrade(levels, pricing=pricing)
+            index = next(i for i, u in enumerate(levels) if u['name'] == best['name'])
+            levels[index]['level'] += 1
+            expected.append(index)
+        purchases = itertools.islice(app_module.iter_greedy_purchases(upgrades, pricing=pricing), 300)
+        assert [p[0] for p in purchases] == expected
+        assert zero not in expected
+
+    # Lowest priority, not excluded: bought once nothing else is affordable
+    for u in upgrades:
+        u['level'] = 3000
+    upgrades[zero]['level'] = 0
+    assert next(app_module.iter_greedy_purchases(upgrades))[0] == zero
+    assert app_module.get_best_upgrade(upgrades, pricing='log')['name'] != 'Decoration'
+
+
+def test_simulate_rejects_out_of_range_purchase_count():
+    client = app_module.app.test_client()
+    resp = client.post('/api/simulate', json={'purchases': app_module.MAX_SIMULATION_PURCHASES + 1})
+    assert resp.status_code == 400
+    assert resp.get_json()['success'] is False
+
+
+def test_simulate_batch_endpoint_runs_scenarios_in_lockstep():
+    client = app_module.app.test_client()
+    scenarios = [
+        {'purchases': 50},
+        {'purchases': 80, 'time_penalty_exponent': 1.0},
+        {'purchases': 30, 'price_growth': 1.5, 'levels': {'GrandMa': 3}},
+    ]
+    resp = client.post('/api/simulate/batch', json={'scenarios': scenarios})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['success'] is True
+    sims = data['simulations']
+    assert [s['total_purchases'] for s in sims] == [50, 80, 30]
+
+    # The default scenario matches a plain serial simulation from the reset state
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    expected = app_module.run_simulation(upgrades, 50)
+    assert {k: sims[0][k] for k in expected} == expected
+
+    resp = client.post('/api/simulate/batch', json={'scenarios': [{'levels': {'Nope': 1}}]})
+    assert resp.status_code == 400
+
+
+def test_sweep_endpoint_runs_parameter_grid(tmp_path, monkeypatch):
+    # Worker processes start fresh, without the patched cache dir, and
+    # memoize under the working directory
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    resp = client.post('/api/sweep', json={
+        'purchases': 40,
+        'time_penalty_exponent': [1.0, 1.5],
+        'price_growth': 1.3,
+        'video_cycle': [[10, 10, 20, 20, 30], [30]],
+    })
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['success'] is True
+    points = data['points']
+    assert len(points) == 4
+    assert [(p['time_penalty_exponent'], p['video_cycle']) for p in points] == [
+        (1.0, [10, 10, 20, 20, 30]), (1.0, [30]), (1.5, [10, 10, 20, 20, 30]), (1.5, [30])
+    ]
+
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    expected = app_module.run_simulation(upgrades, 40)
+    default_point = points[2]
+    assert default_point['final_cps'] == expected['final_cps']
+    assert default_point['total_time'] == expected['total_time']
+
+    resp = client.post('/api/sweep', json={'price_growth': [0]})
+    assert resp.status_code == 400
+
+
+def test_optimize_endpoint_beats_or_matches_greedy_plan():
+    client = app_module.app.test_client()
+    assert client.post('/api/optimize', json={'target_cps': 1e4}).status_code == 400  # no CPS yet
+    app_module.update_upgrade_level('AutoClick', 1)
+
+    resp = client.post('/api/optimize', json={'target_cps': 1e4})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    plan, greedy = data['plan'], data['greedy']
+    assert data['start_cps'] == pytest.approx(0.1)
+    assert plan['total_time'] <= greedy['total_time']
+    assert data['gap']['time'] == pytest.approx(greedy['total_time'] - plan['total_time'])
+    assert plan['final_cps'] >= 1e4 and greedy['final_cps'] >= 1e4
+
+    # The steps replay: each is affordable in the time given at the CPS before it
+    steps = plan['steps']
+    assert len(steps) == plan['purchases']
+    cps, elapsed = 0.1, 0.0
+    for step in steps:
+        quantized = int(cps * 1000) / 1000.0
+        elapsed += app_module._time_to_reach(step['price'], quantized)
+        assert step['time'] == pytest.approx(elapsed)
+        assert step['cps'] > cps
+        cps = step['cps']
+    assert steps[-1]['time'] == plan['total_time']
+
+    # Searching in worker processes finds a plan at least as fast as greedy too
+    upgrades = app_module.load_upgrades()
+    pooled = app_module.plan_purchases(upgrades, 1e4, max_workers=2)
+    assert pooled['plan']['total_time'] <= greedy['total_time']
+    assert pooled['greedy'] == greedy
+
+    for body in ({'target_cps': 0}, {'target_cps': 'a lot'}, {'target_cps': 1e4, 'beam_width': 0}):
+        assert client.post('/api/optimize', json=body).status_code == 400
+    resp = client.post('/api/optimize', json={'target_cps': 1e300})
+    assert resp.status_code == 400
+    assert 'purchases' in resp.get_json()['error']
+
+
+def test_simulate_stream_emits_points_then_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    resp = client.post('/api/simulate', json={'purchases': 55, 'stream': True})
+    assert resp.status_code == 200
+    assert resp.mimetype == 'application/x-ndjson'
+    events = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+    points = [e for e in events if e['type'] == 'point']
+    summary = events[-1]
+    assert summary['type'] == 'summary' and 'timeline' not in summary
+    assert points[-1]['progress'] == 50 / 55 and summary['total_purchases'] == 55
+
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    expected = app_module.run_simulation(upgrades, 55)
+    assert [{k: p[k] for k in ('purchase', 'cps', 'time', 'upgrade')} for p in points] == expected['timeline']
+    assert summary['final_cps'] == expected['final_cps']
+
+    # The saved file is the same simulation, timeline included
+    with open(tmp_path / 'simulations' / f"simulation_{summary['timestamp']}.json") as f:
+        saved = json.load(f)
+    assert saved['timeline'] == expected['timeline']
+    assert saved['total_cookies'] == expected['total_cookies']
+
+
+def test_stored_simulation_charts_match_posted_charts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    streamed = [json.loads(line) for line in
+                client.post('/api/simulate', json={'purchases': 9000, 'stream': True}).get_data(as_text=True).splitlines()]
+    stream_id = streamed[-1]['timestamp']
+    with open(tmp_path / 'simulations' / f'simulation_{stream_id}.json') as f:
+        posted = client.post('/api/simulation-charts?format=compact', json=json.load(f)).get_json()
+    stored = client.get(f'/api/simulation-charts/{stream_id}?format=compact')
+    assert stored.status_code == 200 and stored.get_json() == posted
+    assert len(stored.get_json()['chart3']['data'][0]['x']) == 901
+    assert json.loads(client.get(f'/api/simulation-charts/{stream_id}').get_json()['chart1'])['layout']['template']
+
+    # Runs saved before the compact files existed are converted on first use
+    for suffix in ('.summary', '.timeline.bin'):
+        (tmp_path / 'simulations' / f'simulation_{stream_id}{suffix}').unlink()
+    app_module._figure_cache.clear()
+    assert client.get(f'/api/simulation-charts/{stream_id}?format=compact').get_json() == posted
+    assert (tmp_path / 'simulations' / f'simulation_{stream_id}.timeline.bin').stat().st_size == 901 * 24
+
+    assert client.get('/api/simulation-charts/19990101_000000').status_code == 404
+    assert client.get('/api/simulation-charts/..%2Fdata').status_code == 404
+
+    # Revalidated by ETag rather than cached for a day
+    assert stored.headers['Cache-Control'] == 'no-cache'
+    etag = stored.headers['ETag']
+    assert client.get(f'/api/simulation-charts/{stream_id}?format=compact',
+                      headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_simulations_in_the_same_second_get_their_own_ids_and_charts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    first = client.post('/api/simulate', json={'purchases': 50}).get_json()
+    second = client.post('/api/simulate', json={'purchases': 500}).get_json()
+    assert first['timestamp'] != second['timestamp']
+    assert app_module.SIMULATION_ID_PATTERN.fullmatch(first['timestamp'])
+    charts = [client.get(f"/api/simulation-charts/{run['timestamp']}?format=compact").get_json()
+              for run in (first, second)]
+    assert charts[0] != charts[1]
+
+    listed = client.get('/api/simulations').get_json()
+    assert sorted(r['timestamp'] for r in listed) == sorted([first['timestamp'], second['timestamp']])
+    by_id = {r['timestamp']: r for r in listed}
+    assert by_id[second['timestamp']]['total_cookies'] == second['total_cookies']
+
+    # A run saved again under its ID is not served from the old render
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    app_module.save_simulation({**first, **app_module.run_simulation(upgrades, 200)})
+    os.utime(tmp_path / 'simulations' / f"simulation_{first['timestamp']}.json", ns=(1, 1))
+    assert client.get(f"/api/simulation-charts/{first['timestamp']}?format=compact").get_json() != charts[0]
+
+
+def test_simulations_catalog_sorts_and_paginates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for i, (purchases, cps) in enumerate([(30, 2.0), (10, 50.0), (20, 0.5)]):
+        app_module.record_simulation(f'simulation_2024010{i}_000000.json', {
+            'timestamp': f'2024010{i}_000000', 'total_purchases': purchases,
+            'final_cps': cps, 'total_time': 1.0, 'total_cookies': 2.0
+        })
+    client = app_module.app.test_client()
+    assert client.post('/api/simulate', json={'purchases': 15}).status_code == 200
+
+    resp = client.get('/api/simulations')
+    assert resp.headers['X-Total-Count'] == '4'
+    assert resp.get_json()[0]['total_purchases'] == 15
+
+    by_cps = client.get('/api/simulations?sort=final_cps&order=asc&per_page=2&page=1').get_json()
+    assert [s['final_cps'] for s in by_cps] == [0.5, 2.0]
+    by_purchases = client.get('/api/simulations?sort=purchases&order=desc&per_page=2&page=2').get_json()
+    assert [s['total_purchases'] for s in by_purchases] == [15, 10]
+
+    assert client.get('/api/simulations?sort=filename').status_code == 400
+    assert client.get('/api/simulations?page=0').status_code == 400
+
+
+def _wait_for_job(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/api/jobs/{job_id}').get_json()
+        if status['status'] not in ('queued', 'running'):
+            return status
+        time.sleep(0.01)
+    raise AssertionError('job did not finish')
+
+
+def test_simulation_job_submit_poll_and_result(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    resp = client.post('/api/jobs/simulate', json={'purchases': 120})
+    assert resp.status_code == 202
+    job_id = resp.get_json()['job_id']
+
+    status = _wait_for_job(client, job_id)
+    assert status['status'] == 'done' and status['progress'] == 1.0
+
+    resp = client.get(f'/api/jobs/{job_id}/result')
+    assert resp.status_code == 200
+    result = resp.get_json()
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    expected = app_module.run_simulation(upgrades, 120)
+    assert {k: result[k] for k in expected} == expected
+
+    assert client.get('/api/jobs/unknown').status_code == 404
+
+
+def test_simulation_job_cancel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    job_id = client.post('/api/jobs/simulate', json={'purchases': app_module.MAX_SIMULATION_PURCHASES}).get_json()['job_id']
+    resp = client.post(f'/api/jobs/{job_id}/cancel')
+    assert resp.status_code == 200
+
+    status = _wait_for_job(client, job_id)
+    assert status['status'] == 'cancelled'
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
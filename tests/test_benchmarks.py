@@ -0,0 +1,89 @@
+"""Timing benchmarks for the calculator hot paths
+
+Run with `pytest --run-benchmarks` (checked against tests/benchmark_baselines.json)
+or `pytest --save-benchmarks` to record new baselines. Each benchmark uses the
+temporary database from conftest.py.
+"""
+import pytest
+
+import app as app_module
+
+pytestmark = pytest.mark.perf
+
+SIMULATION_SIZES = (100, 1000, 10000)
+
+
+def _clear_simulation_cache(tmp_path):
+    app_module._simulation_cache.clear()
+    for entry in (tmp_path / 'simulation_cache').glob('*.npz'):
+        entry.unlink()
+
+
+@pytest.fixture
+def started_upgrades():
+    # Mid-game levels: a realistic candidate set for the greedy strategy
+    upgrades = app_module.load_upgrades()
+    upgrades[0]['level'] = 1
+    summary = app_module.run_simulation(upgrades, 2000)
+    purchased = {r['name']: r['purchases'] for r in summary['results']}
+    for u in upgrades:
+        u['level'] += purchased.get(u['name'], 0)
+    return upgrades
+
+
+def test_times_to_reach_vectorized(perf_bench):
+    # The cost-by-CPS grid the metrics and the lockstep batch evaluate
+    costs = [[10 ** k * m] for k in range(1, 13) for m in (1, 3)]
+    cps = [c / 10 for c in range(1, 200)]
+    perf_bench('times_to_reach_vectorized', lambda: app_module.calculate_times_to_reach(costs, cps),
+               min_rounds=20)
+
+
+def test_get_best_upgrade(perf_bench, started_upgrades):
+    perf_bench('get_best_upgrade', lambda: app_module.get_best_upgrade(started_upgrades))
+
+
+def test_get_best_upgrade_log_pricing(perf_bench, started_upgrades):
+    perf_bench('get_best_upgrade_log', lambda: app_module.get_best_upgrade(started_upgrades, pricing='log'))
+
+
+def test_api_upgrades_recomputed(perf_bench):
+    client = app_module.app.test_client()
+    client.post('/api/upgrade/AutoClick')
+    perf_bench('api_upgrades_recomputed', lambda: client.get('/api/upgrades'),
+              setup=app_module.invalidate_upgrade_state)
+
+
+def test_api_upgrades_cached(perf_bench):
+    client = app_module.app.test_client()
+    client.post('/api/upgrade/AutoClick')
+    client.get('/api/upgrades')
+    perf_bench('api_upgrades_cached', lambda: client.get('/api/upgrades'))
+
+
+def test_api_upgrades_not_modified(perf_bench):
+    client = app_module.app.test_client()
+    etag = client.get('/api/upgrades').headers['ETag']
+    perf_bench('api_upgrades_304', lambda: client.get('/api/upgrades', headers={'If-None-Match': etag}))
+
+
+def test_api_purchase(perf_bench):
+    client = app_module.app.test_client()
+    perf_bench('api_purchase', lambda: client.post('/api/upgrade/AutoClick'))
+
+
+@pytest.mark.parametrize('purchases', SIMULATION_SIZES)
+def test_api_simulate(perf_bench, purchases, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    perf_bench(f'api_simulate_{purchases}', lambda: client.post('/api/simulate', json={'purchases': purchases}),
+              setup=lambda: _clear_simulation_cache(tmp_path), min_rounds=5, max_rounds=30, min_time=0.5)
+
+
+@pytest.mark.parametrize('purchases', SIMULATION_SIZES)
+def test_api_simulate_memoized(perf_bench, purchases, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = app_module.app.test_client()
+    client.post('/api/simulate', json={'purchases': purchases})
+    perf_bench(f'api_simulate_{purchases}_memoized', lambda: client.post('/api/simulate', json={'purchases': purchases}),
+              min_rounds=5, max_rounds=30, min_time=0.5)